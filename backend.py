@@ -1,20 +1,59 @@
+import sys
+import asyncio
+import importlib
 import uvicorn
-from dotenv import load_dotenv
-from param_compile import params
-load_dotenv()
-from routes.auth import auth_router
-from routes.role import role_router
-from routes.chat import chat_router
-from routes.user import user_router
-from routes.model import model_router
-from routes.prompt import prompt_router
+from param_compile import ConfigError, params
+# Chỉ entrypoint đọc dòng lệnh, trước mọi module đọc cấu hình; worker / test import backend dùng env / file
+if __name__ == "__main__":
+    try:
+        params.load(sys.argv[1:])
+    except ConfigError as exc:
+        sys.exit(f"error: {exc}")
+from helper.auth import is_metrics_token, verify_token
+from helper.authorizer import authorizer
+from contextlib import asynccontextmanager, suppress
+from database.database import SesionLocal, engine, replica_engines, warm_pool
+from middleware.authorization import AuthorizationMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.rate_limit import RateLimitMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.profiler import SQLProfilerMiddleware
+from helper import metrics, profiler, supervisor
+from helper.token import token_cache
+from helper.rate_limit import rate_limiter
+from helper.cache import reference_caches
+from helper.search import search_index
 from schema.response import ResponseMessage
-from fastapi import FastAPI, status, Request
-from routes.permission import permission_router
+from fastapi import FastAPI, status, Request, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Worker chỉ nhận request sau khi lifespan startup xong: warm pool / cache ở đây
+    await warm_pool()
+    async with SesionLocal() as db:
+        await authorizer.load(db)
+        for cache in reference_caches:
+            await cache.warm(db)
+    flush_metrics = asyncio.create_task(metrics.flush_periodically())
+    supervisor.notify_ready()
+    yield
+    flush_metrics.cancel()
+    with suppress(asyncio.CancelledError):
+        await flush_metrics
+    search_index.flush()
+    profiler.route_stats.dump()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Primary và từng replica: request đọc đi replica cũng phải có trong metrics / SQL profiler
+for name, target in [("primary", engine)] + [(f"replica{index}", replica) for index, replica in enumerate(replica_engines)]:
+    metrics.instrument_engine(target, name)
+    if params.sql_profile:
+        profiler.instrument_engine(target)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -29,19 +68,43 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         },
     )
 
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    return ResponseMessage(code=exc.status_code, message=f"{exc.detail}")
+
 
-routers = [
-    auth_router,
-    user_router,
-    chat_router,
-    role_router,
-    permission_router,
-    prompt_router,
-    model_router,
+# "module:router": danh sách router đăng ký ở một chỗ. Không lazy: mọi router được import ngay khi import backend
+# (FastAPI cần đủ route trước khi nhận request); giảm chi phí này bằng --preload (fork sau khi import)
+public_routers = [
+    "routes.auth:auth_router",
 ]
 
-for router in routers:
-    app.include_router(router)
+# Các router cần bearer token hợp lệ (Authorization: Bearer <token>)
+protected_routers = [
+    "routes.user:user_router",
+    "routes.chat:chat_router",
+    "routes.role:role_router",
+    "routes.permission:permission_router",
+    "routes.prompt:prompt_router",
+    "routes.model:model_router",
+]
+
+
+def load_router(path: str):
+    module_name, name = path.split(":")
+    return getattr(importlib.import_module(module_name), name)
+
+
+for path in public_routers:
+    app.include_router(load_router(path))
+
+for path in protected_routers:
+    app.include_router(load_router(path), dependencies=[Depends(verify_token)])
+
+# Thêm trước AuthorizationMiddleware để chạy sau nó (đã biết user của request)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+app.add_middleware(AuthorizationMiddleware, authorizer=authorizer)
 
 origins = ["*"]
 
@@ -53,12 +116,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    level=params.gzip_level,
+    min_size=params.gzip_min_size,
+    content_types=params.gzip_types.split(","),
+)
+
+if params.sql_profile:
+    app.add_middleware(SQLProfilerMiddleware, repeat_threshold=params.sql_repeat_threshold)
+
+app.add_middleware(MetricsMiddleware)
+
 @app.get("/")
 async def root():
-    return {"code": status.HTTP_200_OK, "message": "Check health Done"}
+    return {
+        "code": status.HTTP_200_OK,
+        "message": "Check health Done",
+        "data": {
+            "token_cache": token_cache.stats(),
+            "reference_cache": {cache.namespace: cache.stats() for cache in reference_caches},
+        },
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    # Không có METRICS_TOKEN thì phải là user hợp lệ; quyền route /metrics do AuthorizationMiddleware kiểm tra
+    if not is_metrics_token(request):
+        await verify_token(request)
+    return Response(content=metrics.collect(), media_type=metrics.CONTENT_TYPE)
 
 
 def run_server():
+    if params.preload and params.workers > 1:
+        # app đã import trong process này, các worker fork ra dùng lại
+        config = uvicorn.Config(
+            app,
+            host=params.host,
+            port=params.port,
+            backlog=params.backlog,
+            log_level=params.log_level,
+            use_colors=params.use_colors,
+            limit_concurrency=params.limit_concurrency,
+            ssl_keyfile=params.ssl_keyfile,
+            ssl_certfile=params.ssl_certfile,
+            forwarded_allow_ips=params.forwarded_allow_ips,
+            timeout_graceful_shutdown=params.graceful_timeout,
+        )
+        return supervisor.Supervisor(
+            config,
+            workers=params.workers,
+            max_requests=params.limit_max_requests,
+            graceful_timeout=params.graceful_timeout,
+        ).run()
+
     return uvicorn.run(
         "backend:app",
         host=params.host,
@@ -72,6 +184,7 @@ def run_server():
         limit_max_requests=params.limit_max_requests,
         ssl_keyfile=params.ssl_keyfile,
         ssl_certfile=params.ssl_certfile,
+        forwarded_allow_ips=params.forwarded_allow_ips,
     )
 
 if __name__ == "__main__":
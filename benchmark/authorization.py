@@ -0,0 +1,108 @@
+"""
+Kiểm tra Authorizer khi role / permission thay đổi, với hai "worker" dùng chung version store (FileVersionStore).
+
+    python benchmark/authorization.py
+
+Kiểm tra: sửa role qua API chỉ build lại trie tại chỗ, worker ghi không load() lại toàn bộ ở request sau;
+worker khác thấy version mới, load lại và không còn cấp quyền đã thu hồi. Sai một bước thì thoát với mã 1.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+
+folder = tempfile.mkdtemp()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'authorization.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+os.environ["BACKEND_RATE_LIMIT_RATE"] = "0"
+
+import httpx
+from backend import app
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from helper.cache import FileVersionStore
+from helper.authorizer import Authorizer, authorizer
+from helper.token import create_access_token
+from database.database import Base, SesionLocal, engine
+
+failures = []
+
+
+def check(condition: bool, message: str):
+    print(f"{'OK  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+async def seed():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with SesionLocal() as db:
+        db.add_all([
+            Permission(id=1, name="all", route="/"),
+            Permission(id=2, name="models", route="/models"),
+            Permission(id=3, name="prompts", route="/prompts"),
+            Role(id=1, name="admin", permission_ids=[1]),
+            Role(id=2, name="reader", permission_ids=[2]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        await db.flush()
+        db.add_all([
+            User(
+                id=index, user_name=f"user{index}", email=f"user{index}@example.com", password="x",
+                default_prompt=1, default_model=1, role_id=role_id,
+            )
+            for index, role_id in ((1, 1), (2, 2))
+        ])
+        await db.commit()
+
+
+async def main():
+    await seed()
+    # Hai worker dùng chung thư mục version: worker ghi là authorizer của app, worker khác là một Authorizer riêng
+    shared = os.path.join(folder, "versions")
+    authorizer.versions = FileVersionStore(shared, check_interval=0)
+    other = Authorizer(FileVersionStore(shared, check_interval=0))
+
+    loads = {"writer": 0, "other": 0}
+    for name, target in (("writer", authorizer), ("other", other)):
+        def counting_load(db, name=name, load=target.load):
+            loads[name] += 1
+            return load(db)
+        target.load = counting_load
+
+    admin = {"Authorization": f"Bearer {create_access_token({'id': 1, 'user_name': 'user1', 'email': 'user1@example.com', 'role_id': 1})}"}
+    reader = {"Authorization": f"Bearer {create_access_token({'id': 2, 'user_name': 'user2', 'email': 'user2@example.com', 'role_id': 2})}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://authz") as client:
+        async with SesionLocal() as db:
+            await other.load(db)
+        check((await client.get("/models", headers=reader)).json()["code"] == 200, "reader is granted /models")
+        check(other.is_allowed(2, "/models"), "other worker grants /models to reader")
+        check(loads == {"writer": 1, "other": 1}, f"each worker loads once: {loads}")
+
+        response = await client.put("/roles/2", headers=admin, json={"name": "reader", "permission_ids": [3]})
+        check(response.json()["code"] == 200, "role update succeeds")
+        check((await client.get("/models", headers=reader)).json()["code"] == 403, "writing worker revokes /models at once")
+        check((await client.get("/prompts", headers=reader)).json()["code"] == 200, "writing worker grants /prompts at once")
+        check(loads["writer"] == 1, f"role update causes no full load() in the writing worker ({loads['writer']} loads)")
+
+        check(other.stale(), "other worker sees the shared version change")
+        async with SesionLocal() as db:
+            await other.load(db)
+        check(not other.is_allowed(2, "/models") and other.is_allowed(2, "/prompts"), "other worker reloads the new grants")
+        check(not authorizer.stale(), "writing worker is still current")
+    await engine.dispose()
+
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Kiểm tra các endpoint POST /.../bulk trả đúng id theo thứ tự item, cả khi dialect không có RETURNING (như MySQL).
+
+    python benchmark/bulk_insert.py --items 50
+
+Chạy hai lượt trên SQLite: lượt đầu dùng RETURNING, lượt sau tắt các cờ RETURNING của dialect
+(insert_returning / insert_executemany_returning...) giống aiomysql. Mỗi lượt kiểm tra dữ liệu trả về khớp từng item,
+dòng đọc lại từ DB theo id khớp nội dung, và lượt không RETURNING không phát câu SQL nào có RETURNING.
+Sai một bước thì thoát với mã 1.
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+
+parser = argparse.ArgumentParser(description="Bulk insert id mapping check")
+parser.add_argument("--items", type=int, default=50)
+args = parser.parse_args()
+
+folder = tempfile.mkdtemp()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'bulk_insert.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+os.environ["BACKEND_RATE_LIMIT_RATE"] = "0"
+
+import httpx
+from sqlalchemy import event, select
+from sqlalchemy.dialects import mysql
+from backend import app
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from helper.token import create_access_token
+from database.database import Base, SesionLocal, engine
+
+RETURNING_FLAGS = (
+    "insert_returning",
+    "insert_executemany_returning",
+    "insert_executemany_returning_sort_by_parameter_order",
+)
+
+failures = []
+statements = []
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def record(connection, cursor, statement, parameters, context, executemany):
+    statements.append(" ".join(statement.split()).upper())
+
+
+def check(condition: bool, message: str):
+    print(f"{'OK  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+async def seed():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with SesionLocal() as db:
+        db.add_all([
+            Permission(id=1, name="all", route="/"),
+            Role(id=1, name="admin", permission_ids=[1]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        await db.flush()
+        db.add(User(
+            id=1, user_name="admin", email="admin@example.com", password="x",
+            default_prompt=1, default_model=1, role_id=1,
+        ))
+        await db.commit()
+
+
+def cases(tag: str) -> list:
+    """
+    (path, model, cột so khớp, items); giá trị có tag của lượt chạy để không trùng UNIQUE giữa hai lượt
+    """
+    return [
+        ("/prompts/bulk", Prompt, "content", [{"content": f"{tag} prompt {index}"} for index in range(args.items)]),
+        ("/roles/bulk", Role, "name", [{"name": f"{tag} role {index}", "permission_ids": [1]} for index in range(args.items)]),
+        ("/permissions/bulk", Permission, "route", [
+            {"name": f"{tag} permission {index}", "route": f"/{tag}/{index}"} for index in range(args.items)
+        ]),
+        ("/models/bulk", Model, "name", [
+            {"name": f"{tag} model {index}", "detail_name": f"{tag} detail {index}", "type": "cloud"}
+            for index in range(args.items)
+        ]),
+    ]
+
+
+async def run(client: httpx.AsyncClient, tag: str, returning: bool):
+    for path, model, field, items in cases(tag):
+        statements.clear()
+        response = await client.post(path, json=items)
+        body = response.json()
+        if body.get("code") != 201:
+            check(False, f"{tag}: POST {path} returned {body.get('code')}: {str(body)[:200]}")
+            continue
+
+        data = [item["data"] for item in body["data"]]
+        check(
+            [row[field] for row in data] == [item[field] for item in items],
+            f"{tag}: POST {path} returns the created rows in item order",
+        )
+        async with SesionLocal() as db:
+            stored = dict((await db.execute(
+                select(model.id, getattr(model, field)).filter(model.id.in_([row["id"] for row in data]))
+            )).all())
+        check(
+            all(stored.get(row["id"]) == row[field] for row in data),
+            f"{tag}: POST {path} ids point at the rows holding each item",
+        )
+        if not returning:
+            check(
+                not any("RETURNING" in statement for statement in statements),
+                f"{tag}: POST {path} runs without RETURNING",
+            )
+
+
+async def main():
+    await seed()
+    token = create_access_token({"id": 1, "user_name": "admin", "email": "admin@example.com", "role_id": 1})
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bulk", headers=headers) as client:
+        await run(client, "returning", returning=True)
+
+        # Giả lập dialect như aiomysql: không RETURNING cho INSERT
+        dialect = engine.sync_engine.dialect
+        reference = mysql.aiomysql.dialect()
+        for flag in RETURNING_FLAGS:
+            setattr(dialect, flag, getattr(reference, flag))
+        await run(client, "plain", returning=False)
+    await engine.dispose()
+
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Đo bytes-on-wire và CPU của CompressionMiddleware theo kích thước response và gzip level.
+
+    python benchmark/compression.py --sizes 512,4096,65536,1048576 --levels 1,6,9 --rounds 50
+
+Payload là JSON giống response chat (title + conversation). Mỗi dòng in ra số byte gốc / sau nén,
+tỉ lệ và CPU time trung bình cho một response. Phần cuối so sánh response NDJSON stream
+(Z_SYNC_FLUSH mỗi chunk) với nén một lượt để thấy chi phí của việc flush.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+parser = argparse.ArgumentParser(description="Response compression benchmark")
+parser.add_argument("--sizes", type=str, default="512,4096,65536,1048576")
+parser.add_argument("--levels", type=str, default="1,6,9")
+parser.add_argument("--rounds", type=int, default=50)
+parser.add_argument("--chunk_lines", type=int, default=100)
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.argv = sys.argv[:1]
+
+from param_compile import params
+from schema.response import dumps
+from middleware.compression import CompressionMiddleware
+
+
+def chat_payload(size: int) -> bytes:
+    """
+    JSON envelope {code, message, data} có kích thước xấp xỉ size byte
+    """
+    words = ["chat", "model", "prompt", "token", "user", "xin", "chào", "hỏi", "đáp", "dữ", "liệu", "python", "server"]
+    rng = random.Random(size)
+    turns, index = [], 0
+    data = {"code": 200, "message": "Fetch chat success", "data": {"id": 1, "title": "benchmark", "conversation": turns}}
+    while len(dumps(data)) < size:
+        index += 1
+        turns.append({
+            "role": "user" if index % 2 else "assistant",
+            "content": " ".join(rng.choice(words) for _ in range(rng.randint(8, 40))) + f" #{rng.getrandbits(32)}",
+        })
+    return dumps(data)
+
+
+CONTENT_TYPES = params.gzip_types.split(",")
+
+
+def json_app(body: bytes):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+def ndjson_app(chunks: list):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    return app
+
+
+SCOPE = {
+    "type": "http",
+    "method": "GET",
+    "path": "/",
+    "headers": [(b"accept-encoding", b"gzip")],
+}
+
+
+async def measure(app, rounds: int) -> tuple:
+    sent = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+
+    start = time.process_time()
+    for _ in range(rounds):
+        await app(SCOPE, receive, send)
+    cpu = (time.process_time() - start) / rounds
+    return sent // rounds, cpu
+
+
+async def main():
+    sizes = [int(size) for size in args.sizes.split(",")]
+    levels = [int(level) for level in args.levels.split(",")]
+
+    print(f"{'size':>10} {'level':>5} {'wire':>10} {'ratio':>7} {'cpu/resp':>10}")
+    for size in sizes:
+        body = chat_payload(size)
+        for level in levels:
+            middleware = CompressionMiddleware(json_app(body), level=level, min_size=params.gzip_min_size, content_types=CONTENT_TYPES)
+            wire, cpu = await measure(middleware, args.rounds)
+            print(f"{len(body):>10} {level:>5} {wire:>10} {wire / len(body):>7.3f} {cpu * 1000:>8.3f}ms")
+
+    # NDJSON: so sánh flush mỗi chunk với nén cả body một lượt
+    chunks = [
+        b"".join(chat_payload(2048 + chunk * args.chunk_lines + line) + b"\n" for line in range(args.chunk_lines))
+        for chunk in range(10)
+    ]
+    total = sum(len(chunk) for chunk in chunks)
+    print(f"\nNDJSON stream {len(chunks)} chunks x {args.chunk_lines} lines ({total} bytes)")
+    for level in levels:
+        streamed, stream_cpu = await measure(CompressionMiddleware(ndjson_app(chunks), level=level, content_types=CONTENT_TYPES), 5)
+        single, single_cpu = await measure(CompressionMiddleware(json_app(b"".join(chunks)), level=level, content_types=CONTENT_TYPES), 5)
+        print(
+            f"level {level}: streamed {streamed} bytes {stream_cpu * 1000:.2f}ms, "
+            f"single {single} bytes {single_cpu * 1000:.2f}ms, flush overhead {streamed - single} bytes"
+        )
+
+
+asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Benchmark throughput của một worker khi handler gọi DB sync (blocking event loop)
+so với session async.
+
+    python benchmark/db_concurrency.py --requests 500 --concurrency 50 --latency_ms 5
+
+Mỗi query gọi hàm `sleep_ms` đăng ký trong SQLite để giả lập độ trễ MySQL.
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+
+def sleep_ms(value):
+    time.sleep(value / 1000)
+    return value
+
+
+def register_sleep(engine):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("sleep_ms", 1, sleep_ms)
+
+
+def build_app(path: str, latency_ms: float) -> FastAPI:
+    sync_engine = create_engine(f"sqlite:///{path}")
+    register_sleep(sync_engine)
+    SyncSession = sessionmaker(bind=sync_engine)
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=20)
+    register_sleep(async_engine.sync_engine)
+    AsyncSession = async_sessionmaker(bind=async_engine)
+
+    app = FastAPI()
+    query = text("SELECT sleep_ms(:latency)")
+
+    @app.get("/sync")
+    async def sync_handler():
+        with SyncSession() as db:
+            return {"value": db.execute(query, {"latency": latency_ms}).scalar()}
+
+    @app.get("/async")
+    async def async_handler():
+        async with AsyncSession() as db:
+            return {"value": (await db.execute(query, {"latency": latency_ms})).scalar()}
+
+    return app
+
+
+async def drive(app: FastAPI, path: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return total / (time.perf_counter() - start)
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as folder:
+        app = build_app(os.path.join(folder, "bench.db"), args.latency_ms)
+        for path in ("/sync", "/async"):
+            await drive(app, path, args.concurrency, args.concurrency)
+            throughput = await drive(app, path, args.requests, args.concurrency)
+            print(f"{path:<8} {throughput:10.1f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DB concurrency benchmark")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency_ms", type=float, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,158 @@
+"""
+Kiểm tra export NDJSON chạy với bộ nhớ không đổi trên SQLite tạm.
+
+    python benchmark/export.py --chats 20000 --messages 10 --max_mb 32
+
+Export hai lần: sau khi seed 1/10 dữ liệu và sau khi seed toàn bộ. Peak memory (tracemalloc)
+của cả hai lần phải nằm dưới --max_mb và gần như bằng nhau; vượt ngưỡng thì thoát với mã 1.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+parser = argparse.ArgumentParser(description="NDJSON export memory check")
+parser.add_argument("--chats", type=int, default=20000)
+parser.add_argument("--messages", type=int, default=10)
+parser.add_argument("--max_mb", type=float, default=32)
+parser.add_argument("--gzip", type=int, default=0)
+args = parser.parse_args()
+
+folder = tempfile.mkdtemp()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.argv = sys.argv[:1]
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'export.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+
+from sqlalchemy import insert
+from backend import app
+from models.chat import Chat
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from models.chat_message import ChatMessage
+from helper.token import create_access_token
+from database.database import Base, SesionLocal, engine
+
+TOKEN = create_access_token({"id": 1, "user_name": "admin", "email": "admin@example.com", "role_id": 1})
+
+
+async def seed_reference():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    async with SesionLocal() as db:
+        db.add_all([
+            Permission(id=1, name="all", route="/"),
+            Role(id=1, name="admin", permission_ids=[1]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        await db.flush()
+        db.add(User(
+            id=1, user_name="admin", email="admin@example.com", password="x",
+            default_prompt=1, default_model=1, role_id=1,
+        ))
+        await db.commit()
+
+
+async def seed_chats(start: int, stop: int, batch: int = 2000):
+    content = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4
+    async with SesionLocal() as db:
+        for first in range(start, stop, batch):
+            ids = range(first, min(first + batch, stop))
+            await db.execute(insert(Chat), [
+                {"id": chat_id, "title": f"chat {chat_id}", "conversation": [], "user_id": 1, "last_seq": args.messages}
+                for chat_id in ids
+            ])
+            await db.execute(insert(ChatMessage), [
+                {"chat_id": chat_id, "seq": seq, "role": "user" if seq % 2 else "assistant", "content": content}
+                for chat_id in ids
+                for seq in range(1, args.messages + 1)
+            ])
+        await db.commit()
+
+
+async def export(path: str) -> dict:
+    """
+    Gọi thẳng ASGI app và bỏ từng chunk sau khi đếm, để đo đúng bộ nhớ phía server
+    """
+    query = b"gzip=true" if args.gzip else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query,
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {TOKEN}".encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    stats = {"status": None, "bytes": 0, "lines": 0}
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            stats["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            stats["bytes"] += len(body)
+            stats["lines"] += body.count(b"\n")
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    stats["seconds"] = time.perf_counter() - start
+    stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    return stats
+
+
+async def main():
+    await seed_reference()
+    small = max(1, args.chats // 10)
+    await seed_chats(1, small + 1)
+
+    tracemalloc.start()
+    # Lượt đầu để import / cache lazy không bị tính vào peak
+    await export("/chats/export")
+
+    results = []
+    for label, stop in (("10%", small + 1), ("100%", args.chats + 1)):
+        if stop > small + 1:
+            tracemalloc.stop()
+            await seed_chats(small + 1, stop)
+            tracemalloc.start()
+        stats = await export("/chats/export")
+        assert stats["status"] == 200, stats
+        results.append(stats)
+        print(
+            f"{label:>5} chats={stop - 1:>8} lines={stats['lines']:>8} "
+            f"bytes={stats['bytes'] / 1024 / 1024:8.1f} MiB peak={stats['peak_mb']:6.1f} MiB "
+            f"time={stats['seconds']:6.2f}s"
+        )
+
+    await engine.dispose()
+    peak = max(stats["peak_mb"] for stats in results)
+    if peak > args.max_mb:
+        print(f"FAIL peak memory {peak:.1f} MiB > {args.max_mb} MiB")
+        sys.exit(1)
+    print(f"OK peak memory {peak:.1f} MiB <= {args.max_mb} MiB")
+
+
+asyncio.run(main())
@@ -0,0 +1,328 @@
+"""
+Load test / regression benchmark cho toàn bộ router: seed SQLite tạm bằng database.seed, chạy backend:app (process uvicorn thật
+hoặc in-process qua ASGI) và cho nhiều client async gửi hỗn hợp login / list / detail / create / update
+của auth, users, chats, roles, permissions, prompts, models.
+
+    python benchmark/load_test.py --clients 20 --seconds 20 --save_baseline
+    python benchmark/load_test.py --clients 20 --seconds 20 --threshold 0.2
+
+In throughput và p50 / p95 / p99 theo từng thao tác. Có file baseline (--baseline) thì so sánh:
+p95 của thao tác nào tăng quá --threshold (và hơn --min_delta_ms) hoặc throughput tổng giảm quá
+--threshold thì thoát với mã 1 (bỏ qua thao tác có ít hơn --min_count mẫu); request lỗi (5xx, lỗi kết nối, status ngoài dự kiến) cũng làm fail.
+Rate limit bị tắt để đo chính app.
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+parser = argparse.ArgumentParser(description="HTTP load test for every router")
+parser.add_argument("--mode", choices=("server", "asgi"), default="server", help="uvicorn process over TCP or in-process ASGI")
+parser.add_argument("--workers", type=int, default=1, help="uvicorn workers in server mode")
+parser.add_argument("--port", type=int, default=9872)
+parser.add_argument("--clients", type=int, default=20)
+parser.add_argument("--seconds", type=float, default=20)
+parser.add_argument("--warmup", type=float, default=2, help="seconds excluded from the statistics")
+parser.add_argument("--users", type=int, default=500)
+parser.add_argument("--chats_per_user", type=float, default=4)
+parser.add_argument("--messages_median", type=float, default=8)
+parser.add_argument("--prompts", type=int, default=200)
+parser.add_argument("--models", type=int, default=20)
+parser.add_argument("--roles", type=int, default=10)
+parser.add_argument("--permissions", type=int, default=30)
+parser.add_argument("--seed", type=int, default=1)
+parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_baseline.json"))
+parser.add_argument("--save_baseline", action="store_true", help="write this run as the new baseline")
+parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+parser.add_argument("--min_delta_ms", type=float, default=2, help="ignore p95 regressions smaller than this")
+parser.add_argument("--min_count", type=int, default=20, help="skip p95 checks for operations with fewer samples")
+args = parser.parse_args()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+folder = tempfile.mkdtemp()
+sys.path.insert(0, ROOT)
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'load.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+os.environ["BACKEND_RATE_LIMIT_RATE"] = "0"
+for name in ("SEARCH_INDEX_PATH", "METRICS_DIR", "CACHE_VERSION_DIR", "RATE_LIMIT_DB"):
+    os.environ[name] = os.path.join(folder, name.lower())
+
+import httpx
+from database import seed
+
+WORDS = seed.WORDS
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate() -> dict:
+    """
+    Dữ liệu từ database.seed: user 1..clients có role 1 (permission "/") để đăng nhập gọi mọi API
+    """
+    options = seed.build_parser().parse_args([
+        f"--users={args.users}", f"--chats_per_user={args.chats_per_user}", f"--messages_median={args.messages_median}",
+        f"--prompts={args.prompts}", f"--models={args.models}", f"--roles={args.roles}",
+        f"--permissions={args.permissions}", f"--admins={args.clients}", f"--seed={args.seed}", "--search_index",
+    ])
+    return seed.generate(options)
+
+
+class Client:
+    """
+    Một người dùng ảo: login bằng user riêng rồi lặp chọn thao tác theo trọng số
+    """
+
+    def __init__(self, index: int, http: httpx.AsyncClient, chats: int):
+        self.index = index
+        self.http = http
+        self.chats = chats
+        self.rng = random.Random(args.seed * 1000 + index)
+        self.user_id = index + 1
+        self.created = 0
+
+    def unique(self, prefix: str) -> str:
+        self.created += 1
+        return f"{prefix}-{self.index}-{self.created}-{self.rng.getrandbits(32)}"
+
+    def pick(self, count: int, first: int = 1) -> int:
+        return self.rng.randint(first, max(first, count))
+
+    async def login(self):
+        response = await self.http.post("/auth/login", json={"user_name": f"user{self.user_id}", "password": "password"})
+        if response.json()["code"] != 200:
+            raise RuntimeError(f"login user{self.user_id} failed: {response.text}")
+        self.use_tokens(response)
+        return response
+
+    async def refresh(self):
+        response = await self.http.post("/auth/refresh-token", json={"refresh_token": self.refresh_token})
+        if response.json()["code"] == 200:
+            self.use_tokens(response)
+        return response
+
+    def use_tokens(self, response: httpx.Response):
+        data = response.json()["data"]
+        self.http.headers["Authorization"] = f"Bearer {data['token']}"
+        self.refresh_token = data["refresh_token"]
+
+    def user_body(self, name: str) -> dict:
+        return {
+            "user_name": name, "email": f"{name}@load.test", "password": "secret", "role_id": 1,
+            "default_prompt": self.pick(args.prompts), "default_model": self.pick(args.models),
+            "prompt_ids": [self.pick(args.prompts)], "models": [self.pick(args.models)],
+        }
+
+    def operations(self):
+        """
+        (tên, trọng số, hàm tạo request, status mong đợi). Đọc nhiều hơn ghi; user / role / permission
+        được update là các dòng không dùng để đăng nhập / phân quyền.
+        """
+        users, chats = args.users, self.chats
+        login_users = args.clients
+        return [
+            ("POST /auth/login", 1, lambda: self.login(), 200),
+            ("POST /auth/refresh-token", 2, lambda: self.refresh(), 200),
+            ("GET /users", 6, lambda: self.http.get("/users", params={"limit": 20, "skip": self.pick(users // 2, 0)}), 200),
+            ("GET /users/{id}", 8, lambda: self.http.get(f"/users/{self.pick(users)}"), 200),
+            ("GET /users/{id}/chats", 6, lambda: self.http.get(f"/users/{self.pick(users)}/chats", params={"limit": 20}), 200),
+            ("POST /users", 1, lambda: self.http.post("/users", json=self.user_body(self.unique("user"))), 201),
+            ("PUT /users/{id}", 1, lambda: self.http.put(
+                f"/users/{self.pick(users, login_users + 1)}", json=self.user_body(self.unique("renamed"))), 200),
+            ("GET /chats", 6, lambda: self.http.get("/chats", params={"limit": 20, "skip": self.pick(chats // 2, 0)}), 200),
+            ("GET /chats/{id}", 8, lambda: self.http.get(f"/chats/{self.pick(chats)}"), 200),
+            ("GET /chats/{id}/messages", 6, lambda: self.http.get(f"/chats/{self.pick(chats)}/messages", params={"limit": 50}), 200),
+            ("GET /chats/search", 3, lambda: self.http.get("/chats/search", params={"q": self.rng.choice(WORDS)}), 200),
+            ("POST /chats", 2, lambda: self.http.post("/chats", json={
+                "title": self.unique("chat"), "user_id": self.user_id, "conversation": []}), 201),
+            ("POST /chats/{id}/messages", 3, lambda: self.http.post(
+                f"/chats/{self.pick(chats)}/messages", json=[{"role": "user", "content": sentence(self.rng, 20)}]), 201),
+            ("GET /roles", 2, lambda: self.http.get("/roles"), 200),
+            ("GET /roles/{id}", 2, lambda: self.http.get(f"/roles/{self.pick(args.roles)}"), 200),
+            ("POST /roles", 0.5, lambda: self.http.post("/roles", json={"name": self.unique("role"), "permission_ids": [1]}), 201),
+            ("PUT /roles/{id}", 0.5, lambda: self.http.put(f"/roles/{self.pick(args.roles, 2)}", json={
+                "name": self.unique("role"), "permission_ids": [self.pick(args.permissions, 2)]}), 200),
+            ("GET /permissions", 2, lambda: self.http.get("/permissions"), 200),
+            ("GET /permissions/{id}", 2, lambda: self.http.get(f"/permissions/{self.pick(args.permissions)}"), 200),
+            ("POST /permissions", 0.5, lambda: self.http.post("/permissions", json={
+                "name": self.unique("permission"), "route": f"/load/{self.unique('route')}"}), 201),
+            ("PUT /permissions/{id}", 0.5, lambda: self.http.put(f"/permissions/{self.pick(args.permissions, 2)}", json={
+                "name": self.unique("permission"), "route": f"/load/{self.unique('route')}"}), 200),
+            ("GET /prompts", 3, lambda: self.http.get("/prompts", params={"limit": 20}), 200),
+            ("GET /prompts/{id}", 3, lambda: self.http.get(f"/prompts/{self.pick(args.prompts)}"), 200),
+            ("POST /prompts", 1, lambda: self.http.post("/prompts", json={"content": sentence(self.rng, 12)}), 201),
+            ("PUT /prompts/{id}", 1, lambda: self.http.put(f"/prompts/{self.pick(args.prompts)}", json={
+                "content": sentence(self.rng, 12)}), 200),
+            ("GET /models", 4, lambda: self.http.get("/models"), 200),
+            ("GET /models/{id}", 3, lambda: self.http.get(f"/models/{self.pick(args.models)}"), 200),
+            ("POST /models", 0.5, lambda: self.http.post("/models", json={
+                "name": self.unique("model"), "detail_name": self.unique("detail"), "type": "local"}), 201),
+            ("PUT /models/{id}", 0.5, lambda: self.http.put(f"/models/{self.pick(args.models)}", json={
+                "name": self.unique("model"), "detail_name": self.unique("detail"), "type": "cloud"}), 200),
+        ]
+
+    async def run(self, started: float, deadline: float, samples: list, errors: list):
+        await self.login()
+        operations = self.operations()
+        weights = [weight for _, weight, _, _ in operations]
+        while time.monotonic() < deadline:
+            name, _, request, expected = self.rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await request()
+                body = response.json()
+                code = body.get("code", response.status_code)
+            except (httpx.HTTPError, ValueError) as exc:
+                errors.append((name, type(exc).__name__))
+                continue
+            elapsed = time.perf_counter() - start
+            if code != expected:
+                errors.append((name, code, str(body.get("message"))[:120]))
+            elif time.monotonic() - started >= args.warmup:
+                samples.append((name, elapsed))
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(samples: list, seconds: float) -> dict:
+    by_name = {}
+    for name, elapsed in samples:
+        by_name.setdefault(name, []).append(elapsed * 1000)
+    routes = {}
+    for name, values in sorted(by_name.items()):
+        values.sort()
+        routes[name] = {
+            "count": len(values),
+            "rps": len(values) / seconds,
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+        }
+    return {"throughput": len(samples) / seconds, "routes": routes}
+
+
+def print_report(result: dict):
+    print(f"{'operation':<28} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in result["routes"].items():
+        print(f"{name:<28} {stats['count']:>7} {stats['rps']:>8.1f} {stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['p99']:>8.2f}")
+    print(f"total throughput {result['throughput']:.1f} req/s")
+
+
+def compare(result: dict, baseline: dict) -> list:
+    failures = []
+    if baseline.get("config") != result["config"]:
+        print(f"WARNING baseline was recorded with {baseline.get('config')}")
+    if result["throughput"] < baseline["throughput"] * (1 - args.threshold):
+        failures.append(f"throughput {result['throughput']:.1f} < {baseline['throughput']:.1f} req/s - {args.threshold:.0%}")
+    for name, stats in result["routes"].items():
+        base = baseline["routes"].get(name)
+        # p95 của vài mẫu chỉ là nhiễu
+        if base is None or min(stats["count"], base["count"]) < args.min_count:
+            continue
+        limit = base["p95"] * (1 + args.threshold)
+        if stats["p95"] > limit and stats["p95"] - base["p95"] > args.min_delta_ms:
+            failures.append(f"{name} p95 {stats['p95']:.2f} ms > {base['p95']:.2f} ms + {args.threshold:.0%}")
+    return failures
+
+
+def wait_for_port(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not listen on {port}")
+
+
+async def drive(make_client, chats: int) -> tuple:
+    samples, errors = [], []
+    started = time.monotonic()
+    deadline = started + args.warmup + args.seconds
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    clients = [make_client(limits) for _ in range(args.clients)]
+    try:
+        await asyncio.gather(*(
+            Client(index, http, chats).run(started, deadline, samples, errors) for index, http in enumerate(clients)
+        ))
+    finally:
+        for http in clients:
+            await http.aclose()
+    return samples, errors
+
+
+async def drive_asgi(chats: int) -> tuple:
+    import backend
+    async with backend.app.router.lifespan_context(backend.app):
+        transport = httpx.ASGITransport(app=backend.app)
+        return await drive(lambda limits: httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60), chats)
+
+
+def drive_server(chats: int) -> tuple:
+    log_path = os.path.join(folder, "server.log")
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            [
+                sys.executable, "backend.py", f"--port={args.port}", "--reload=0", f"--workers={args.workers}",
+                "--log_level=warning", "--limit_max_requests=1000000000",
+            ],
+            cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        try:
+            wait_for_port(args.port)
+        except RuntimeError:
+            print(open(log_path).read()[-3000:])
+            raise
+        return asyncio.run(drive(lambda limits: httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60,
+        ), chats))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main():
+    start = time.perf_counter()
+    totals = generate()
+    print(f"seeded {totals['user']} users, {totals['chat']} chats, {totals['chat_message']} messages in {time.perf_counter() - start:.1f} s")
+
+    chats = totals["chat"]
+    samples, errors = drive_server(chats) if args.mode == "server" else asyncio.run(drive_asgi(chats))
+    result = summarize(samples, args.seconds)
+    result["config"] = {
+        name: getattr(args, name)
+        for name in ("mode", "workers", "clients", "users", "chats_per_user", "messages_median", "prompts", "models", "seed")
+    }
+    print_report(result)
+
+    failures = [f"{len(errors)} failed requests, e.g. {sorted(set(map(str, errors)))[:5]}"] if errors else []
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(result, file, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            failures += compare(result, json.load(file))
+    else:
+        print(f"no baseline at {args.baseline}, run with --save_baseline to record one")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+main()
@@ -0,0 +1,103 @@
+"""
+Benchmark login với N client đồng thời trên SQLite tạm.
+
+    python benchmark/login.py --clients 50 --logins 400 --users 20
+
+Đồng thời đo độ trễ của GET / trong lúc login storm để thấy event loop không bị block
+bởi việc hash password.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+parser = argparse.ArgumentParser(description="Login throughput benchmark")
+parser.add_argument("--clients", type=int, default=50)
+parser.add_argument("--logins", type=int, default=400)
+parser.add_argument("--users", type=int, default=20)
+args = parser.parse_args()
+
+folder = tempfile.mkdtemp()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.argv = sys.argv[:1]
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'login.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+os.environ["BACKEND_RATE_LIMIT_RATE"] = "0"
+
+import httpx
+from backend import app
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from helper.password import hash_password
+from database.database import Base, SesionLocal, engine
+
+
+async def seed(users: int):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    passwords = await asyncio.gather(*(hash_password(f"password{index}") for index in range(users)))
+    async with SesionLocal() as db:
+        db.add_all([
+            Role(id=1, name="user", permission_ids=[]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        db.add_all([
+            User(
+                user_name=f"user{index}", email=f"user{index}@example.com", password=password,
+                default_prompt=1, default_model=1, role_id=1,
+            )
+            for index, password in enumerate(passwords)
+        ])
+        await db.commit()
+
+
+def percentile(values, ratio):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))] * 1000
+
+
+async def main():
+    await seed(args.users)
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(args.clients)
+    login_latency, health_latency = [], []
+    running = True
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(index: int):
+            async with semaphore:
+                user = index % args.users
+                start = time.perf_counter()
+                response = await client.post("/auth/login", json={"user_name": f"user{user}", "password": f"password{user}"})
+                login_latency.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        async def health():
+            while running:
+                start = time.perf_counter()
+                await client.get("/")
+                health_latency.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe = asyncio.create_task(health())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(index) for index in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        running = False
+        await probe
+
+    print(f"logins          {args.logins / elapsed:10.1f} req/s ({args.clients} clients)")
+    print(f"login latency   p50 {percentile(login_latency, 0.5):8.1f} ms  p95 {percentile(login_latency, 0.95):8.1f} ms")
+    print(f"GET / latency   p50 {percentile(health_latency, 0.5):8.1f} ms  max {max(health_latency) * 1000:8.1f} ms")
+    print(f"GET / mean      {statistics.mean(health_latency) * 1000:8.1f} ms")
+    await engine.dispose()
+
+
+asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+Đo chi phí hot path của metrics: MetricsMiddleware quanh một ASGI app rỗng và phần ghi số liệu
+của engine event cho mỗi câu SQL.
+
+    python benchmark/metrics.py --requests 200000 --max_us 5
+
+Overhead = (thời gian có middleware - không middleware) / số request. Vượt --max_us thì thoát với mã 1.
+Kiểm tra thêm mọi checkout của pool (Session, AsyncSession, engine.begin / connect) đều được đo thời gian chờ:
+thời gian chờ đo bằng cách bọc Engine.connect, nếu SQLAlchemy đổi đường lấy connection thì hai số lệch nhau.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+parser = argparse.ArgumentParser(description="Metrics hot path overhead")
+parser.add_argument("--requests", type=int, default=200_000)
+parser.add_argument("--max_us", type=float, default=5)
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.argv = sys.argv[:1]
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'metrics.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from helper import metrics
+from middleware.metrics import MetricsMiddleware
+
+
+class Route:
+    path = "/chats/{chat_id}"
+
+
+async def app(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def run(handler, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/chats/1"}
+    start = time.perf_counter()
+    for _ in range(requests):
+        await handler(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def run_queries(requests: int) -> float:
+    """
+    Phần việc của before/after_cursor_execute cho một câu SQL
+    """
+    info = {}
+    statement = "SELECT chat.id, chat.title FROM chat WHERE chat.id = ?"
+    start = time.perf_counter()
+    for _ in range(requests):
+        info.setdefault("query_start", []).append(time.perf_counter())
+        elapsed = time.perf_counter() - info["query_start"].pop()
+        operation = ("primary", metrics.query_operation(statement))
+        metrics.db_queries.inc(operation)
+        metrics.db_query_latency.observe(operation, elapsed)
+    return time.perf_counter() - start
+
+
+async def pool_wait_coverage() -> bool:
+    """
+    Mỗi checkout (pool event) phải có đúng một lần đo thời gian chờ
+    """
+    from database.database import SesionLocal, create_engine_for
+
+    target = create_engine_for(os.environ["URL_DATABASE"])
+    metrics.instrument_engine(target, "coverage")
+    async with SesionLocal(bind=target) as db:
+        await db.execute(text("SELECT 1"))
+        await db.commit()
+        await db.execute(text("SELECT 1"))
+    async with target.begin() as connection:
+        await connection.execute(text("SELECT 1"))
+    async with target.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+    def sync_session(connection):
+        with Session(bind=connection.engine) as db:
+            db.execute(text("SELECT 1"))
+
+    async with target.connect() as connection:
+        await connection.run_sync(sync_session)
+    await target.dispose()
+
+    checkouts = metrics.db_pool_checkouts.collect().get(("coverage",), 0)
+    waits = metrics.db_pool_wait.collect().get(("coverage",), [0])[:-1]
+    print(f"pool checkouts    {checkouts}, timed waits {sum(waits)}")
+    return checkouts > 0 and checkouts == sum(waits)
+
+
+async def main():
+    # Lượt nóng máy
+    await run(app, 10_000)
+    await run(MetricsMiddleware(app), 10_000)
+
+    bare = min([await run(app, args.requests) for _ in range(3)])
+    measured = min([await run(MetricsMiddleware(app), args.requests) for _ in range(3)])
+    request_us = (measured - bare) / args.requests * 1e6
+    query_us = min(run_queries(args.requests) for _ in range(3)) / args.requests * 1e6
+
+    print(f"requests={args.requests}")
+    print(f"bare app         {bare / args.requests * 1e6:7.3f} us/request")
+    print(f"with middleware  {measured / args.requests * 1e6:7.3f} us/request")
+    print(f"overhead         {request_us:7.3f} us/request")
+    print(f"query metrics    {query_us:7.3f} us/statement")
+
+    if not await pool_wait_coverage():
+        print("FAIL pool wait is not timed for every checkout (Engine.connect is no longer the checkout path)")
+        sys.exit(1)
+
+    worst = max(request_us, query_us)
+    if worst > args.max_us:
+        print(f"FAIL overhead {worst:.3f} us > {args.max_us} us")
+        sys.exit(1)
+    print(f"OK overhead {worst:.3f} us <= {args.max_us} us")
+
+
+asyncio.run(main())
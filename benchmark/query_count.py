@@ -0,0 +1,135 @@
+"""
+Kiểm tra số câu SQL mỗi endpoint (X-Query-Count của SQL profiler) để bắt N+1 mà lazy="raise" không bắt được
+(vòng lặp await db.scalars(...) theo từng dòng).
+
+    python benchmark/query_count.py
+
+Mỗi endpoint list được gọi với trang nhỏ và trang lớn, endpoint detail với dòng có ít và nhiều dữ liệu liên quan
+(user ít / nhiều chat, chat ít / nhiều tin nhắn, role ít / nhiều permission). Mỗi request được đo hai lần:
+cache role / prompt / model / permission rỗng (lookup theo từng dòng lộ ra) và cache đã nóng.
+Thoát với mã 1 nếu số câu SQL tăng theo số dòng hoặc vượt mức đã chốt trong EXPECTED.
+"""
+import os
+import sys
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+
+parser = argparse.ArgumentParser(description="Queries per endpoint regression check")
+parser.add_argument("--users", type=int, default=200)
+parser.add_argument("--small", type=int, default=2, help="page size of the small list request")
+parser.add_argument("--large", type=int, default=50, help="page size of the large list request")
+args = parser.parse_args()
+
+folder = tempfile.mkdtemp()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATABASE = os.path.join(folder, "query_count.db")
+os.environ["URL_DATABASE"] = f"sqlite:///{DATABASE}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+os.environ["BACKEND_SQL_PROFILE"] = "1"
+os.environ["BACKEND_RATE_LIMIT_RATE"] = "0"
+for name in ("SEARCH_INDEX_PATH", "METRICS_DIR", "CACHE_VERSION_DIR", "RATE_LIMIT_DB"):
+    os.environ[name] = os.path.join(folder, name.lower())
+
+import httpx
+from database import seed
+
+# Số câu SQL tối đa mỗi endpoint (cache rỗng). Tăng mức này phải có lý do trong review.
+EXPECTED = {
+    "GET /users": 7,
+    "GET /users/{id}": 7,
+    "GET /users/{id}/chats": 2,
+    "GET /chats": 8,
+    "GET /chats/{id}": 8,
+    "GET /chats/{id}/messages": 2,
+    "GET /roles": 2,
+    "GET /roles/{id}": 2,
+    "GET /permissions": 2,
+    "GET /prompts": 2,
+    "GET /models": 2,
+}
+
+
+def extremes(sql: str) -> tuple:
+    """
+    (id có ít nhất, id có nhiều nhất) dữ liệu liên quan
+    """
+    rows = sqlite3.connect(DATABASE).execute(sql).fetchall()
+    return rows[0][0], rows[-1][0]
+
+
+def build_cases() -> dict:
+    seed.generate(seed.build_parser().parse_args([
+        f"--users={args.users}", "--chats_per_user=5", "--messages_median=10", "--roles=10", "--permissions=40",
+    ]))
+    few_chats, many_chats = extremes(
+        'SELECT user_id FROM chat GROUP BY user_id ORDER BY COUNT(*), user_id'
+    )
+    few_messages, many_messages = extremes('SELECT id FROM chat ORDER BY last_seq, id')
+    few_permissions, many_permissions = extremes('SELECT id FROM role ORDER BY json_array_length(permission_ids), id')
+
+    cases = {
+        "GET /users": [("/users", {"limit": args.small}), ("/users", {"limit": args.large})],
+        "GET /users/{id}": [(f"/users/{few_chats}", {}), (f"/users/{many_chats}", {})],
+        "GET /users/{id}/chats": [
+            (f"/users/{many_chats}/chats", {"limit": args.small}), (f"/users/{many_chats}/chats", {"limit": args.large}),
+        ],
+        "GET /chats": [("/chats", {"limit": args.small}), ("/chats", {"limit": args.large})],
+        "GET /chats/{id}": [(f"/chats/{few_messages}", {}), (f"/chats/{many_messages}", {})],
+        "GET /chats/{id}/messages": [
+            (f"/chats/{many_messages}/messages", {"limit": args.small}),
+            (f"/chats/{many_messages}/messages", {"limit": args.large}),
+        ],
+        "GET /roles": [("/roles", {"limit": args.small}), ("/roles", {"limit": args.large})],
+        "GET /roles/{id}": [(f"/roles/{few_permissions}", {}), (f"/roles/{many_permissions}", {})],
+        "GET /permissions": [("/permissions", {"limit": args.small}), ("/permissions", {"limit": args.large})],
+        "GET /prompts": [("/prompts", {"limit": args.small}), ("/prompts", {"limit": args.large})],
+        "GET /models": [("/models", {"limit": args.small}), ("/models", {"limit": args.large})],
+    }
+    return cases
+
+
+async def main(cases: dict):
+    import backend
+    from helper.cache import reference_caches
+    failures = []
+    transport = httpx.ASGITransport(app=backend.app)
+    async with backend.app.router.lifespan_context(backend.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://queries") as client:
+            response = await client.post("/auth/login", json={"user_name": "user1", "password": "password"})
+            client.headers["Authorization"] = f"Bearer {response.json()['data']['token']}"
+            client.headers["X-SQL-Profile"] = "1"
+
+            async def request(path: str, query: dict) -> int:
+                response = await client.get(path, params=query)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+                return int(response.headers["X-Query-Count"])
+
+            async def count(path: str, query: dict) -> tuple:
+                for cache in reference_caches:
+                    cache.invalidate()
+                cold = await request(path, query)
+                return cold, await request(path, query)
+
+            print(f"{'endpoint':<26} {'small':>6} {'large':>6} {'small*':>6} {'large*':>6} {'max':>6}  (* cache nóng)")
+            for name, (small, large) in cases.items():
+                (small_cold, small_warm), (large_cold, large_warm) = await count(*small), await count(*large)
+                print(
+                    f"{name:<26} {small_cold:>6} {large_cold:>6} {small_warm:>6} {large_warm:>6} {EXPECTED[name]:>6}"
+                )
+                for state, counts in (("cold", (small_cold, large_cold)), ("warm", (small_warm, large_warm))):
+                    if counts[1] > counts[0]:
+                        failures.append(f"{name} ({state} cache) runs {counts[0]} queries for {small} but {counts[1]} for {large}")
+                if max(small_cold, large_cold) > EXPECTED[name]:
+                    failures.append(f"{name} runs {max(small_cold, large_cold)} queries, expected at most {EXPECTED[name]}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK query count does not grow with rows")
+
+
+asyncio.run(main(build_cases()))
@@ -0,0 +1,122 @@
+"""
+Kiểm tra rate limit và đo chi phí mỗi request của hai backend.
+
+    python benchmark/rate_limit.py --requests 20000
+
+Kiểm tra: user hết bucket nhận 429 + Retry-After, response được phép có RateLimit-*, bucket của
+user khác / IP khác độc lập, route nặng trừ nhiều token hơn, hai limiter dùng chung file SQLite
+(như hai worker) chia nhau cùng một bucket. Sai một bước thì thoát với mã 1.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+parser = argparse.ArgumentParser(description="Rate limit check")
+parser.add_argument("--requests", type=int, default=20_000)
+args = parser.parse_args()
+
+folder = tempfile.mkdtemp()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.argv = sys.argv[:1]
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'rate_limit.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+
+import httpx
+from backend import app
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from helper.token import create_access_token
+from helper.rate_limit import MemoryBackend, SQLiteBackend, RateLimiter, rate_limiter, route_cost
+from database.database import Base, SesionLocal, engine
+
+TOKENS = [
+    create_access_token({"id": index, "user_name": f"user{index}", "email": f"user{index}@example.com", "role_id": 1})
+    for index in (1, 2)
+]
+
+
+async def seed():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with SesionLocal() as db:
+        db.add_all([
+            Permission(id=1, name="all", route="/"),
+            Role(id=1, name="admin", permission_ids=[1]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        await db.flush()
+        db.add_all([
+            User(
+                id=index, user_name=f"user{index}", email=f"user{index}@example.com", password="x",
+                default_prompt=1, default_model=1, role_id=1,
+            )
+            for index in range(1, len(TOKENS) + 1)
+        ])
+        await db.commit()
+
+
+def check(condition: bool, message: str):
+    print(f"{'OK  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        sys.exit(1)
+
+
+async def per_request(limiter: RateLimiter, requests: int) -> float:
+    start = time.perf_counter()
+    for index in range(requests):
+        await limiter.take(f"user:{index % 100}", 1)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def main():
+    await seed()
+    # Bucket nhỏ, gần như không refill trong lúc kiểm tra
+    rate_limiter.backend = MemoryBackend()
+    rate_limiter.rate, rate_limiter.burst = 0.01, 10
+
+    transport = httpx.ASGITransport(app=app, client=("203.0.113.7", 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        first = {"Authorization": f"Bearer {TOKENS[0]}"}
+        responses = [await client.get("/models", headers=first) for _ in range(11)]
+        codes = [response.status_code for response in responses]
+        check(codes == [200] * 10 + [429], f"burst of 10 then 429 (got {codes.count(200)} x 200)")
+        check(responses[0].headers.get("RateLimit-Remaining") == "9", "allowed response carries RateLimit-Remaining")
+        limited = responses[-1]
+        check(
+            int(limited.headers.get("Retry-After", 0)) >= 1 and limited.json()["code"] == 429,
+            f"429 carries Retry-After={limited.headers.get('Retry-After')} in the response envelope",
+        )
+
+        second = {"Authorization": f"Bearer {TOKENS[1]}"}
+        response = await client.get("/models", headers=second)
+        check(response.status_code == 200, "another user has an independent bucket")
+
+        codes = [(await client.post("/auth/login", json={"user_name": "nobody", "password": "x"})).status_code for _ in range(3)]
+        check(codes[-1] == 429, f"anonymous requests are limited per IP, login costs {route_cost('POST', '/auth/login')}")
+
+    other_ip = httpx.ASGITransport(app=app, client=("198.51.100.9", 1234))
+    async with httpx.AsyncClient(transport=other_ip, base_url="http://bench") as client:
+        response = await client.post("/auth/login", json={"user_name": "nobody", "password": "x"})
+        check(response.status_code != 429, "another IP has an independent bucket")
+
+    path = os.path.join(folder, "shared.sqlite3")
+    workers = [RateLimiter(SQLiteBackend(path), rate=0.01, burst=10) for _ in range(2)]
+    allowed = [(await workers[index % 2].take("user:1", 1)).allowed for index in range(12)]
+    check(allowed.count(True) == 10, "two workers sharing the SQLite backend split one bucket")
+
+    memory_us = await per_request(RateLimiter(MemoryBackend(), rate=1e9, burst=1e9), args.requests)
+    sqlite_us = await per_request(RateLimiter(SQLiteBackend(os.path.join(folder, "bench.sqlite3")), rate=1e9, burst=1e9), args.requests // 10)
+    print(f"memory backend  {memory_us:7.2f} us/request")
+    print(f"sqlite backend  {sqlite_us:7.2f} us/request")
+
+    await engine.dispose()
+
+
+asyncio.run(main())
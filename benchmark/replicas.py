@@ -0,0 +1,150 @@
+"""
+Kiểm tra read/write splitting với hai file SQLite làm primary và replica.
+
+    python benchmark/replicas.py --reads 200
+
+Primary và replica được seed cùng dữ liệu nhưng title chat khác nhau để biết request đọc đi đâu.
+Kiểm tra: GET đi replica, request ghi đi primary, đọc ngay sau khi ghi đi primary (read-your-writes) kể cả khi
+đọc ở worker khác (FileWriteLog dùng chung), write log không phình, câu SQL trên replica có trong metrics,
+search không đánh dấu xóa chat replica chưa có, replica không mở được thì GET tự chuyển về primary.
+Sai một bước thì thoát với mã 1.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+parser = argparse.ArgumentParser(description="Replica routing check")
+parser.add_argument("--reads", type=int, default=200)
+args = parser.parse_args()
+
+folder = tempfile.mkdtemp()
+primary_path = os.path.join(folder, "primary.db")
+replica_path = os.path.join(folder, "replica.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.argv = sys.argv[:1]
+os.environ["URL_DATABASE"] = f"sqlite:///{primary_path}"
+# Replica thứ hai trỏ vào thư mục không tồn tại để kiểm tra fallback
+os.environ["URL_DATABASE_REPLICAS"] = f"sqlite:///{replica_path},sqlite:///{os.path.join(folder, 'missing', 'replica.db')}"
+os.environ["REPLICA_STICKY_SECONDS"] = "1"
+os.environ["SEARCH_INDEX_PATH"] = os.path.join(folder, "search.sqlite3")
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+# Đo routing chứ không đo rate limit: --reads GET liên tiếp vượt burst của một user
+os.environ["BACKEND_RATE_LIMIT_RATE"] = "0"
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from backend import app
+from models.chat import Chat
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from helper import metrics
+from helper.search import search_index
+from helper.token import create_access_token
+from database.database import Base, FileWriteLog, LocalWriteLog, ReplicaRouter, engine, replica_engines, replica_router
+
+TOKEN = create_access_token({"id": 1, "user_name": "admin", "email": "admin@example.com", "role_id": 1})
+
+
+async def seed(target, title: str):
+    async with target.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(bind=target, expire_on_commit=False)() as db:
+        db.add_all([
+            Permission(id=1, name="all", route="/"),
+            Role(id=1, name="admin", permission_ids=[1]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        await db.flush()
+        db.add(User(
+            id=1, user_name="admin", email="admin@example.com", password="x",
+            default_prompt=1, default_model=1, role_id=1,
+        ))
+        await db.flush()
+        db.add(Chat(id=1, title=title, conversation=[], user_id=1, last_seq=0))
+        await db.commit()
+
+
+def check(condition: bool, message: str):
+    print(f"{'OK  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        sys.exit(1)
+
+
+def data(response: httpx.Response, message: str) -> dict:
+    """
+    Phần data của response 2xx; lỗi HTTP (429, 500...) in dòng FAIL thay vì traceback
+    """
+    if response.status_code >= 400:
+        check(False, f"{message} (HTTP {response.status_code}: {response.text[:200]})")
+    return response.json()["data"]
+
+
+async def main():
+    await seed(engine, "primary")
+    await seed(replica_engines[0], "replica")
+
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        titles = []
+        start = time.perf_counter()
+        for _ in range(args.reads):
+            response = await client.get("/chats/1")
+            titles.append(data(response, "GET /chats/1 succeeds")["title"])
+        elapsed = time.perf_counter() - start
+        check(set(titles) == {"replica"}, f"{args.reads} GETs served by the healthy replica ({elapsed / args.reads * 1000:.2f} ms/request)")
+        check(len(replica_router._down_until) == 1, "unreachable replica marked down and skipped")
+        replica_queries = sum(
+            value for (name, _), value in metrics.db_queries.collect().items() if name == "replica0"
+        )
+        check(replica_queries >= args.reads, f"replica statements counted in metrics ({replica_queries})")
+
+        response = await client.post("/chats", json={"title": "written", "user_id": 1, "conversation": []})
+        chat_id = data(response, "POST /chats succeeds")["id"]
+        response = await client.get(f"/chats/{chat_id}")
+        check(response.json()["code"] == 200, "read right after a write goes to the primary")
+
+        await asyncio.sleep(1.1)
+        response = await client.get(f"/chats/{chat_id}")
+        check(response.json()["code"] == 404, "after the sticky window reads go back to the replica (row not replicated)")
+
+        search_index.flush()
+        response = await client.get("/chats/search", params={"q": "written"})
+        check(response.json()["code"] == 200 and response.json()["data"] == [], "search skips a chat the replica does not have yet")
+        search_index.flush()
+        marked = search_index._connection().execute("SELECT chat_id FROM chat_deleted").fetchall()
+        check(marked == [], f"a chat missing on the replica is not marked deleted in the search index ({marked})")
+
+        # Hai worker: ghi ở worker A (FileWriteLog dùng chung), đọc ở worker B vẫn đi primary
+        shared = os.path.join(folder, "writes")
+        worker_a = ReplicaRouter(replica_engines, writes=FileWriteLog(shared, sticky=1))
+        worker_b = ReplicaRouter(replica_engines, writes=FileWriteLog(shared, sticky=1))
+        worker_a.note_write(7)
+        check(worker_b.recently_wrote(7), "a write on one worker keeps the user's reads on the primary in another worker")
+        await asyncio.sleep(1.1)
+        worker_a.note_write(8)
+        check(not worker_b.recently_wrote(7) and sorted(os.listdir(shared)) == ["8"], "expired shared write entries are pruned on write")
+
+        local = LocalWriteLog(sticky=1)
+        for user_id in range(1000):
+            local.note(user_id)
+        await asyncio.sleep(1.1)
+        local.note(1000)
+        check(len(local._writes) == 1, "expired in-process write entries are pruned on write")
+
+        replica_router._down_until = {index: time.monotonic() + 60 for index in range(len(replica_engines))}
+        response = await client.get("/chats/1")
+        check(data(response, "GET /chats/1 succeeds")["title"] == "primary", "all replicas down falls back to the primary")
+
+    for target in [engine, *replica_engines]:
+        await target.dispose()
+
+
+asyncio.run(main())
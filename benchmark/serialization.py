@@ -0,0 +1,119 @@
+"""
+Microbenchmark serialize response: 100 user và 100 chat có hội thoại dài.
+
+    python benchmark/serialization.py --rows 100 --turns 200 --rounds 200
+
+legacy: pydantic ResponseMessage -> process_data/to_dict với str(datetime) -> JSONResponse (json stdlib)
+fast:   ResponseMessage -> FastJSONResponse (orjson, to_dict biên dịch sẵn, datetime native)
+"""
+import os
+import sys
+import time
+import argparse
+from typing import Any
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("URL_DATABASE", "sqlite://")
+
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from models.role import Role
+from models.user import User
+from models.chat import Chat
+from models.model import Model
+from models.prompt import Prompt
+from schema.response import ResponseMessage
+
+
+def legacy_dict(value):
+    if isinstance(value, User):
+        return {
+            "id": value.id, "user_name": value.user_name, "email": value.email, "image": value.image,
+            "is_deleted": value.is_deleted,
+            "created_at": str(value.created_at), "updated_at": str(value.updated_at),
+            "role": {
+                "id": value.role.id, "name": value.role.name, "permission_ids": value.role.permission_ids,
+                "created_at": str(value.role.created_at), "updated_at": str(value.role.updated_at),
+            },
+            "default_prompt": {
+                "id": value.detail_default_prompt.id, "content": value.detail_default_prompt.content,
+                "is_deleted": value.detail_default_prompt.is_deleted,
+                "created_at": str(value.detail_default_prompt.created_at),
+                "updated_at": str(value.detail_default_prompt.updated_at),
+            },
+            "default_model": {
+                "id": value.detail_default_model.id, "name": value.detail_default_model.name,
+                "detail_name": value.detail_default_model.detail_name,
+                "is_deleted": value.detail_default_model.is_deleted,
+                "created_at": str(value.detail_default_model.created_at),
+                "updated_at": str(value.detail_default_model.updated_at),
+            },
+        }
+    return {
+        "id": value.id, "title": value.title, "conversation": value.conversation, "user_id": value.user_id,
+        "is_deleted": value.is_deleted, "created_at": str(value.created_at), "updated_at": str(value.updated_at),
+        "user": legacy_dict(value.user),
+    }
+
+
+class LegacyResponseMessage(BaseModel):
+    code: int
+    message: str
+    data: Any = None
+
+    def to_response(self) -> JSONResponse:
+        return JSONResponse(status_code=self.code, content={
+            "code": self.code,
+            "message": self.message,
+            "data": [legacy_dict(item) for item in self.data],
+        })
+
+
+def build_rows(rows: int, turns: int):
+    now = datetime.now()
+    role = Role(id=1, name="admin", permission_ids=[1, 2, 3], created_at=now, updated_at=now)
+    prompt = Prompt(id=1, content="You are a helpful assistant.", is_deleted=False, created_at=now, updated_at=now)
+    model = Model(id=1, name="model", detail_name="model-detail", is_deleted=False, created_at=now, updated_at=now)
+    users = [
+        User(
+            id=index, user_name=f"user{index}", email=f"user{index}@example.com", image=None, is_deleted=False,
+            created_at=now, updated_at=now,
+            role=role, detail_default_prompt=prompt, detail_default_model=model,
+        )
+        for index in range(rows)
+    ]
+    conversation = [
+        {"role": "user" if turn % 2 == 0 else "assistant", "content": f"Message number {turn} " * 20}
+        for turn in range(turns)
+    ]
+    chats = [
+        Chat(
+            id=index, title=f"chat {index}", conversation=conversation, user_id=user.id, last_seq=0,
+            is_deleted=False, created_at=now, updated_at=now, user=user,
+        )
+        for index, user in enumerate(users)
+    ]
+    return users, chats
+
+
+def measure(label: str, build, rounds: int):
+    body = build().body
+    start = time.perf_counter()
+    for _ in range(rounds):
+        build()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{label:<14} {elapsed * 1000:9.3f} ms/response {len(body) / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response serialization benchmark")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    users, chats = build_rows(args.rows, args.turns)
+    for name, data in (("users", users), ("chats", chats)):
+        measure(f"{name} legacy", lambda: LegacyResponseMessage(code=200, message="ok", data=data).to_response(), args.rounds)
+        measure(f"{name} fast", lambda: ResponseMessage(code=200, message="ok", data=data), args.rounds)
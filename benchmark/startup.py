@@ -0,0 +1,119 @@
+"""
+Đo thời gian khởi động một worker trong process mới, tách theo từng giai đoạn:
+nạp cấu hình, import backend (router, model, middleware), lifespan startup (warm pool / cache) và request đầu tiên.
+
+    python benchmark/startup.py --runs 5 --max_ms 3000 --importtime 15
+
+Mỗi lượt là một interpreter mới nên không có module nào được cache. Median của tổng thời gian
+vượt --max_ms thì thoát với mã 1; --importtime N in N module import chậm nhất (python -X importtime).
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+parser = argparse.ArgumentParser(description="Worker startup time")
+parser.add_argument("--runs", type=int, default=5)
+parser.add_argument("--max_ms", type=float, default=3000)
+parser.add_argument("--importtime", type=int, default=0)
+args = parser.parse_args()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+folder = tempfile.mkdtemp()
+sys.path.insert(0, ROOT)
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'startup.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+os.environ["SEARCH_INDEX_PATH"] = os.path.join(folder, "search_index.sqlite3")
+
+CHILD = """
+import time
+start = time.perf_counter()
+from param_compile import params
+params.load()
+configured = time.perf_counter()
+import backend
+imported = time.perf_counter()
+import json, asyncio, httpx
+
+async def main():
+    before = time.perf_counter()
+    async with backend.app.router.lifespan_context(backend.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            assert (await client.get("/")).status_code == 200
+        served = time.perf_counter()
+    return ready - before, served - ready
+
+startup, first_request = asyncio.run(main())
+print(json.dumps({
+    "config": configured - start,
+    "import": imported - configured,
+    "startup": startup,
+    "first_request": first_request,
+}))
+"""
+PHASES = ("interpreter", "config", "import", "startup", "first_request", "total")
+
+
+async def create_tables():
+    from database.database import Base, engine
+    import models.role, models.user, models.chat, models.model, models.prompt, models.permission
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+def run_once() -> dict:
+    import time
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    phases = json.loads(output.strip().splitlines()[-1])
+    phases["total"] = total
+    phases["interpreter"] = total - sum(phases[name] for name in ("config", "import", "startup", "first_request"))
+    return phases
+
+
+def slowest_imports(count: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend"], cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    # Xếp theo thời gian của riêng module (không gồm module con) để không đếm trùng
+    for self_us, cumulative_us, name in sorted(rows, reverse=True)[:count]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+
+def main():
+    asyncio.run(create_tables())
+    run_once()  # Lượt nóng máy: bytecode cache (.pyc), page cache
+    runs = [run_once() for _ in range(args.runs)]
+
+    print(f"runs={args.runs}")
+    print(f"{'phase':<14} {'median ms':>10} {'max ms':>10}")
+    for phase in PHASES:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<14} {statistics.median(values):>10.1f} {max(values):>10.1f}")
+
+    if args.importtime:
+        print("slowest modules imported by backend:")
+        slowest_imports(args.importtime)
+
+    median_total = statistics.median(run["total"] * 1000 for run in runs)
+    if median_total > args.max_ms:
+        print(f"FAIL startup {median_total:.0f} ms > {args.max_ms:.0f} ms")
+        sys.exit(1)
+    print(f"OK startup {median_total:.0f} ms <= {args.max_ms:.0f} ms")
+
+
+main()
@@ -0,0 +1,144 @@
+"""
+Chạy server thật ở chế độ supervisor (--preload=1) trên SQLite tạm, bắn request liên tục trong lúc
+worker bị recycle, rồi in thời gian khởi động của từng worker lấy từ log của supervisor.
+
+    python benchmark/supervisor.py --workers 3 --max_requests 300 --clients 20 --seconds 10
+
+Thoát với mã 1 nếu có request lỗi kết nối / không phải 200 hoặc không có worker nào được recycle.
+"""
+import os
+import re
+import sys
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+parser = argparse.ArgumentParser(description="Supervisor rolling recycle check")
+parser.add_argument("--workers", type=int, default=3)
+parser.add_argument("--max_requests", type=int, default=300)
+parser.add_argument("--clients", type=int, default=20)
+parser.add_argument("--seconds", type=float, default=10)
+parser.add_argument("--port", type=int, default=9871)
+args = parser.parse_args()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+folder = tempfile.mkdtemp()
+sys.path.insert(0, ROOT)
+sys.argv = sys.argv[:1]
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'supervisor.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+# File dùng chung giữa các worker của lần chạy này
+for name in ("METRICS_DIR", "CACHE_VERSION_DIR", "RATE_LIMIT_DB", "SEARCH_INDEX_PATH"):
+    os.environ[name] = os.path.join(folder, name.lower())
+
+import httpx
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from helper.token import create_access_token
+from database.database import Base, SesionLocal, engine
+
+TOKEN = create_access_token({"id": 1, "user_name": "admin", "email": "admin@example.com", "role_id": 1})
+READY = re.compile(r"Worker (\d+) ready in (\d+) ms")
+RECYCLED = re.compile(r"Worker (\d+) recycled")
+
+
+async def seed():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with SesionLocal() as db:
+        db.add_all([
+            Permission(id=1, name="all", route="/"),
+            Role(id=1, name="admin", permission_ids=[1]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        await db.flush()
+        db.add(User(
+            id=1, user_name="admin", email="admin@example.com", password="x",
+            default_prompt=1, default_model=1, role_id=1,
+        ))
+        await db.commit()
+    await engine.dispose()
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not listen on {port}")
+
+
+async def drive(url: str, seconds: float) -> tuple:
+    ok, failed = 0, []
+    deadline = time.monotonic() + seconds
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+
+    async def client():
+        nonlocal ok
+        # Connection mới cho mỗi request để request được chia đều cho các worker
+        async with httpx.AsyncClient(base_url=url, headers=headers, limits=httpx.Limits(max_keepalive_connections=0)) as http:
+            while time.monotonic() < deadline:
+                try:
+                    response = await http.get("/models")
+                    if response.status_code == 200:
+                        ok += 1
+                    else:
+                        failed.append(response.status_code)
+                except httpx.HTTPError as exc:
+                    failed.append(type(exc).__name__)
+
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    return ok, failed
+
+
+def main():
+    asyncio.run(seed())
+    log_path = os.path.join(folder, "server.log")
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            [
+                sys.executable, "backend.py", f"--port={args.port}", "--reload=0", "--preload=1",
+                f"--workers={args.workers}", f"--limit_max_requests={args.max_requests}", "--rate_limit_rate=0",
+                "--log_level=info", "--graceful_timeout=10",
+            ],
+            cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        wait_for_port(args.port)
+        start = time.perf_counter()
+        ok, failed = asyncio.run(drive(f"http://127.0.0.1:{args.port}", args.seconds))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    output = open(log_path).read()
+    starts = [(int(pid), int(ms)) for pid, ms in READY.findall(output)]
+    recycled = RECYCLED.findall(output)
+    print(f"requests ok={ok} failed={len(failed)} ({ok / elapsed:.0f} req/s)")
+    print(f"workers started={len(starts)} recycled={len(recycled)}")
+    for pid, ms in starts:
+        print(f"  worker {pid} cold start {ms} ms")
+
+    if failed:
+        print(f"FAIL failed requests: {sorted(set(map(str, failed)))}")
+        print(output[-3000:])
+        sys.exit(1)
+    if not recycled:
+        print("FAIL no worker was recycled, raise --seconds or lower --max_requests")
+        sys.exit(1)
+    print("OK no request failed while workers were recycled")
+
+
+main()
@@ -0,0 +1,218 @@
+"""
+Kiểm tra access token stateless + refresh token xoay vòng và đo chi phí login / refresh / verify.
+
+    python benchmark/tokens.py --refreshes 500
+
+Kiểm tra: login chỉ INSERT một dòng refresh_token (không UPDATE user), access token có exp và
+không chứa password, request có token không query bảng user, refresh không verify password và trả cặp token mới,
+dùng lại refresh token cũ bị 401 và thu hồi cả family, logout / update user thu hồi refresh token,
+update / delete user làm access token đã phát hành bị 401 ngay (cả ở worker khác: store của token_revocations
+không cache version), access token hết hạn bị 401.
+Sai một bước thì thoát với mã 1.
+"""
+import os
+import sys
+import time
+import asyncio
+import subprocess
+import argparse
+import tempfile
+import statistics
+
+parser = argparse.ArgumentParser(description="Access / refresh token check")
+parser.add_argument("--refreshes", type=int, default=500)
+parser.add_argument("--logins", type=int, default=50)
+args = parser.parse_args()
+
+folder = tempfile.mkdtemp()
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["URL_DATABASE"] = f"sqlite:///{os.path.join(folder, 'tokens.db')}"
+os.environ.setdefault("HASH_KEY", "benchmark-secret")
+os.environ["BACKEND_RATE_LIMIT_RATE"] = "0"
+
+import httpx
+from sqlalchemy import event
+from backend import app
+from models.role import Role
+from models.user import User
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from helper import password
+from helper.auth import resolve_token
+from helper.cache import FileVersionStore
+from helper.token import TokenRevocations, create_jwt_token, decode_jwt_token, token_cache
+from database.database import Base, SesionLocal, engine
+
+failures = []
+statements = []
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def record(connection, cursor, statement, parameters, context, executemany):
+    statements.append(" ".join(statement.split()).upper())
+
+
+def check(condition: bool, message: str):
+    print(f"{'OK  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+async def seed():
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    hashed = await password.hash_password("password")
+    async with SesionLocal() as db:
+        db.add_all([
+            Permission(id=1, name="all", route="/"),
+            Role(id=1, name="admin", permission_ids=[1]),
+            Prompt(id=1, content="prompt"),
+            Model(id=1, name="model", detail_name="model", type="cloud"),
+        ])
+        await db.flush()
+        db.add_all([
+            User(
+                id=index, user_name=f"user{index}", email=f"user{index}@example.com", password=hashed,
+                default_prompt=1, default_model=1, role_id=1,
+            )
+            for index in (1, 2)
+        ])
+        await db.commit()
+
+
+def writes() -> list:
+    return [statement for statement in statements if statement.split(" ", 1)[0] in ("INSERT", "UPDATE", "DELETE")]
+
+
+async def main():
+    await seed()
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://tokens") as client:
+        async def login(user: str = "user1") -> dict:
+            response = await client.post("/auth/login", json={"user_name": user, "password": "password"})
+            assert response.json()["code"] == 200, response.text
+            return response.json()["data"]
+
+        async def refresh(token: str) -> httpx.Response:
+            return await client.post("/auth/refresh-token", json={"refresh_token": token})
+
+        statements.clear()
+        data = await login()
+        check(
+            [statement.split(" (")[0] for statement in writes()] == ["INSERT INTO REFRESH_TOKEN"],
+            f"login writes only one refresh_token row: {writes()}",
+        )
+        payload = decode_jwt_token(data["token"])
+        check("exp" in payload and "password" not in payload, f"access token has exp and no password: {sorted(payload)}")
+        check(data["expires_in"] > 0 and data["refresh_token"], "login returns expires_in and refresh_token")
+
+        headers = {"Authorization": f"Bearer {data['token']}"}
+        token_cache.clear()
+        statements.clear()
+        response = await client.get("/models", headers=headers)
+        check(response.json()["code"] == 200, "access token accepted")
+        check(not any('"USER"' in statement or " USER " in statement for statement in statements), "request auth does not query the user table")
+
+        verified = 0
+        original = password.verify_password_sync
+
+        def counting_verify(*arguments):
+            nonlocal verified
+            verified += 1
+            return original(*arguments)
+
+        password.verify_password_sync = counting_verify
+        statements.clear()
+        response = await refresh(data["refresh_token"])
+        password.verify_password_sync = original
+        rotated = response.json()["data"]
+        check(response.json()["code"] == 200 and verified == 0, "refresh succeeds without a password check")
+        check(rotated["refresh_token"] != data["refresh_token"] and rotated["token"], "refresh returns a new token pair")
+        check(not any(statement.startswith("UPDATE \"USER\"") or statement.startswith("UPDATE USER") for statement in writes()), "refresh does not write the user row")
+
+        response = await refresh(data["refresh_token"])
+        check(response.json()["code"] == 401, "reused refresh token is rejected")
+        response = await refresh(rotated["refresh_token"])
+        check(response.json()["code"] == 401, "reuse revokes the whole family")
+
+        data = await login()
+        response = await client.post("/auth/logout", json={"refresh_token": data["refresh_token"]})
+        check(response.json()["code"] == 200, "logout succeeds")
+        check((await refresh(data["refresh_token"])).json()["code"] == 401, "logout revokes the refresh token")
+
+        data = await login("user2")
+        user2_headers = {"Authorization": f"Bearer {data['token']}"}
+        check((await client.get("/models", headers=user2_headers)).json()["code"] == 200, "user2 access token accepted (cached)")
+        response = await client.put("/users/2", headers=headers, json={
+            "user_name": "user2", "email": "user2@example.com", "password": "password",
+            "default_prompt": 1, "default_model": 1, "role_id": 1,
+        })
+        check(response.json()["code"] == 200, "user update succeeds")
+        check((await refresh(data["refresh_token"])).json()["code"] == 401, "updating a user revokes their refresh tokens")
+        check((await client.get("/models", headers=user2_headers)).json()["code"] == 401, "updating a user revokes their access tokens at once")
+        data = await login("user2")
+        user2_headers = {"Authorization": f"Bearer {data['token']}"}
+        check((await client.get("/models", headers=user2_headers)).json()["code"] == 200, "a token issued after the update is accepted")
+        response = await client.delete("/users/2", headers=headers)
+        check(response.json()["code"] == 200, "user delete succeeds")
+        check((await client.get("/models", headers=user2_headers)).json()["code"] == 401, "deleting a user revokes their access tokens at once")
+
+        # Hai worker dùng chung file: thu hồi ở worker A, worker B từ chối ngay ở lần kiểm tra kế tiếp
+        shared = os.path.join(folder, "revocations")
+        worker_a = TokenRevocations(FileVersionStore(shared, check_interval=0), os.path.join(shared, "revoked.json"))
+        worker_b = TokenRevocations(FileVersionStore(shared, check_interval=0), os.path.join(shared, "revoked.json"))
+        issued = {"id": 5, "issued_at": time.time()}
+        check(not worker_b.is_revoked(issued), "token valid before revocation")
+        worker_a.revoke([5])
+        check(worker_b.is_revoked(issued), "revocation on one worker applies on another")
+        check(not worker_b.is_revoked({"id": 5, "issued_at": time.time()}), "token issued after revocation is valid on another worker")
+        # Cấu hình thật với nhiều worker: store của token_revocations phải kiểm tra version mỗi request
+        interval = subprocess.run(
+            [sys.executable, "-c", "from helper.token import token_revocations; print(token_revocations.versions.check_interval)"],
+            env={**os.environ, "BACKEND_WORKERS": "2", "CACHE_VERSION_DIR": shared}, cwd=ROOT,
+            capture_output=True, text=True,
+        )
+        check(interval.stdout.strip() == "0", f"multi-worker revocations check the shared version on every request ({interval.stdout.strip() or interval.stderr.strip()[-200:]})")
+
+        expired = create_jwt_token({
+            "sub": "1", "user_name": "user1", "email": "user1@example.com", "role_id": 1, "typ": "access",
+            "exp": int(time.time()) - 1,
+        })
+        response = await client.get("/models", headers={"Authorization": f"Bearer {expired}"})
+        check(response.json()["code"] == 401, "expired access token is rejected")
+        legacy = create_jwt_token({"user_name": "user1", "email": "user1@example.com", "password": "x", "date": "old"})
+        response = await client.get("/models", headers={"Authorization": f"Bearer {legacy}"})
+        check(response.json()["code"] == 401, "legacy token without exp is rejected")
+
+        # Chi phí: login (scrypt + INSERT) so với refresh (SELECT + UPDATE + INSERT)
+        login_latency = []
+        for _ in range(args.logins):
+            start = time.perf_counter()
+            data = await login()
+            login_latency.append(time.perf_counter() - start)
+        refresh_latency, token = [], data["refresh_token"]
+        for _ in range(args.refreshes):
+            start = time.perf_counter()
+            token = (await refresh(token)).json()["data"]["refresh_token"]
+            refresh_latency.append(time.perf_counter() - start)
+
+    rounds = 20_000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        token_cache.clear()
+        await resolve_token(rotated["token"])
+    verify_us = (time.perf_counter() - start) / rounds * 1e6
+
+    print(f"login           median {statistics.median(login_latency) * 1000:8.2f} ms")
+    print(f"refresh         median {statistics.median(refresh_latency) * 1000:8.2f} ms")
+    print(f"verify (no DB)  {verify_us:8.1f} us per uncached token")
+    await engine.dispose()
+
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+asyncio.run(main())
@@ -0,0 +1,81 @@
+import re
+import asyncio
+import importlib
+from typing import AsyncIterator, Dict, List
+from param_compile import params
+
+_DONE = object()
+
+
+class FakeChatBackend:
+    """
+    Backend local, deterministic: trả lời bằng cách echo tin nhắn cuối của user theo từng token
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def generate(self, messages: List[Dict], temperature: float) -> AsyncIterator[str]:
+        last_user = next(
+            (message["content"] for message in reversed(messages) if message["role"] == "user"),
+            "",
+        )
+        for token in re.findall(r"\S+\s*", f"Echo: {last_user}"):
+            await asyncio.sleep(self.delay)
+            yield token
+
+
+BACKENDS = {
+    "fake": FakeChatBackend,
+}
+
+
+def get_chat_backend():
+    """
+    chat_backend (CHAT_BACKEND) là tên backend có sẵn hoặc đường dẫn `module:Class` có hàm async generate()
+    """
+    name = params.chat_backend
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    module_name, class_name = name.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+async def batch_tokens(tokens: AsyncIterator[str], interval: float, max_pending: int = 64) -> AsyncIterator[str]:
+    """
+    Gom token thành frame theo chu kỳ `interval` giây. Hàng đợi giới hạn `max_pending`
+    nên khi client đọc chậm thì generator cũng bị dừng lại (backpressure).
+    """
+    queue = asyncio.Queue(maxsize=max_pending)
+
+    async def produce():
+        try:
+            async for token in tokens:
+                await queue.put(token)
+            await queue.put(_DONE)
+        except Exception as error:
+            await queue.put(error)
+
+    producer = asyncio.create_task(produce())
+    try:
+        finished = False
+        while not finished:
+            items = [await queue.get()]
+            if items[0] is not _DONE:
+                await asyncio.sleep(interval)
+                while not queue.empty():
+                    items.append(queue.get_nowait())
+
+            frame = []
+            for item in items:
+                if item is _DONE:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                frame.append(item)
+
+            if frame:
+                yield "".join(frame)
+    finally:
+        producer.cancel()
@@ -1,26 +1,275 @@
 import os
+import time
+import asyncio
+import itertools
 from fastapi import Depends
-from typing import Annotated
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import Annotated, Dict, List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from starlette.requests import HTTPConnection
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from param_compile import params
 
-URL_DATABASE = os.environ.get("URL_DATABASE")
+URL_DATABASE = params.url_database
+# Replica chỉ đọc
+URL_DATABASE_REPLICAS = params.url_database_replicas
+# round_robin hoặc least_connections
+REPLICA_STRATEGY = params.replica_strategy
+# Replica lỗi kết nối bị bỏ qua trong khoảng này rồi mới thử lại
+REPLICA_RETRY_SECONDS = params.replica_retry_seconds
+# Sau khi user ghi, các request đọc của user đó đi primary trong khoảng này (bù replication lag)
+REPLICA_STICKY_SECONDS = params.replica_sticky_seconds
+# Nhiều worker: thời điểm ghi của từng user được chia sẻ qua file trong thư mục này
+REPLICA_WRITES_DIR = os.path.join(params.cache_version_dir, "replica-writes")
 
-engine = create_engine(URL_DATABASE)
+READ_METHODS = ("GET", "HEAD")
 
-SesionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sync driver -> asyncio driver, so existing URL_DATABASE values keep working
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str):
+    """
+    Đổi URL kết nối sang driver async (aiomysql / aiosqlite)
+    """
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def pool_options(url) -> dict:
+    """
+    Tham số pool từ cấu hình; SQLite in-memory dùng StaticPool nên không nhận các tham số này
+    """
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": params.db_pool_size,
+        "max_overflow": params.db_max_overflow,
+        "pool_timeout": params.db_pool_timeout,
+        "pool_recycle": params.db_pool_recycle,
+    }
+
+
+def create_engine_for(url: str):
+    url = to_async_url(url)
+    return create_async_engine(url, pool_pre_ping=True, **pool_options(url))
+
+
+engine = create_engine_for(URL_DATABASE)
+
+SesionLocal = async_sessionmaker(
+    bind=engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SesionLocal()
+class LocalWriteLog:
+    """
+    Thời điểm ghi gần nhất của từng user trong process (một worker).
+    Entry hết hạn bị xóa khi ghi, tối đa một lượt quét mỗi `sticky` giây.
+    """
+
+    def __init__(self, sticky: float = REPLICA_STICKY_SECONDS):
+        self.sticky = sticky
+        self._writes: Dict[int, float] = {}
+        self._pruned_at = time.time()
+
+    def note(self, user_id: int):
+        now = time.time()
+        self._writes[user_id] = now
+        if now - self._pruned_at > self.sticky:
+            self._pruned_at = now
+            self._writes = {key: written_at for key, written_at in self._writes.items() if now - written_at <= self.sticky}
+
+    def written_at(self, user_id: int) -> Optional[float]:
+        return self._writes.get(user_id)
+
+
+class FileWriteLog:
+    """
+    Thời điểm ghi gần nhất dùng chung giữa các worker: mtime của file <folder>/<user_id>.
+    Đọc chỉ tốn một stat nên request ghi ở worker này, đọc ở worker khác vẫn đi primary.
+    File hết hạn bị xóa khi ghi, tối đa một lượt quét mỗi `sticky` giây.
+    """
+
+    def __init__(self, folder: str = REPLICA_WRITES_DIR, sticky: float = REPLICA_STICKY_SECONDS):
+        self.folder = folder
+        self.sticky = sticky
+        self._pruned_at = time.time()
+        os.makedirs(folder, exist_ok=True)
+
+    def note(self, user_id: int):
+        path = os.path.join(self.folder, str(user_id))
+        open(path, "a").close()
+        os.utime(path)
+        now = time.time()
+        if now - self._pruned_at > self.sticky:
+            self._pruned_at = now
+            self.prune(now)
+
+    def prune(self, now: float):
+        for entry in os.scandir(self.folder):
+            try:
+                if now - entry.stat().st_mtime > self.sticky:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def written_at(self, user_id: int) -> Optional[float]:
+        try:
+            return os.stat(os.path.join(self.folder, str(user_id))).st_mtime
+        except FileNotFoundError:
+            return None
+
+
+class ReplicaRouter:
+    """
+    Chọn replica cho request đọc: round-robin hoặc replica có ít connection đang checkout nhất.
+    Replica không kết nối được bị đánh dấu lỗi REPLICA_RETRY_SECONDS giây; hết replica thì dùng primary.
+    Thời điểm ghi gần nhất của từng user (write log) để đọc ngay sau khi ghi không bị trễ.
+    """
+
+    def __init__(self, engines: List, strategy: str = REPLICA_STRATEGY, writes=None):
+        self.engines = engines
+        self.strategy = strategy
+        self.writes = writes if writes is not None else LocalWriteLog()
+        self._next = itertools.count()
+        self._down_until: Dict[int, float] = {}
+
+    def candidates(self) -> List:
+        now = time.monotonic()
+        healthy = [engine for index, engine in enumerate(self.engines) if self._down_until.get(index, 0) <= now]
+        if not healthy:
+            return []
+        if self.strategy == "least_connections":
+            return sorted(healthy, key=lambda engine: engine.sync_engine.pool.checkedout())
+        start = next(self._next) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def mark_down(self, engine):
+        self._down_until[self.engines.index(engine)] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def note_write(self, user_id: int):
+        if self.engines:
+            self.writes.note(user_id)
+
+    def recently_wrote(self, user_id: int) -> bool:
+        written_at = self.writes.written_at(user_id)
+        return written_at is not None and time.time() - written_at <= self.writes.sticky
+
+    async def session(self) -> AsyncSession:
+        for engine in self.candidates():
+            db = ReadSessionLocal(bind=engine)
+            try:
+                # Lấy connection ngay để replica hỏng được phát hiện trước khi route chạy
+                await db.connection()
+                return db
+            except (DBAPIError, OSError):
+                await db.close()
+                self.mark_down(engine)
+        return SesionLocal()
+
+
+replica_engines = [create_engine_for(url) for url in URL_DATABASE_REPLICAS]
+replica_router = ReplicaRouter(
+    replica_engines,
+    writes=FileWriteLog() if replica_engines and params.workers > 1 else LocalWriteLog(),
+)
+
+ReadSessionLocal = async_sessionmaker(
+    autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
+
+
+async def read_session() -> AsyncSession:
+    """
+    Session chỉ đọc ngoài request (export stream...): replica nếu có, không thì primary
+    """
+    return await replica_router.session() if replica_engines else SesionLocal()
+
+
+async def warm_pool():
+    """
+    Mở sẵn đủ connection của pool (primary và replica) trước khi worker nhận request,
+    request đầu tiên không phải chờ handshake với DB. Replica không kết nối được bị đánh dấu lỗi.
+    """
+
+    async def ping(target):
+        async with target.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def fill(target):
+        size = getattr(target.sync_engine.pool, "size", None)
+        count = size() if callable(size) else 1
+        await asyncio.gather(*(ping(target) for _ in range(count)))
+
+    await fill(engine)
+    for replica in replica_engines:
+        try:
+            await fill(replica)
+        except (DBAPIError, OSError):
+            replica_router.mark_down(replica)
+
+
+async def get_db(connection: HTTPConnection):
+    """
+    GET / HEAD đi replica (nếu có cấu hình), request ghi và WebSocket đi primary.
+    User vừa ghi trong REPLICA_STICKY_SECONDS giây vẫn đọc từ primary.
+    """
+    user = connection.scope.get("state", {}).get("user")
+    user_id = user["id"] if user else None
+    is_read = connection.scope.get("method") in READ_METHODS
+
+    if is_read and replica_engines and not (user_id is not None and replica_router.recently_wrote(user_id)):
+        async with await replica_router.session() as db:
+            yield db
+        return
+
+    if not is_read and user_id is not None:
+        replica_router.note_write(user_id)
     try:
-        yield db
+        async with SesionLocal() as db:
+            yield db
     finally:
-        db.close()
+        if not is_read and user_id is not None:
+            replica_router.note_write(user_id)
+
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+
+
+async def reload(db: AsyncSession, instance, *options):
+    """
+    Nạp lại entity sau khi commit (giá trị do server sinh + quan hệ eager) trong một query
+    """
+    entity = type(instance)
+    query = (
+        select(entity)
+        .options(*options)
+        .filter(entity.id == instance.id)
+        .execution_options(populate_existing=True)
+    )
+    return (await db.scalars(query)).one()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+async def reload_many(db: AsyncSession, entity, ids, *options):
+    """
+    Nạp lại nhiều entity sau khi commit trong một query, giữ đúng thứ tự ids
+    """
+    query = (
+        select(entity)
+        .options(*options)
+        .filter(entity.id.in_(ids))
+        .execution_options(populate_existing=True)
+    )
+    rows = {row.id: row for row in (await db.scalars(query)).all()}
+    return [rows[item_id] for item_id in ids]
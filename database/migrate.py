@@ -0,0 +1,153 @@
+"""
+Data migration cho các thay đổi schema.
+
+    python -m database.migrate conversation --batch_size=500
+    python -m database.migrate user_links --batch_size=500
+    python -m database.migrate search_index --batch_size=500
+
+conversation: chuyển JSON Chat.conversation cũ sang các dòng chat_message
+(seq 1..n), cập nhật chat.last_seq và xóa blob. Chạy lại nhiều lần vẫn an toàn
+vì chỉ xử lý chat có last_seq = 0 và conversation khác rỗng.
+
+user_links: chép JSON user.prompt_ids / user.models cũ sang bảng user_prompt / user_model
+(chat_ids suy ra từ chat.user_id nên bỏ qua). Chỉ thêm liên kết còn thiếu, id không tồn tại
+bị bỏ qua, nên chạy lại vẫn an toàn. Sau khi chạy xong có thể DROP các cột JSON.
+
+search_index: build lại toàn bộ index full-text (SEARCH_INDEX_PATH) từ chat / chat_message.
+"""
+import json
+import asyncio
+import argparse
+from sqlalchemy import insert, select, update, table, column
+from database.database import engine, SesionLocal
+from models.chat import Chat
+from models.chat_message import ChatMessage
+from models.model import Model
+from models.prompt import Prompt
+# User có relationship tới Role, phải nạp model trước khi mapper được cấu hình
+from models.role import Role
+from models.user_model import UserModel
+from models.user_prompt import UserPrompt
+from helper.search import rebuild
+
+# Cột JSON cũ không còn trong model User
+legacy_user = table("user", column("id"), column("prompt_ids"), column("models"))
+
+
+def conversation_rows(chat_id: int, conversation) -> list:
+    if isinstance(conversation, str):
+        conversation = json.loads(conversation or "[]")
+    rows = []
+    for seq, item in enumerate(conversation or [], start=1):
+        content = item.get("content", "")
+        rows.append({
+            "chat_id": chat_id,
+            "seq": seq,
+            "role": item.get("role", "user"),
+            "content": content if isinstance(content, str) else json.dumps(content, ensure_ascii=False),
+        })
+    return rows
+
+
+async def migrate_conversation(batch_size: int):
+    last_id, total = 0, 0
+    while True:
+        async with SesionLocal() as db:
+            chats = (await db.execute(
+                select(Chat.id, Chat.conversation)
+                .filter(Chat.id > last_id, Chat.last_seq == 0)
+                .order_by(Chat.id)
+                .limit(batch_size)
+            )).all()
+
+            if not chats:
+                break
+
+            for chat_id, conversation in chats:
+                rows = conversation_rows(chat_id, conversation)
+                if rows:
+                    await db.execute(insert(ChatMessage), rows)
+                    await db.execute(
+                        update(Chat)
+                        .where(Chat.id == chat_id)
+                        .values(last_seq=len(rows), conversation=[])
+                    )
+                    total += 1
+
+            await db.commit()
+            last_id = chats[-1].id
+            print(f"Migrated conversations up to chat {last_id} ({total} chats)")
+
+    await engine.dispose()
+
+
+def json_ids(value) -> set:
+    if isinstance(value, str):
+        value = json.loads(value or "[]")
+    ids = set()
+    for item in value or []:
+        try:
+            ids.add(int(item))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+async def migrate_user_links(batch_size: int):
+    last_id, total = 0, 0
+    while True:
+        async with SesionLocal() as db:
+            users = (await db.execute(
+                select(legacy_user.c.id, legacy_user.c.prompt_ids, legacy_user.c.models)
+                .filter(legacy_user.c.id > last_id)
+                .order_by(legacy_user.c.id)
+                .limit(batch_size)
+            )).all()
+
+            if not users:
+                break
+
+            user_ids = [user.id for user in users]
+            for field, link, link_column, target in (
+                ("prompt_ids", UserPrompt, UserPrompt.prompt_id, Prompt),
+                ("models", UserModel, UserModel.model_id, Model),
+            ):
+                wanted = {(user.id, value) for user in users for value in json_ids(getattr(user, field))}
+                if not wanted:
+                    continue
+                valid = set((await db.scalars(
+                    select(target.id).filter(target.id.in_({value for _, value in wanted}))
+                )).all())
+                current = set((await db.execute(
+                    select(link.user_id, link_column).filter(link.user_id.in_(user_ids))
+                )).all())
+                added = sorted((user_id, value) for user_id, value in wanted - current if value in valid)
+                if added:
+                    await db.execute(insert(link), [{"user_id": user_id, link_column.key: value} for user_id, value in added])
+                    total += len(added)
+
+            await db.commit()
+            last_id = users[-1].id
+            print(f"Migrated user links up to user {last_id} ({total} links)")
+
+    await engine.dispose()
+
+
+async def rebuild_search_index(batch_size: int):
+    await rebuild(batch_size)
+    await engine.dispose()
+
+
+MIGRATIONS = {
+    "conversation": migrate_conversation,
+    "user_links": migrate_user_links,
+    "search_index": rebuild_search_index,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data migrations")
+    parser.add_argument("name", choices=sorted(MIGRATIONS))
+    parser.add_argument("--batch_size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(MIGRATIONS[args.name](args.batch_size))
@@ -0,0 +1,323 @@
+"""
+Sinh dữ liệu giả quy mô lớn (user, chat + tin nhắn, prompt, model, role, permission) để load test
+và tái hiện query plan của production trên máy local. Đích là URL_DATABASE (MySQL hoặc SQLite).
+
+    python -m database.seed --users=1000000 --chats_per_user=5 --processes=8 --seed=42 --recreate
+    python -m database.seed --users=10000 --search_index
+
+Cùng --seed và cùng tham số kích thước thì ra đúng cùng dữ liệu (id, nội dung, thời gian) bất kể
+--processes / --chunk_users: mỗi block BLOCK_USERS user có random riêng sinh từ seed và số thứ tự block,
+id chat được tính trước bằng prefix sum số chat của từng block. Chunk (nhiều block liền nhau) chạy
+song song trên nhiều process, mỗi chunk ghi trong một transaction bằng core insert theo batch.
+
+Mọi user dùng chung một password (--password) được hash một lần; --admins user đầu có role 1
+(permission "/", toàn quyền) để đăng nhập gọi API, các user còn lại nhận role ngẫu nhiên.
+Số chat mỗi user theo phân phối mũ (nhiều user ít chat, vài user rất nhiều), số tin nhắn mỗi chat
+theo phân phối log-normal (đa số hội thoại ngắn, đuôi dài tới --messages_max).
+"""
+import math
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from param_compile import params
+
+START = datetime(2024, 1, 1)
+# Đơn vị sinh random cố định, không phụ thuộc cách chia chunk
+BLOCK_USERS = 1_000
+ROUTES = ["/users", "/chats", "/roles", "/permissions", "/prompts", "/models", "/auth"]
+MODEL_TYPES = ["cloud", "local"]
+WORDS = (
+    "hello world order invoice refund shipping python fastapi database cache latency token stream "
+    "chat model prompt customer account payment error deploy server query index table report "
+    "xin chào cảm ơn đơn hàng giao hàng thanh toán Đà Nẵng Hà Nội khách hàng hỗ trợ"
+).split()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Bulk load synthetic data into URL_DATABASE")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--chats_per_user", type=float, default=5, help="mean of the exponential chats per user distribution")
+    parser.add_argument("--messages_median", type=float, default=8, help="median messages per chat (log-normal)")
+    parser.add_argument("--messages_sigma", type=float, default=1.0, help="log-normal sigma, larger means a longer tail")
+    parser.add_argument("--messages_max", type=int, default=400)
+    parser.add_argument("--prompts", type=int, default=1_000)
+    parser.add_argument("--models", type=int, default=50)
+    parser.add_argument("--roles", type=int, default=20)
+    parser.add_argument("--permissions", type=int, default=100)
+    parser.add_argument("--admins", type=int, default=1, help="first N users get role 1 (every route)")
+    parser.add_argument("--password", default="password", help="password shared by every generated user")
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many days from 2024-01-01")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--chunk_users", type=int, default=5_000, help="users (and their chats) per transaction, rounded up to 1000")
+    parser.add_argument("--batch_size", type=int, default=5_000, help="rows per INSERT statement")
+    parser.add_argument("--recreate", action="store_true", help="drop and create every table first")
+    parser.add_argument("--search_index", action="store_true", help="rebuild the full-text search index afterwards")
+    return parser
+
+
+def create_seed_engine():
+    """
+    Engine riêng cho việc nạp dữ liệu: SQLite chờ lock lâu (nhiều process cùng ghi) và bỏ fsync,
+    MySQL tắt kiểm tra foreign key / unique trong session vì dữ liệu sinh ra đã đúng thứ tự
+    """
+    from database.database import to_async_url
+
+    url = to_async_url(params.url_database)
+    sqlite = url.get_backend_name() == "sqlite"
+    engine = create_async_engine(url, connect_args={"timeout": 600} if sqlite else {})
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def configure(connection, record):
+        cursor = connection.cursor()
+        if sqlite:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+        else:
+            cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.close()
+
+    return engine
+
+
+def chunk_random(seed: int, name: str, index: int) -> random.Random:
+    # Seed dạng chuỗi được hash ổn định (không phụ thuộc PYTHONHASHSEED)
+    return random.Random(f"{seed}-{name}-{index}")
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def moment(rng: random.Random, days: int) -> datetime:
+    return START + timedelta(seconds=rng.randrange(max(1, days) * 86_400))
+
+
+def blocks(users: int) -> list:
+    return [(index, start, min(users, start + BLOCK_USERS - 1)) for index, start in enumerate(range(1, users + 1, BLOCK_USERS))]
+
+
+def chunks(users: int, chunk_users: int) -> list:
+    per_chunk = max(1, math.ceil(chunk_users / BLOCK_USERS))
+    all_blocks = blocks(users)
+    return [all_blocks[start:start + per_chunk] for start in range(0, len(all_blocks), per_chunk)]
+
+
+def chat_counts(options, index: int, first_user: int, last_user: int) -> list:
+    rng = chunk_random(options.seed, "chats", index)
+    rate = 1 / options.chats_per_user if options.chats_per_user > 0 else math.inf
+    return [int(rng.expovariate(rate)) if rate != math.inf else 0 for _ in range(first_user, last_user + 1)]
+
+
+def message_count(rng: random.Random, options) -> int:
+    count = int(rng.lognormvariate(math.log(max(1, options.messages_median)), options.messages_sigma))
+    return min(options.messages_max, max(1, count))
+
+
+def reference_rows(options) -> dict:
+    """
+    Các bảng nhỏ, sinh trong process chính trước các chunk user
+    """
+    rng = chunk_random(options.seed, "reference", 0)
+    permissions = [{"id": 1, "name": "all", "route": "/", "created_at": START, "updated_at": START}] + [
+        {
+            "id": index, "name": f"permission {index}",
+            "route": f"{rng.choice(ROUTES)}/{index}", "created_at": moment(rng, options.days),
+        }
+        for index in range(2, options.permissions + 1)
+    ]
+    roles = [{"id": 1, "name": "admin", "permission_ids": [1], "created_at": START, "updated_at": START}] + [
+        {
+            "id": index, "name": f"role {index}",
+            "permission_ids": sorted(rng.sample(range(1, options.permissions + 1), min(options.permissions, rng.randint(1, 8)))),
+            "created_at": moment(rng, options.days),
+        }
+        for index in range(2, options.roles + 1)
+    ]
+    prompts = [
+        {"id": index, "content": sentence(rng, rng.randint(5, 60)), "created_at": moment(rng, options.days)}
+        for index in range(1, options.prompts + 1)
+    ]
+    models = [
+        {
+            "id": index, "name": f"model {index}", "detail_name": f"model-{index}",
+            "type": rng.choice(MODEL_TYPES), "created_at": moment(rng, options.days),
+        }
+        for index in range(1, options.models + 1)
+    ]
+    for row in permissions + roles + prompts + models:
+        row["updated_at"] = row["created_at"]
+    return {"permission": permissions, "role": roles, "prompt": prompts, "model": models}
+
+
+def user_chunk_rows(options, chunk: list, first_chat: int, password: str) -> dict:
+    """
+    User, liên kết user_prompt / user_model, chat và chat_message của các block trong một chunk
+    """
+    rows = {"user": [], "user_prompt": [], "user_model": [], "chat": [], "chat_message": []}
+    chat_id = first_chat
+    for index, first_user, last_user in chunk:
+        chat_id = block_rows(options, rows, index, first_user, last_user, chat_id, password)
+    return rows
+
+
+def block_rows(options, rows: dict, index: int, first_user: int, last_user: int, chat_id: int, password: str) -> int:
+    rng = chunk_random(options.seed, "users", index)
+    message_rng = chunk_random(options.seed, "messages", index)
+    counts = chat_counts(options, index, first_user, last_user)
+    for user_id, chats in zip(range(first_user, last_user + 1), counts):
+        joined = moment(rng, options.days)
+        rows["user"].append({
+            "id": user_id, "user_name": f"user{user_id}", "email": f"user{user_id}@example.com", "password": password,
+            "role_id": 1 if user_id <= options.admins else rng.randint(1, options.roles),
+            "default_prompt": rng.randint(1, options.prompts), "default_model": rng.randint(1, options.models),
+            "created_at": joined, "updated_at": joined,
+        })
+        rows["user_prompt"].extend(
+            {"user_id": user_id, "prompt_id": prompt_id}
+            for prompt_id in rng.sample(range(1, options.prompts + 1), min(options.prompts, rng.randint(0, 3)))
+        )
+        rows["user_model"].extend(
+            {"user_id": user_id, "model_id": model_id}
+            for model_id in rng.sample(range(1, options.models + 1), min(options.models, rng.randint(1, 2)))
+        )
+        for _ in range(chats):
+            created = joined + timedelta(seconds=message_rng.randrange(30 * 86_400))
+            sent = created
+            messages = message_count(message_rng, options)
+            for seq in range(1, messages + 1):
+                sent += timedelta(seconds=message_rng.randint(2, 600))
+                assistant = seq % 2 == 0
+                rows["chat_message"].append({
+                    "chat_id": chat_id, "seq": seq, "role": "assistant" if assistant else "user",
+                    "content": sentence(message_rng, message_rng.randint(20, 200) if assistant else message_rng.randint(3, 30)),
+                    "created_at": sent,
+                })
+            rows["chat"].append({
+                "id": chat_id, "title": sentence(message_rng, message_rng.randint(2, 8)), "conversation": [],
+                "last_seq": messages, "user_id": user_id, "created_at": created, "updated_at": sent,
+            })
+            chat_id += 1
+    return chat_id
+
+
+def tables() -> dict:
+    from models.chat import Chat
+    from models.chat_message import ChatMessage
+    from models.model import Model
+    from models.permission import Permission
+    from models.prompt import Prompt
+    from models.refresh_token import RefreshToken
+    from models.role import Role
+    from models.user import User
+    from models.user_model import UserModel
+    from models.user_prompt import UserPrompt
+
+    # Thứ tự insert theo foreign key
+    return {
+        model.__tablename__: model
+        for model in (Permission, Role, Prompt, Model, User, UserPrompt, UserModel, Chat, ChatMessage, RefreshToken)
+    }
+
+
+async def write_rows(engine, rows: dict, batch_size: int) -> dict:
+    counts = {}
+    async with engine.begin() as connection:
+        for name, model in tables().items():
+            batch = rows.get(name, [])
+            for start in range(0, len(batch), batch_size):
+                await connection.execute(insert(model), batch[start:start + batch_size])
+            if batch:
+                counts[name] = len(batch)
+    return counts
+
+
+def load_chunk(options, chunk: list, first_chat: int, password: str) -> dict:
+    """
+    Chạy trong process con: sinh và ghi một chunk, trả về số dòng theo bảng
+    """
+    async def run():
+        engine = create_seed_engine()
+        try:
+            return await write_rows(engine, user_chunk_rows(options, chunk, first_chat, password), options.batch_size)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+async def prepare(options, password: str) -> dict:
+    from database.database import Base
+
+    engine = create_seed_engine()
+    try:
+        tables()
+        async with engine.begin() as connection:
+            if options.recreate:
+                await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+        return await write_rows(engine, reference_rows(options), options.batch_size)
+    finally:
+        await engine.dispose()
+
+
+def generate(options) -> dict:
+    """
+    Nạp toàn bộ dữ liệu, trả về số dòng theo bảng
+    """
+    from helper.password import hash_password_sync
+
+    password = hash_password_sync(options.password, salt=chunk_random(options.seed, "password", 0).randbytes(16))
+    totals = asyncio.run(prepare(options, password))
+
+    plan, first_chat = [], 1
+    for chunk in chunks(options.users, options.chunk_users):
+        plan.append((chunk, first_chat))
+        first_chat += sum(sum(chat_counts(options, *block)) for block in chunk)
+
+    def add(counts: dict):
+        for name, count in counts.items():
+            totals[name] = totals.get(name, 0) + count
+
+    start, done = time.perf_counter(), 0
+    if options.processes > 1:
+        # spawn: process con không thừa hưởng engine / event loop của process cha
+        with ProcessPoolExecutor(options.processes, mp_context=get_context("spawn")) as executor:
+            futures = [executor.submit(load_chunk, options, chunk, first, password) for chunk, first in plan]
+            for future in futures:
+                add(future.result())
+                done += 1
+                print(f"Loaded chunk {done}/{len(plan)} ({totals.get('chat_message', 0)} messages, {time.perf_counter() - start:.1f} s)")
+    else:
+        for chunk, first in plan:
+            add(load_chunk(options, chunk, first, password))
+            done += 1
+            print(f"Loaded chunk {done}/{len(plan)} ({totals.get('chat_message', 0)} messages, {time.perf_counter() - start:.1f} s)")
+
+    if options.search_index:
+        from helper.search import rebuild
+        from database.database import engine
+
+        async def rebuild_index():
+            await rebuild(options.batch_size)
+            await engine.dispose()
+
+        asyncio.run(rebuild_index())
+    return totals
+
+
+if __name__ == "__main__":
+    options = build_parser().parse_args()
+    start = time.perf_counter()
+    totals = generate(options)
+    elapsed = time.perf_counter() - start
+    rows = sum(totals.values())
+    print(f"Inserted {rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s)")
+    for name, count in totals.items():
+        print(f"  {name:<14} {count}")
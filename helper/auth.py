@@ -0,0 +1,64 @@
+import jwt
+import hmac
+from typing import Annotated, Optional
+from fastapi import Depends, HTTPException, status
+from starlette.requests import HTTPConnection
+from helper.token import decode_access_token, token_cache, token_revocations, token_user
+from param_compile import params
+
+# Token riêng cho Prometheus scrape /metrics; để trống thì /metrics cần user có permission route /metrics
+METRICS_TOKEN = params.metrics_token
+
+
+def bearer_token(connection: HTTPConnection) -> Optional[str]:
+    """
+    Lấy token từ header `Authorization: Bearer ...`, WebSocket có thể gửi qua query `?token=`
+    """
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return connection.query_params.get("token")
+
+
+def is_metrics_token(connection: HTTPConnection) -> bool:
+    token = bearer_token(connection)
+    return bool(METRICS_TOKEN and token) and hmac.compare_digest(token, METRICS_TOKEN)
+
+
+async def resolve_token(token: str) -> Optional[dict]:
+    """
+    Trả về user của access token, ưu tiên cache; cache miss thì chỉ verify chữ ký / hạn, không query DB.
+    Token của user đã bị sửa / xóa sau lúc phát hành bị từ chối kể cả khi đang nằm trong cache.
+    """
+    user = token_cache.get(token)
+    if user is None:
+        try:
+            payload = decode_access_token(token)
+        except jwt.InvalidTokenError:
+            return None
+        user = token_user(payload)
+        token_cache.set(token, user, expires_at=payload["exp"])
+
+    if token_revocations.is_revoked(user):
+        return None
+    return user
+
+
+async def verify_token(connection: HTTPConnection) -> dict:
+    # AuthorizationMiddleware đã resolve token thì dùng lại
+    user = connection.scope.get("state", {}).get("user")
+    if user is not None:
+        return user
+
+    token = bearer_token(connection)
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
+
+    user = await resolve_token(token)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+
+    return user
+
+
+auth_dependency = Annotated[dict, Depends(verify_token)]
@@ -0,0 +1,148 @@
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import select
+from models.role import Role
+from models.permission import Permission
+from helper.cache import versions
+
+# Namespace version dùng chung: mọi thay đổi role / permission bump để các worker khác build lại Authorizer
+AUTHORIZER_NAMESPACE = "authorizer"
+
+
+class RouteNode:
+    __slots__ = ("children", "wildcard", "granted")
+
+    def __init__(self):
+        self.children = {}
+        self.wildcard = None
+        self.granted = False
+
+
+class RouteTrie:
+    """
+    Trie theo từng segment của Permission.route. Segment `{param}` khớp một segment bất kỳ,
+    node được cấp quyền thì cấp luôn mọi path con (route "/" cấp toàn bộ API).
+    """
+
+    def __init__(self, routes: Iterable[str] = ()):
+        self.root = RouteNode()
+        for route in routes:
+            self.add(route)
+
+    @staticmethod
+    def segments(path: str):
+        return [segment for segment in path.split("/") if segment]
+
+    def add(self, route: str):
+        node = self.root
+        for segment in self.segments(route):
+            if segment.startswith("{") and segment.endswith("}"):
+                node.wildcard = node.wildcard or RouteNode()
+                node = node.wildcard
+            else:
+                node = node.children.setdefault(segment, RouteNode())
+        node.granted = True
+
+    def match(self, path: str) -> bool:
+        return self._match(self.root, self.segments(path), 0)
+
+    def _match(self, node: RouteNode, segments: list, index: int) -> bool:
+        if node.granted:
+            return True
+        if index == len(segments):
+            return False
+        child = node.children.get(segments[index])
+        if child is not None and self._match(child, segments, index + 1):
+            return True
+        return node.wildcard is not None and self._match(node.wildcard, segments, index + 1)
+
+
+class Authorizer:
+    """
+    Biên dịch role -> RouteTrie trong bộ nhớ. Kiểm tra quyền O(độ dài path), không query DB;
+    khi role/permission thay đổi chỉ build lại trie của các role bị ảnh hưởng.
+    Trie là của từng process: mỗi thay đổi bump version dùng chung, worker thấy version khác thì load lại (stale()).
+    """
+
+    def __init__(self, versions=versions):
+        self.loaded = False
+        self.versions = versions
+        self._version = None
+        self._routes: Dict[int, str] = {}
+        self._role_permissions: Dict[int, Set[int]] = {}
+        self._permission_roles: Dict[int, Set[int]] = {}
+        self._tries: Dict[int, RouteTrie] = {}
+
+    def stale(self) -> bool:
+        return not self.loaded or self.versions.get(AUTHORIZER_NAMESPACE) != self._version
+
+    def _changed(self):
+        # Worker đang ghi đã cập nhật trie tại chỗ nên nhận luôn version mới, chỉ worker khác load lại.
+        # Đang stale (worker khác vừa đổi) thì giữ version cũ để request sau vẫn load lại thay đổi đó.
+        current = self.loaded and self.versions.get(AUTHORIZER_NAMESPACE) == self._version
+        self.versions.bump(AUTHORIZER_NAMESPACE)
+        if current:
+            self._version = self.versions.get(AUTHORIZER_NAMESPACE)
+
+    async def load(self, db):
+        # Lấy version trước khi đọc: có ghi trong lúc đang load thì request sau load lại
+        version = self.versions.get(AUTHORIZER_NAMESPACE)
+        permissions = (await db.execute(
+            select(Permission.id, Permission.route).filter(Permission.is_deleted == False)
+        )).all()
+        roles = (await db.execute(
+            select(Role.id, Role.permission_ids).filter(Role.is_deleted == False)
+        )).all()
+
+        self._routes = {permission.id: permission.route for permission in permissions}
+        self._role_permissions, self._permission_roles, self._tries = {}, {}, {}
+        for role in roles:
+            self._set_role(role.id, role.permission_ids)
+        self._version = version
+        self.loaded = True
+
+    def set_role(self, role_id: int, permission_ids: Optional[Iterable[int]]):
+        """
+        permission_ids là None khi role bị xóa
+        """
+        self._set_role(role_id, permission_ids)
+        self._changed()
+
+    def _set_role(self, role_id: int, permission_ids: Optional[Iterable[int]]):
+        for permission_id in self._role_permissions.pop(role_id, ()):
+            self._permission_roles.get(permission_id, set()).discard(role_id)
+        self._tries.pop(role_id, None)
+
+        if permission_ids is None:
+            return
+
+        self._role_permissions[role_id] = {int(permission_id) for permission_id in permission_ids}
+        for permission_id in self._role_permissions[role_id]:
+            self._permission_roles.setdefault(permission_id, set()).add(role_id)
+        self._build(role_id)
+
+    def set_permission(self, permission_id: int, route: Optional[str]):
+        """
+        route là None khi permission bị xóa
+        """
+        if route is None:
+            self._routes.pop(permission_id, None)
+        else:
+            self._routes[permission_id] = route
+
+        for role_id in self._permission_roles.get(permission_id, ()):
+            self._build(role_id)
+        self._changed()
+
+    def _build(self, role_id: int):
+        self._tries[role_id] = RouteTrie(
+            self._routes[permission_id]
+            for permission_id in self._role_permissions[role_id]
+            if permission_id in self._routes
+        )
+
+    def is_allowed(self, role_id: Optional[int], path: str) -> bool:
+        trie = self._tries.get(role_id)
+        return trie is not None and trie.match(path)
+
+
+authorizer = Authorizer()
@@ -0,0 +1,165 @@
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+from fastapi import status
+from sqlalchemy import UniqueConstraint, insert, select, update
+from schema.response import ResponseMessage
+from param_compile import params
+
+BULK_MAX_ITEMS = params.bulk_max_items
+
+
+class BulkResult:
+    """
+    Gom lỗi theo từng item của một request bulk. Cả batch chạy trong một transaction:
+    chỉ cần một item lỗi là không ghi gì và trả về danh sách lỗi theo index.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.errors: Dict[int, dict] = {}
+
+    def fail(self, index: int, code: int, error: str):
+        # Mỗi item chỉ giữ lỗi đầu tiên
+        self.errors.setdefault(index, {"index": index, "code": code, "error": error})
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def error_response(self):
+        return ResponseMessage(
+            code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            message=f"{len(self.errors)}/{self.size} items are invalid, nothing was written",
+            data=[self.errors[index] for index in sorted(self.errors)],
+        )
+
+    @staticmethod
+    def response(code: int, message: str, items: List[Any]):
+        return ResponseMessage(
+            code=code,
+            message=message,
+            data=[{"index": index, "code": code, "data": item} for index, item in enumerate(items)],
+        )
+
+
+def check_size(items: list) -> Optional[Any]:
+    """
+    Trả về response lỗi nếu batch rỗng hoặc vượt BULK_MAX_ITEMS
+    """
+    if not items:
+        return ResponseMessage(
+            code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            message="Bulk request cannot be empty",
+        )
+    if len(items) > BULK_MAX_ITEMS:
+        return ResponseMessage(
+            code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            message=f"Bulk request is limited to {BULK_MAX_ITEMS} items",
+        )
+    return None
+
+
+def check_duplicates(result: BulkResult, values: Iterable[Hashable], field: str):
+    """
+    Giá trị bị lặp lại trong cùng một batch
+    """
+    seen = set()
+    for index, value in enumerate(values):
+        if value in seen:
+            result.fail(index, status.HTTP_400_BAD_REQUEST, f"Duplicated {field} '{value}' in request")
+        seen.add(value)
+
+
+async def existing_ids(db, model, ids: Iterable[int]) -> Set[int]:
+    """
+    Một query cho cả batch thay vì kiểm tra từng id
+    """
+    ids = set(ids)
+    if not ids:
+        return set()
+    return set((await db.scalars(
+        select(model.id).filter(model.id.in_(ids), model.is_deleted == False)
+    )).all())
+
+
+async def check_ids(db, result: BulkResult, model, ids: List[int], name: str) -> Set[int]:
+    check_duplicates(result, ids, "id")
+    found = await existing_ids(db, model, ids)
+    for index, item_id in enumerate(ids):
+        if item_id not in found:
+            result.fail(index, status.HTTP_404_NOT_FOUND, f"{name} with ID {item_id} not found.")
+    return found
+
+
+async def taken_values(db, model, column, values: Iterable[Hashable]) -> Dict[Hashable, int]:
+    """
+    Giá trị -> id của một cột unique đã có trong DB (kể cả dòng đã xóa mềm, vì UNIQUE vẫn áp dụng)
+    """
+    values = set(values)
+    if not values:
+        return {}
+    rows = (await db.execute(select(column, model.id).filter(column.in_(values)))).all()
+    return {value: item_id for value, item_id in rows}
+
+
+def check_taken(result: BulkResult, values: List[Hashable], taken: Dict[Hashable, int], field: str, ids: Optional[List[int]] = None):
+    """
+    ids là None khi tạo mới; khi cập nhật thì giá trị đang thuộc về chính dòng đó không tính là trùng
+    """
+    for index, value in enumerate(values):
+        owner = taken.get(value)
+        if owner is not None and (ids is None or owner != ids[index]):
+            result.fail(index, status.HTTP_400_BAD_REQUEST, f"{field} '{value}' already exists.")
+
+
+def is_unique(key) -> bool:
+    """
+    Cột có UNIQUE riêng (unique=True hoặc UniqueConstraint chỉ gồm cột đó)
+    """
+    column = key.expression
+    return bool(column.unique or column.primary_key) or any(
+        isinstance(constraint, UniqueConstraint) and list(constraint.columns) == [column]
+        for constraint in column.table.constraints
+    )
+
+
+async def insert_rows(db, model, rows: List[dict], key=None) -> List[int]:
+    """
+    INSERT cả batch bằng một executemany, trả về id theo đúng thứ tự rows.
+    key là cột unique để đọc lại id trong một query (MySQL không có RETURNING);
+    không có key thì dùng RETURNING có giữ thứ tự, SQLAlchemy tự chọn cách batch theo dialect.
+    Dialect không RETURNING được cho executemany (MySQL) mà không có key: ORM flush, id lấy từ lastrowid từng dòng.
+    """
+    if key is None:
+        if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            return list((await db.scalars(
+                insert(model).returning(model.id, sort_by_parameter_order=True), rows
+            )).all())
+        items = [model(**row) for row in rows]
+        db.add_all(items)
+        await db.flush()
+        return [item.id for item in items]
+
+    if not is_unique(key):
+        # Cột không unique thì hai batch ghi đồng thời có thể đọc nhầm id của nhau
+        raise ValueError(f"insert_rows key {key} must be a unique column")
+
+    await db.execute(insert(model), rows)
+    values = [row[key.key] for row in rows]
+    found = dict((await db.execute(select(key, model.id).filter(key.in_(values)))).all())
+    return [found[value] for value in values]
+
+
+async def update_rows(db, model, rows: List[dict]):
+    """
+    UPDATE theo primary key cho cả batch (executemany), mỗi dict phải có "id"
+    """
+    await db.execute(update(model), rows)
+
+
+async def soft_delete_rows(db, model, ids: List[int]):
+    await db.execute(
+        update(model)
+        .filter(model.id.in_(ids))
+        .values(is_deleted=True)
+        .execution_options(synchronize_session=False)
+    )
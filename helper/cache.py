@@ -0,0 +1,285 @@
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select, func
+from param_compile import params
+from models.role import Role
+from models.user import User, serialize_user
+from models.chat import Chat, serialize_chat
+from models.model import Model
+from models.prompt import Prompt
+from models.permission import Permission
+from helper.user_link import load_user_links
+from database.database import SesionLocal, engine
+
+REFERENCE_CACHE_TTL = params.reference_cache_ttl
+# Số dòng tối đa mỗi bảng nạp sẵn khi worker khởi động
+REFERENCE_CACHE_WARM_LIMIT = params.reference_cache_warm_limit
+CACHE_VERSION_DIR = params.cache_version_dir
+
+
+class LocalVersionStore:
+    """
+    Version của từng namespace trong process hiện tại
+    """
+
+    def __init__(self):
+        self._versions = {}
+
+    def get(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace: str):
+        self._versions[namespace] = self.get(namespace) + 1
+
+
+class FileVersionStore:
+    """
+    Version dùng chung giữa các worker: mtime (ns) của một file cho mỗi namespace.
+    Mỗi worker chỉ stat file tối đa một lần mỗi `check_interval` giây.
+    """
+
+    def __init__(self, folder: str, check_interval: float = 0.5):
+        self.folder = folder
+        self.check_interval = check_interval
+        self._checked = {}
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, namespace: str) -> str:
+        return os.path.join(self.folder, namespace)
+
+    def get(self, namespace: str) -> int:
+        now = time.monotonic()
+        checked_at, version = self._checked.get(namespace, (0.0, 0))
+        if now - checked_at < self.check_interval:
+            return version
+        try:
+            version = os.stat(self._path(namespace)).st_mtime_ns
+        except FileNotFoundError:
+            version = 0
+        self._checked[namespace] = (now, version)
+        return version
+
+    def bump(self, namespace: str):
+        path = self._path(namespace)
+        try:
+            previous = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            open(path, "a").close()
+            previous = 0
+        version = max(time.time_ns(), previous + 1)
+        os.utime(path, ns=(version, version))
+        self._checked[namespace] = (time.monotonic(), version)
+
+
+class ReferenceCache:
+    """
+    Read-through cache cho bảng nhỏ, ít thay đổi: id -> to_dict().
+    Entry hết hạn theo TTL; mọi thao tác ghi bump version của namespace và làm mất hiệu lực toàn bộ entry.
+    Dict trả về dùng chung giữa các request, không được sửa trực tiếp.
+    """
+
+    def __init__(self, model, versions, ttl: float = REFERENCE_CACHE_TTL):
+        self.model = model
+        self.namespace = model.__tablename__
+        self.versions = versions
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._version = versions.get(self.namespace)
+        self._entries = {}
+
+    def _sync_version(self) -> int:
+        version = self.versions.get(self.namespace)
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        return version
+
+    async def get_many(self, db, ids: Iterable[int], include_deleted: bool = True) -> Dict[int, dict]:
+        version = self._sync_version()
+        now = time.monotonic()
+        found, missing = {}, []
+        for item_id in set(ids):
+            if item_id is None:
+                continue
+            entry = self._entries.get(item_id)
+            if entry is not None and entry[0] > now:
+                found[item_id] = entry
+                self.hits += 1
+            else:
+                missing.append(item_id)
+                self.misses += 1
+
+        if missing:
+            query = select(self.model).filter(self.model.id.in_(missing))
+            if db.bind is engine:
+                rows = (await db.scalars(query)).all()
+            else:
+                # Session đọc từ replica: nạp cache từ primary để không giữ bản cũ do replication lag tới hết TTL
+                async with SesionLocal() as primary:
+                    rows = (await primary.scalars(query)).all()
+            expires_at = time.monotonic() + self.ttl
+            # Có ghi đồng thời trong lúc đang load thì không lưu dữ liệu có thể đã cũ
+            store = self.versions.get(self.namespace) == version
+            for row in rows:
+                entry = (expires_at, row.is_deleted, row.to_dict())
+                found[row.id] = entry
+                if store:
+                    self._entries[row.id] = entry
+
+        return {
+            item_id: data
+            for item_id, (_, is_deleted, data) in found.items()
+            if include_deleted or not is_deleted
+        }
+
+    async def get(self, db, item_id: int, include_deleted: bool = False) -> Optional[dict]:
+        return (await self.get_many(db, [item_id], include_deleted)).get(item_id)
+
+    async def warm(self, db, limit: int = REFERENCE_CACHE_WARM_LIMIT):
+        """
+        Nạp sẵn tối đa `limit` dòng mới nhất, không tính vào hit / miss
+        """
+        version = self._sync_version()
+        rows = (await db.scalars(select(self.model).order_by(self.model.id.desc()).limit(limit))).all()
+        if self.versions.get(self.namespace) != version:
+            return
+        expires_at = time.monotonic() + self.ttl
+        for row in rows:
+            self._entries[row.id] = (expires_at, row.is_deleted, row.to_dict())
+
+    def invalidate(self):
+        self.versions.bump(self.namespace)
+        self._sync_version()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Nhiều worker thì version được chia sẻ qua file để một worker ghi, các worker khác cũng bỏ cache
+versions = FileVersionStore(CACHE_VERSION_DIR) if params.workers > 1 else LocalVersionStore()
+
+role_cache = ReferenceCache(Role, versions)
+prompt_cache = ReferenceCache(Prompt, versions)
+model_cache = ReferenceCache(Model, versions)
+permission_cache = ReferenceCache(Permission, versions)
+
+reference_caches = [role_cache, prompt_cache, model_cache, permission_cache]
+
+
+async def user_dicts(db, users: List[User]) -> List[dict]:
+    """
+    Serialize user, role / default prompt / default model lấy từ cache thay vì JOIN,
+    chat_ids / prompt_ids / models lấy từ bảng liên kết
+    """
+    roles = await role_cache.get_many(db, [user.role_id for user in users])
+    prompts = await prompt_cache.get_many(db, [user.default_prompt for user in users])
+    models = await model_cache.get_many(db, [user.default_model for user in users])
+    prompt_ids, model_ids, chat_ids = await load_user_links(db, [user.id for user in users])
+
+    result = []
+    for user in users:
+        data = serialize_user(user)
+        data["chat_ids"] = chat_ids.get(user.id, [])
+        data["prompt_ids"] = prompt_ids.get(user.id, [])
+        data["models"] = model_ids.get(user.id, [])
+        data["role"] = roles.get(user.role_id)
+        data["default_prompt"] = prompts.get(user.default_prompt)
+        data["default_model"] = models.get(user.default_model)
+        result.append(data)
+    return result
+
+
+async def user_dict(db, user: User) -> dict:
+    return (await user_dicts(db, [user]))[0]
+
+
+async def chat_dicts(db, chats: List[Chat]) -> List[dict]:
+    users = {chat.user.id: chat.user for chat in chats}
+    serialized = dict(zip(users, await user_dicts(db, list(users.values()))))
+
+    result = []
+    for chat in chats:
+        data = serialize_chat(chat)
+        data["user"] = serialized[chat.user_id]
+        result.append(data)
+    return result
+
+
+async def chat_dict(db, chat: Chat) -> dict:
+    return (await chat_dicts(db, [chat]))[0]
+
+
+def user_version(user: dict) -> tuple:
+    """
+    Version của một user đã serialize: chính user, role / prompt / model nhúng kèm và danh sách chat
+    (số lượng + id lớn nhất, chat chỉ được thêm hoặc xóa)
+    """
+    return (
+        user["id"],
+        user["updated_at"],
+        user["is_deleted"],
+        len(user["chat_ids"]),
+        max(user["chat_ids"], default=0),
+        *((user[field] or {}).get("updated_at") for field in ("role", "default_prompt", "default_model")),
+    )
+
+
+def chat_version(chat: dict) -> tuple:
+    return (chat["id"], chat["updated_at"], user_version(chat["user"]))
+
+
+async def user_versions(db, user_ids: Iterable[int]) -> Dict[int, tuple]:
+    """
+    Cùng giá trị với user_version(...) nhưng chỉ cần một query nhỏ (không load user / bảng liên kết)
+    và cache, dùng để trả lời 304 trước khi serialize
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+
+    chat_stats = (
+        select(Chat.user_id, func.count(Chat.id).label("chat_count"), func.max(Chat.id).label("last_chat_id"))
+        .filter(Chat.user_id.in_(user_ids), Chat.is_deleted == False)
+        .group_by(Chat.user_id)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(
+            User.id,
+            User.updated_at,
+            User.is_deleted,
+            User.role_id,
+            User.default_prompt,
+            User.default_model,
+            chat_stats.c.chat_count,
+            chat_stats.c.last_chat_id,
+        )
+        .outerjoin(chat_stats, chat_stats.c.user_id == User.id)
+        .filter(User.id.in_(user_ids))
+    )).all()
+
+    roles = await role_cache.get_many(db, [row.role_id for row in rows])
+    prompts = await prompt_cache.get_many(db, [row.default_prompt for row in rows])
+    models = await model_cache.get_many(db, [row.default_model for row in rows])
+
+    return {
+        row.id: (
+            row.id,
+            row.updated_at,
+            row.is_deleted,
+            row.chat_count or 0,
+            row.last_chat_id or 0,
+            (roles.get(row.role_id) or {}).get("updated_at"),
+            (prompts.get(row.default_prompt) or {}).get("updated_at"),
+            (models.get(row.default_model) or {}).get("updated_at"),
+        )
+        for row in rows
+    }
@@ -0,0 +1,80 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional, Sequence
+from fastapi import Request, Response, status
+from param_compile import params
+
+# Response phụ thuộc token nên chỉ cho phép cache riêng của client, luôn phải revalidate bằng ETag
+CACHE_CONTROL = params.cache_control
+
+
+def to_utc(value: datetime) -> datetime:
+    """
+    DateTime lưu trong DB không có timezone được coi là UTC
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def latest(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (list, tuple)):
+        values = [item for item in map(latest, value) if item is not None]
+        return max(values, key=to_utc, default=None)
+    return None
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+class Validator:
+    """
+    Weak ETag + Last-Modified tính từ version của các dòng trong response (id, updated_at, ...).
+    Hai lần tính trên cùng dữ liệu luôn cho cùng ETag nên có thể so sánh trước khi load / serialize.
+    """
+
+    def __init__(self, versions: Iterable[Sequence]):
+        versions = [tuple(version) for version in versions]
+        digest = hashlib.blake2b(repr(versions).encode("utf-8"), digest_size=16).hexdigest()
+        self.etag = f'W/"{digest}"'
+        modified = latest(versions)
+        self.last_modified = to_utc(modified).replace(microsecond=0) if modified is not None else None
+
+    def matches(self, request: Request) -> bool:
+        """
+        If-None-Match được ưu tiên; chỉ khi không có mới xét If-Modified-Since (RFC 9110)
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or self.last_modified is None:
+            return False
+        try:
+            since = to_utc(parsedate_to_datetime(if_modified_since))
+        except (TypeError, ValueError):
+            return False
+        return self.last_modified <= since
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def not_modified(self) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers())
+
+    def apply(self, response: Response) -> Response:
+        """
+        Chỉ gắn validator cho response thành công
+        """
+        if response.status_code == status.HTTP_200_OK:
+            response.headers.update(self.headers())
+        return response
@@ -0,0 +1,40 @@
+import zlib
+from typing import AsyncIterator, List
+from fastapi.responses import StreamingResponse
+from database.database import read_session
+from param_compile import params
+
+EXPORT_BATCH_SIZE = params.export_batch_size
+EXPORT_GZIP_LEVEL = params.export_gzip_level
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def stream_rows(query, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List]:
+    """
+    Đọc query bằng server-side cursor (yield_per), mỗi lần chỉ giữ một partition batch_size dòng.
+    Dùng session riêng (replica nếu có) vì response stream chạy sau khi dependency get_db đã đóng.
+    """
+    async with await read_session() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = EXPORT_GZIP_LEVEL) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def ndjson_response(chunks: AsyncIterator[bytes], filename: str, gzip: bool = False) -> StreamingResponse:
+    """
+    Mỗi dòng là một JSON object; gzip=True nén luồng bằng Content-Encoding: gzip
+    """
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,341 @@
+import os
+import json
+import time
+import fcntl
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+from param_compile import params
+
+METRICS_DIR = params.metrics_dir
+METRICS_FLUSH_INTERVAL = params.metrics_flush_interval
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, key: tuple = (), amount: float = 1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self) -> Dict[tuple, float]:
+        return self.values
+
+
+class Gauge(Counter):
+    """
+    Gauge có thể đọc lúc collect (callback) thay vì cập nhật trên hot path
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), callback: Optional[Callable[[], Dict[tuple, float]]] = None):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def collect(self) -> Dict[tuple, float]:
+        return self.callback() if self.callback else self.values
+
+
+class Histogram(Counter):
+    """
+    Mỗi series là list [count của từng bucket..., count của +Inf, sum], chưa cộng dồn
+    để observe chỉ tốn một bisect và hai phép cộng
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, key: tuple, value: float):
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> dict:
+        return {
+            name: [[list(key), value] for key, value in metric.collect().items()]
+            for name, metric in self.metrics.items()
+        }
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body chunk", ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements executed", ("engine", "operation")
+))
+db_query_latency = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("engine", "operation")
+))
+db_pool_wait = registry.register(Histogram(
+    "db_pool_wait_seconds", "Time to get a usable connection (pool queue, new connection, pre-ping)", ("engine",)
+))
+db_pool_checkouts = registry.register(Counter(
+    "db_pool_checkouts_total", "Connections checked out of the pool (pool checkout event)", ("engine",)
+))
+db_connections_opened = registry.register(Counter(
+    "db_connections_opened_total", "New DBAPI connections opened by the pool", ("engine",)
+))
+worker_start = registry.register(Histogram(
+    "worker_start_seconds", "Time from fork until a supervised worker is warm and accepting connections",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+))
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def label_text(names: Iterable[str], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render(snapshot: dict) -> str:
+    """
+    Prometheus text format (0.0.4) từ snapshot đã gộp
+    """
+    lines = []
+    for name, metric in registry.metrics.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, value in sorted(snapshot.get(name, []), key=lambda item: [str(part) for part in item[0]]):
+            if metric.kind != "histogram":
+                lines.append(f"{name}{label_text(metric.labels, key)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float("inf"),), value[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{name}_bucket{label_text(metric.labels, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{label_text(metric.labels, key)} {value[-1]}")
+            lines.append(f"{name}_count{label_text(metric.labels, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def merge(snapshots: Iterable[dict], live: Iterable[bool]) -> dict:
+    """
+    Cộng snapshot của các worker: counter / histogram cộng dồn cả worker đã chết,
+    gauge chỉ tính worker còn sống
+    """
+    merged: Dict[str, Dict[tuple, object]] = {}
+    for snapshot, alive in zip(snapshots, live):
+        for name, series in snapshot.items():
+            metric = registry.metrics.get(name)
+            if metric is None or (metric.kind == "gauge" and not alive):
+                continue
+            target = merged.setdefault(name, {})
+            for key, value in series:
+                key = tuple(key)
+                if metric.kind == "histogram":
+                    current = target.get(key)
+                    target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target[key] = target.get(key, 0) + value
+    return {name: [[list(key), value] for key, value in series.items()] for name, series in merged.items()}
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WorkerFiles:
+    """
+    Mỗi worker ghi snapshot của mình ra METRICS_DIR/<pid>.json (tmp + os.replace).
+    Khi scrape, worker nhận request đọc file của mọi worker và gộp; file của worker đã chết
+    được gộp vào dead.json (chỉ giữ counter / histogram) để thư mục không phình theo số lần restart.
+    """
+
+    def __init__(self, folder: str = METRICS_DIR):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    @staticmethod
+    def _write(path: str, snapshot: dict):
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "w") as file:
+            json.dump(snapshot, file)
+        os.replace(temp, path)
+
+    @staticmethod
+    def _read(path: str) -> dict:
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def flush(self):
+        self._write(self._path(f"{os.getpid()}.json"), registry.snapshot())
+
+    def collect(self) -> dict:
+        self.flush()
+        with open(self._path(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = self._read(self._path("dead.json"))
+            snapshots, live, compacted = [dead], [False], []
+            for name in os.listdir(self.folder):
+                stem = name[:-len(".json")]
+                if not name.endswith(".json") or not stem.isdigit():
+                    continue
+                snapshot = self._read(self._path(name))
+                alive = pid_alive(int(stem))
+                snapshots.append(snapshot)
+                live.append(alive)
+                if not alive:
+                    compacted.append(name)
+
+            if compacted:
+                self._write(self._path("dead.json"), merge(
+                    [dead] + [self._read(self._path(name)) for name in compacted],
+                    [False] * (len(compacted) + 1),
+                ))
+                for name in compacted:
+                    os.remove(self._path(name))
+        return merge(snapshots, live)
+
+
+# Nhiều worker thì gộp qua file, một worker đọc thẳng registry trong process
+worker_files = WorkerFiles() if params.workers > 1 else None
+
+
+def collect() -> str:
+    snapshot = worker_files.collect() if worker_files else registry.snapshot()
+    return render(snapshot)
+
+
+async def flush_periodically(interval: float = METRICS_FLUSH_INTERVAL):
+    """
+    Chạy trong lifespan của mỗi worker để worker khác thấy số liệu mới khi scrape
+    """
+    if worker_files is None:
+        return
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            worker_files.flush()
+    finally:
+        worker_files.flush()
+
+
+def query_operation(statement: str) -> str:
+    parts = statement.split(None, 1)
+    operation = parts[0].upper() if parts else ""
+    return operation if operation in QUERY_OPERATIONS else "OTHER"
+
+
+# Tên engine (primary, replica0...) -> engine, đọc số connection lúc scrape
+instrumented_engines: Dict[str, object] = {}
+
+
+def pool_stats() -> Dict[tuple, float]:
+    stats = {}
+    for name, engine in instrumented_engines.items():
+        pool = engine.sync_engine.pool
+        checked_out = getattr(pool, "checkedout", None)
+        overflow = getattr(pool, "overflow", None)
+        size = getattr(pool, "size", None)
+        stats[(name, "checked_out")] = checked_out() if checked_out else 0
+        stats[(name, "overflow")] = max(overflow(), 0) if overflow else 0
+        stats[(name, "size")] = size() if size else 0
+    return stats
+
+
+db_pool_connections = registry.register(Gauge(
+    "db_pool_connections", "Pool connections by engine and state", ("engine", "state"), callback=pool_stats
+))
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """
+    Đếm / đo thời gian từng câu SQL qua engine events, thời gian lấy connection từ pool (bọc Engine.connect),
+    số lần checkout / connection mới mở (pool event "checkout" / "connect")
+    và số connection đang checkout / overflow (đọc lúc scrape).
+    Mỗi engine (primary và từng replica) gắn một lần với label engine=name.
+    """
+    sync_engine = engine.sync_engine
+    instrumented_engines[name] = engine
+    label = (name,)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - connection.info["query_start"].pop()
+        operation = (name, query_operation(statement))
+        db_queries.inc(operation)
+        db_query_latency.observe(operation, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # Câu lỗi không đi qua after_cursor_execute, bỏ mốc thời gian để stack không lệch
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(sync_engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        db_connections_opened.inc(label)
+
+    @event.listens_for(sync_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        db_pool_checkouts.inc(label)
+
+    # SQLAlchemy không có event nào trước checkout nên thời gian chờ không đo được chỉ bằng event:
+    # bọc method Engine.connect() của chính instance này (Session / AsyncSession lấy connection qua đó).
+    # Đây không phải API công khai để mở rộng; connection lấy theo đường khác (raw_connection...) không được đo,
+    # khi đó db_pool_checkouts_total (event checkout) lớn hơn db_pool_wait_seconds_count - benchmark/metrics.py kiểm tra.
+    # Gắn vào engine chứ không vào pool để vẫn đo sau khi dispose() / invalidate tạo pool mới.
+    engine_connect = sync_engine.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return engine_connect()
+        finally:
+            db_pool_wait.observe(label, time.perf_counter() - start)
+
+    sync_engine.connect = timed_connect
@@ -0,0 +1,71 @@
+import json
+import base64
+from datetime import datetime
+from fastapi import Depends, Query
+from sqlalchemy import tuple_
+from typing import Annotated, List, Optional
+from fastapi.exceptions import RequestValidationError
+
+
+def encode_cursor(values: list) -> str:
+    """
+    Mã hóa giá trị keyset của dòng cuối trang thành cursor dạng opaque
+    """
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    padding = "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Cursor does not match pagination key")
+    return [
+        datetime.fromisoformat(value) if column.type.python_type is datetime else value
+        for column, value in zip(columns, values)
+    ]
+
+
+def cursor_query(*columns):
+    """
+    Tạo query param `cursor` đã giải mã theo keyset `columns`, cursor sai trả về 422
+    """
+    def parse_cursor(cursor: Optional[str] = Query(default=None)) -> Optional[list]:
+        if not cursor:
+            return None
+        try:
+            return decode_cursor(cursor, columns)
+        except (ValueError, TypeError):
+            raise RequestValidationError([{
+                "type": "value_error",
+                "loc": ("query", "cursor"),
+                "msg": "Invalid cursor",
+                "input": cursor,
+            }])
+
+    return Annotated[Optional[list], Depends(parse_cursor)]
+
+
+def paginate(query, *columns, cursor: Optional[list], skip: int, limit: int, descending: bool = False):
+    """
+    Keyset pagination theo `columns` (cột cuối phải unique, thường là id).
+    Không có cursor thì vẫn dùng skip/limit để tương thích client cũ.
+    """
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+
+    if cursor is None:
+        return query.offset(skip).limit(limit)
+
+    key = tuple_(*columns) if len(columns) > 1 else columns[0]
+    value = tuple_(*cursor) if len(columns) > 1 else cursor[0]
+    return query.filter(key < value if descending else key > value).limit(limit)
+
+
+def next_cursor(items: List, limit: int, *columns) -> Optional[str]:
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor([getattr(last, column.key) for column in columns])
@@ -1,9 +1,25 @@
 import os
+import hmac
 import base64
-import jwt
-import datetime
+import asyncio
+import hashlib
+from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from param_compile import params
 
-SECRET_KEY = os.environ['HASH_KEY']
+SECRET_KEY = params.hash_key
+
+# scrypt: N=2^14, r=8, p=1 (~16 MiB RAM, vài chục ms mỗi lần hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_PREFIX = "scrypt"
+
+# hashlib.scrypt nhả GIL nên chạy trong thread pool giới hạn, không block event loop
+password_executor = ThreadPoolExecutor(
+    max_workers=params.password_workers,
+    thread_name_prefix="password",
+)
 
 def hash_base64(input_string: str) -> str:
     """Mã hóa chuỗi bằng Base64"""
@@ -11,4 +27,41 @@ def hash_base64(input_string: str) -> str:
     return encoded_bytes.decode("utf-8")
 
 def create_password(input: str) -> str:
-    return (hash_base64(input) + hash_base64(SECRET_KEY)) * 2
\ No newline at end of file
+    """Định dạng cũ (base64), chỉ dùng để nhận diện và rehash password đã lưu"""
+    return (hash_base64(input) + hash_base64(SECRET_KEY)) * 2
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=64 * 1024 * 1024, dklen=32)
+
+def hash_password_sync(password: str, salt: bytes = None) -> str:
+    # salt cố định chỉ dùng cho dữ liệu sinh sẵn (database.seed) cần tái lập được
+    salt = salt or os.urandom(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return "$".join([
+        SCRYPT_PREFIX,
+        str(SCRYPT_N),
+        str(SCRYPT_R),
+        str(SCRYPT_P),
+        base64.b64encode(salt).decode("utf-8"),
+        base64.b64encode(digest).decode("utf-8"),
+    ])
+
+def verify_password_sync(password: str, stored: str) -> Tuple[bool, bool]:
+    """
+    Trả về (đúng password, cần rehash). Password base64 cũ luôn cần rehash.
+    """
+    if not stored.startswith(SCRYPT_PREFIX + "$"):
+        return hmac.compare_digest(create_password(password), stored), True
+
+    _, n, r, p, salt, digest = stored.split("$")
+    candidate = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    needs_rehash = (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return hmac.compare_digest(candidate, base64.b64decode(digest)), needs_rehash
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, hash_password_sync, password)
+
+async def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password_sync, password, stored)
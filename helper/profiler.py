@@ -0,0 +1,146 @@
+import os
+import re
+import sys
+import time
+import logging
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from greenlet import getcurrent
+from sqlalchemy import event
+
+# Log qua logger của uvicorn để hiện theo --log_level
+logger = logging.getLogger("uvicorn.error.sql_profile")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Frame thuộc các file này không phải call site của route
+SKIPPED_FILES = (os.path.abspath(__file__), os.path.join(PROJECT_ROOT, "database", "database.py"))
+
+PLACEHOLDERS = re.compile(r"\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)")
+POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Gộp các câu chỉ khác số tham số trong IN (...) về cùng một dạng
+    """
+    shape = WHITESPACE.sub(" ", statement).strip()
+    shape = POSTCOMPILE.sub("(...)", shape)
+    return PLACEHOLDERS.sub("(...)", shape)
+
+
+def call_site() -> str:
+    """
+    Frame đầu tiên thuộc code của project. Query chạy trong greenlet của SQLAlchemy nên
+    cần đi tiếp qua frame đang chờ của greenlet cha (nơi route gọi await db.execute ...).
+    """
+    frame = sys._getframe(1)
+    greenlet = getcurrent()
+    while True:
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            # Code sinh động (<string>, <frozen ...>) không có file thật
+            filename = os.path.abspath(filename) if not filename.startswith("<") else filename
+            if (
+                filename.startswith(PROJECT_ROOT)
+                and filename not in SKIPPED_FILES
+                and os.sep + "site-packages" + os.sep not in filename
+            ):
+                return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+            frame = frame.f_back
+        greenlet = greenlet.parent
+        if greenlet is None:
+            return "<unknown>"
+        frame = greenlet.gr_frame
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, repeat_threshold: int):
+        self.method = method
+        self.path = path
+        self.repeat_threshold = repeat_threshold
+        self.statements: List[tuple] = []
+        self.shapes: Dict[str, int] = {}
+
+    @property
+    def query_count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_time(self) -> float:
+        return sum(elapsed for _, elapsed in self.statements)
+
+    def record(self, statement: str, elapsed: float):
+        shape = statement_shape(statement)
+        self.statements.append((shape, elapsed))
+        count = self.shapes.get(shape, 0) + 1
+        self.shapes[shape] = count
+        # Chỉ cảnh báo một lần cho mỗi dạng câu, lúc vừa vượt ngưỡng
+        if count == self.repeat_threshold + 1:
+            logger.warning(
+                "Possible N+1: statement repeated %d times in %s %s at %s: %s",
+                count, self.method, self.path, call_site(), shape[:300],
+            )
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_time * 1000:.2f};desc="{self.query_count} queries"'
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+class RouteStats:
+    """
+    Thống kê theo route template của các request đã profile, in ra khi shutdown
+    """
+
+    def __init__(self):
+        self.routes: Dict[tuple, list] = {}
+
+    def add(self, method: str, route: str, profile: RequestProfile):
+        stats = self.routes.setdefault((method, route), [0, 0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += profile.query_count
+        stats[2] += profile.total_time
+        stats[3] = max(stats[3], profile.query_count)
+
+    def dump(self):
+        if not self.routes:
+            return
+        lines = [f"{'route':<40} {'requests':>8} {'avg queries':>11} {'max queries':>11} {'avg db ms':>9}"]
+        for (method, route), (requests, queries, seconds, most) in sorted(
+            self.routes.items(), key=lambda item: item[1][1] / item[1][0], reverse=True
+        ):
+            lines.append(
+                f"{method + ' ' + route:<40} {requests:>8} {queries / requests:>11.1f} {most:>11} "
+                f"{seconds / requests * 1000:>9.2f}"
+            )
+        logger.info("SQL profile per route:\n%s", "\n".join(lines))
+
+
+route_stats = RouteStats()
+
+
+def instrument_engine(engine):
+    """
+    Chỉ gắn khi bật --sql_profile; request không profile chỉ tốn một lần đọc ContextVar mỗi câu SQL
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if current_profile.get() is not None:
+            connection.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        profile = current_profile.get()
+        starts = connection.info.get("profile_start")
+        if profile is not None and starts:
+            profile.record(statement, time.perf_counter() - starts.pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("profile_start") if context.connection is not None else None
+        if current_profile.get() is not None and starts:
+            starts.pop()
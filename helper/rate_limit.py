@@ -0,0 +1,166 @@
+import re
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Tuple
+from param_compile import params
+
+RATE_LIMIT_DB = params.rate_limit_db
+RATE_LIMIT_MAX_KEYS = params.rate_limit_max_keys
+
+# (method, pattern) -> số token mỗi request; route không khớp: GET 1, còn lại 2
+ROUTE_COSTS = [
+    ("WEBSOCKET", re.compile(r"^/chats/\d+/ws$"), 5),
+    ("GET", re.compile(r"^/(chats|users)/export$"), 20),
+    ("GET", re.compile(r"^/chats/search$"), 3),
+    ("POST", re.compile(r"^/auth/(login|refresh-token)$"), 5),
+    ("*", re.compile(r"^/\w+/bulk$"), 10),
+]
+DEFAULT_READ_COST = 1
+DEFAULT_WRITE_COST = 2
+# Mỗi câu trả lời sinh qua WebSocket
+GENERATION_COST = 10
+
+
+def route_cost(method: str, path: str) -> int:
+    for route_method, pattern, cost in ROUTE_COSTS:
+        if (route_method == "*" or route_method == method) and pattern.match(path):
+            return cost
+    return DEFAULT_READ_COST if method in ("GET", "HEAD", "OPTIONS") else DEFAULT_WRITE_COST
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: float
+    # Giây tới khi đủ token cho request này (0 nếu được phép)
+    retry_after: float
+    # Giây tới khi bucket đầy lại
+    reset: float
+
+
+def refill(tokens: float, updated: float, now: float, cost: float, rate: float, burst: float) -> Tuple[float, Decision]:
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    cost = min(cost, burst)
+    if tokens >= cost:
+        tokens -= cost
+        return tokens, Decision(True, tokens, 0.0, (burst - tokens) / rate)
+    return tokens, Decision(False, tokens, (cost - tokens) / rate, (burst - tokens) / rate)
+
+
+class MemoryBackend:
+    """
+    Bucket trong process (một worker). Giữ tối đa RATE_LIMIT_MAX_KEYS key theo LRU.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> Decision:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens, decision = refill(tokens, updated, now, cost, rate, burst)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return decision
+
+
+class SQLiteBackend:
+    """
+    Bucket dùng chung giữa các worker trong một file SQLite local (BEGIN IMMEDIATE khóa ghi
+    nên đọc-tính-ghi của một key là nguyên tử). Chạy trên một thread riêng để không block event loop.
+    Có thể thay bằng backend khác (Redis...) miễn có `async take(key, cost, rate, burst) -> Decision`.
+    """
+
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit")
+        self._calls = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def _take(self, key: str, cost: float, rate: float, burst: float) -> Decision:
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens, decision = refill(tokens, updated, now, cost, rate, burst)
+            connection.execute("INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            self._calls += 1
+            if self._calls % self.CLEANUP_EVERY == 0:
+                # Bucket đã đầy lại thì không cần giữ
+                connection.execute("DELETE FROM bucket WHERE updated < ?", (now - burst / rate,))
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return decision
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> Decision:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._take, key, cost, rate, burst)
+
+
+class RateLimiter:
+    def __init__(self, backend, rate: float, burst: float):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.burst > 0
+
+    @staticmethod
+    def client_key(scope) -> str:
+        """
+        User đã xác thực (AuthorizationMiddleware đặt scope["state"]["user"]) hoặc IP client.
+        IP lấy từ scope["client"], uvicorn đã thay bằng X-Forwarded-For khi request đến từ --forwarded_allow_ips.
+        """
+        user = scope.get("state", {}).get("user")
+        if user is not None:
+            return f"user:{user['id']}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def take(self, key: str, cost: float) -> Decision:
+        return await self.backend.take(key, cost, self.rate, self.burst)
+
+    def headers(self, decision: Decision) -> dict:
+        headers = {
+            "RateLimit-Limit": str(int(self.burst)),
+            "RateLimit-Remaining": str(int(decision.remaining)),
+            "RateLimit-Reset": str(int(decision.reset + 0.999)),
+        }
+        if not decision.allowed:
+            headers["Retry-After"] = str(max(1, int(decision.retry_after + 0.999)))
+        return headers
+
+
+# Nhiều worker thì bucket phải dùng chung, một worker giữ trong process
+backend_name = params.rate_limit_backend or ("sqlite" if params.workers > 1 else "memory")
+rate_limiter = RateLimiter(
+    SQLiteBackend() if backend_name == "sqlite" else MemoryBackend(),
+    rate=params.rate_limit_rate,
+    burst=params.rate_limit_burst,
+)
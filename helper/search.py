@@ -0,0 +1,257 @@
+import re
+import json
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from param_compile import params
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = params.search_index_path
+# Số dòng khớp tốt nhất được xét trước khi gộp theo chat
+SEARCH_CANDIDATES = params.search_candidates
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+    title,
+    content,
+    chat_id UNINDEXED,
+    user_id UNINDEXED,
+    seq UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+-- Title nặng hơn nội dung tin nhắn khi xếp hạng
+INSERT INTO {table}({table}, rank) VALUES ('rank', 'bm25(5.0, 1.0)');
+"""
+
+# Chat đã xóa: đánh dấu thay vì DELETE (chat_id là cột UNINDEXED, xóa trong FTS5 phải quét cả bảng)
+DELETED_SCHEMA = "CREATE TABLE IF NOT EXISTS chat_deleted (chat_id INTEGER PRIMARY KEY)"
+
+SEARCH_QUERY = """
+SELECT chat_id, user_id, MIN(score) AS score, COUNT(*) AS matches, snippet
+FROM (
+    SELECT chat_id, user_id, rank AS score, snippet(chat_fts, -1, '<b>', '</b>', '…', 16) AS snippet
+    FROM chat_fts
+    WHERE chat_fts MATCH :query {user_filter}
+        AND chat_id NOT IN (SELECT chat_id FROM chat_deleted)
+    ORDER BY rank
+    LIMIT :candidates
+)
+GROUP BY chat_id
+ORDER BY score, chat_id
+LIMIT :limit OFFSET :skip
+"""
+
+INSERT = "INSERT INTO chat_fts (title, content, chat_id, user_id, seq) VALUES (?, ?, ?, ?, ?)"
+DELETE = "INSERT OR IGNORE INTO chat_deleted (chat_id) VALUES (?)"
+
+WORD = re.compile(r"\w+", re.UNICODE)
+# unicode61 bỏ dấu nhưng coi đ là một chữ riêng, gộp về d để "da nang" khớp "Đà Nẵng"
+FOLD = str.maketrans("đĐ", "dD")
+
+
+def fold(text: str) -> str:
+    return (text or "").translate(FOLD)
+
+
+def match_query(text: str) -> Optional[str]:
+    """
+    Chuyển input của người dùng thành truy vấn FTS5 an toàn: mọi từ phải khớp (AND),
+    từ cuối khớp theo tiền tố để gõ dở vẫn ra kết quả. Không có từ nào thì trả về None.
+    """
+    words = WORD.findall(fold(text))
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """
+    Inverted index (SQLite FTS5) trên file local: một dòng cho title (seq 0) và một dòng cho mỗi tin nhắn.
+    Ghi đi qua một thread duy nhất nên giữ đúng thứ tự và không block event loop;
+    đọc dùng connection riêng của từng thread (WAL cho phép đọc song song với ghi).
+    """
+
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-writer")
+        self._readers = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search-reader")
+
+    @staticmethod
+    def connect(path: str, table: str = "chat_fts") -> sqlite3.Connection:
+        # timeout là busy_timeout: chờ lock của process / thread khác thay vì lỗi ngay
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # Chỉ tạo khi chưa có: ghi lại config rank làm connection khác đang mở lỗi "SQL logic error" ở query kế tiếp
+        exists = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if not exists:
+            connection.executescript(SCHEMA.format(table=table))
+        connection.execute(DELETED_SCHEMA)
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Mỗi thread giữ một connection riêng
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self.connect(self.path)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def insert(connection: sqlite3.Connection, rows: List[Tuple[str, str, int, int, int]]):
+        """
+        Cả batch trong một transaction (connection ở chế độ autocommit)
+        """
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(INSERT, rows)
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _write(self, rows: List[Tuple[str, str, int, int, int]]):
+        self.insert(self._connection(), rows)
+
+    def _delete(self, chat_ids: List[int]):
+        connection = self._connection()
+        connection.execute("BEGIN")
+        connection.executemany(DELETE, [(chat_id,) for chat_id in chat_ids])
+        connection.execute("COMMIT")
+
+    def _schedule(self, rows: list, write=None):
+        if not rows:
+            return
+        future = self._writer.submit(write or self._write, rows)
+        future.add_done_callback(self._log_error)
+
+    @staticmethod
+    def _log_error(future):
+        error = future.exception()
+        if error is not None:
+            logger.error("Search index write failed: %s", error)
+
+    def index_chat(self, chat_id: int, user_id: int, title: str, messages: Iterable[Tuple[int, str]] = ()):
+        """
+        Không chờ ghi xong: lỗi index chỉ được log, không làm hỏng request
+        """
+        self._schedule(
+            [(fold(title), "", chat_id, user_id, 0)]
+            + [("", fold(content), chat_id, user_id, seq) for seq, content in messages]
+        )
+
+    def index_messages(self, chat_id: int, user_id: int, messages: Iterable[Tuple[int, str]]):
+        self._schedule([("", fold(content), chat_id, user_id, seq) for seq, content in messages])
+
+    def remove_chats(self, chat_ids: Iterable[int]):
+        """
+        Chat đã xóa không còn xuất hiện trong kết quả (lọc trước khi phân trang)
+        """
+        self._schedule(list(chat_ids), self._delete)
+
+    def _search(self, query: str, user_id: Optional[int], skip: int, limit: int) -> list:
+        sql = SEARCH_QUERY.format(user_filter="AND user_id = :user_id" if user_id is not None else "")
+        rows = self._connection().execute(sql, {
+            "query": query,
+            "user_id": user_id,
+            "candidates": SEARCH_CANDIDATES,
+            "limit": limit,
+            "skip": skip,
+        }).fetchall()
+        return [
+            {"chat_id": chat_id, "user_id": owner, "score": -score, "matches": matches, "snippet": snippet}
+            for chat_id, owner, score, matches, snippet in rows
+        ]
+
+    async def search(self, text: str, user_id: Optional[int] = None, skip: int = 0, limit: int = 20) -> list:
+        query = match_query(text)
+        if query is None:
+            return []
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._search, query, user_id, skip, limit)
+
+    def flush(self):
+        """
+        Chờ các lệnh ghi đã xếp hàng chạy xong
+        """
+        self._writer.submit(lambda: None).result()
+
+
+async def rebuild(batch_size: int, path: str = SEARCH_INDEX_PATH):
+    """
+    Build lại toàn bộ index từ DB vào bảng chat_fts_rebuild rồi thay bảng cũ trong một transaction,
+    server đang chạy vẫn đọc bảng cũ cho tới lúc thay. Tin nhắn ghi trong lúc rebuild có thể
+    không có trong index mới, nên chạy khi ít tải.
+    """
+    from sqlalchemy import select
+    from models.chat import Chat
+    from models.chat_message import ChatMessage
+    from database.database import SesionLocal
+
+    connection = SearchIndex.connect(path)
+    connection.execute("DROP TABLE IF EXISTS chat_fts_rebuild")
+    connection.executescript(SCHEMA.format(table="chat_fts_rebuild"))
+    insert = INSERT.replace("chat_fts", "chat_fts_rebuild", 1)
+    owners, total = {}, 0
+
+    def write(rows: list):
+        connection.execute("BEGIN")
+        connection.executemany(insert, rows)
+        connection.execute("COMMIT")
+
+    async with SesionLocal() as db:
+        chats = await db.stream(
+            select(Chat.id, Chat.user_id, Chat.title, Chat.conversation)
+            .filter(Chat.is_deleted == False)
+            .order_by(Chat.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in chats.partitions():
+            batch = []
+            for chat_id, user_id, title, conversation in rows:
+                owners[chat_id] = user_id
+                batch.append((fold(title), "", chat_id, user_id, 0))
+                # Chat chưa migrate sang chat_message vẫn còn nội dung trong JSON cũ
+                if isinstance(conversation, str):
+                    conversation = json.loads(conversation or "[]")
+                for seq, item in enumerate(conversation or [], start=1):
+                    batch.append(("", fold(str(item.get("content", ""))), chat_id, user_id, seq))
+            write(batch)
+            total += len(batch)
+
+        messages = await db.stream(
+            select(ChatMessage.chat_id, ChatMessage.seq, ChatMessage.content)
+            .order_by(ChatMessage.chat_id, ChatMessage.seq)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in messages.partitions():
+            write([
+                ("", fold(content), chat_id, owners[chat_id], seq)
+                for chat_id, seq, content in rows
+                if chat_id in owners
+            ])
+            total += len(rows)
+            print(f"Indexed {total} rows")
+
+    connection.execute("INSERT INTO chat_fts_rebuild(chat_fts_rebuild) VALUES ('optimize')")
+    connection.execute("BEGIN IMMEDIATE")
+    connection.execute("DROP TABLE chat_fts")
+    connection.execute("ALTER TABLE chat_fts_rebuild RENAME TO chat_fts")
+    # Index mới chỉ có chat chưa xóa; chat bị xóa trong lúc rebuild được đánh dấu lại ở lần search sau
+    connection.execute("DELETE FROM chat_deleted")
+    connection.execute("COMMIT")
+    connection.execute("VACUUM")
+    connection.close()
+    print(f"Search index rebuilt at {path} ({len(owners)} chats, {total} rows)")
+
+
+search_index = SearchIndex()
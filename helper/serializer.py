@@ -0,0 +1,15 @@
+def compile_serializer(*fields):
+    """
+    Tạo hàm serialize cố định cho một model: đọc thẳng giá trị đã load trong
+    __dict__ của instance thay vì đi qua descriptor của SQLAlchemy từng cột.
+    datetime được giữ nguyên để encoder JSON xử lý.
+    """
+    def serialize(instance) -> dict:
+        state = instance.__dict__
+        try:
+            return {field: state[field] for field in fields}
+        except KeyError:
+            # Thuộc tính chưa load / đã expire: để SQLAlchemy tự nạp
+            return {field: getattr(instance, field) for field in fields}
+
+    return serialize
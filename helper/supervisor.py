@@ -0,0 +1,266 @@
+import os
+import gc
+import time
+import asyncio
+import select
+import signal
+import logging
+from typing import Dict, List, Optional
+import uvicorn
+from helper import metrics
+
+logger = logging.getLogger("uvicorn.error.supervisor")
+
+# Worker chết trước khi sẵn sàng thì chờ chừng này giây mới fork lại (tránh fork liên tục khi lỗi khởi động)
+RESPAWN_DELAY = 1.0
+# Worker bị dừng ngừng accept trước chừng này giây rồi mới đóng các connection chưa có request
+DRAIN_SECONDS = 0.5
+
+
+class WorkerChannel:
+    """
+    Đầu ghi của pipe worker -> master, mỗi message một dòng
+    """
+
+    def __init__(self, fd: int, forked_at: float):
+        self.fd = fd
+        self.forked_at = forked_at
+
+    def send(self, message: str):
+        os.write(self.fd, f"{message}\n".encode())
+
+
+# Chỉ có giá trị trong process worker do Supervisor fork
+channel: Optional[WorkerChannel] = None
+
+
+def notify_ready() -> Optional[float]:
+    """
+    Gọi ở cuối lifespan startup (đã warm pool / cache): báo master thời gian khởi động của worker.
+    Ngoài chế độ supervisor không làm gì.
+    """
+    if channel is None:
+        return None
+    elapsed = time.monotonic() - channel.forked_at
+    metrics.worker_start.observe((), elapsed)
+    channel.send(f"ready {elapsed:.6f}")
+    return elapsed
+
+
+class RecyclingServer(uvicorn.Server):
+    """
+    Đủ max_requests thì không tự thoát như limit_max_requests của uvicorn mà xin master recycle,
+    master thay worker khi tới lượt (SIGTERM sau khi worker mới đã sẵn sàng)
+    """
+
+    def __init__(self, config: uvicorn.Config, max_requests: int):
+        super().__init__(config)
+        self.max_requests = max_requests
+        self.recycle_requested = False
+
+    async def on_tick(self, counter: int) -> bool:
+        if (
+            self.max_requests
+            and not self.recycle_requested
+            and self.server_state.total_requests >= self.max_requests
+        ):
+            self.recycle_requested = True
+            channel.send("recycle")
+        return await super().on_tick(counter)
+
+    async def shutdown(self, sockets=None):
+        # uvicorn đóng ngay connection chưa gửi request; connection vừa accept cần chút thời gian để gửi,
+        # trong lúc đó các worker còn lại nhận connection mới từ socket dùng chung
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(DRAIN_SECONDS)
+        await super().shutdown(sockets)
+
+
+class Worker:
+    def __init__(self, pid: int, fd: int, forked_at: float):
+        self.pid = pid
+        self.fd = fd
+        self.forked_at = forked_at
+        self.ready = False
+        self.buffer = b""
+
+
+class Supervisor:
+    """
+    Master import app một lần rồi fork các worker (dùng chung trang nhớ copy-on-write, không import lại
+    router hay parse lại tham số). Recycle lần lượt từng worker: fork worker thay thế, chờ nó warm xong
+    rồi mới SIGTERM worker cũ, nên số worker nhận request không bao giờ giảm.
+    SIGHUP recycle toàn bộ worker theo cùng cách, SIGTERM / SIGINT dừng tất cả.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, max_requests: int, graceful_timeout: float):
+        self.config = config
+        self.worker_count = workers
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.workers: Dict[int, Worker] = {}
+        self.recycle_queue: List[int] = []
+        # Cặp (worker cũ, worker thay thế) đang recycle
+        self.replacing: Optional[tuple] = None
+        # pid -> hạn chót trước khi SIGKILL
+        self.retiring: Dict[int, float] = {}
+        self.stopping = False
+        self.socket = None
+
+    def run(self):
+        self.config.load()
+        self.socket = self.config.bind_socket()
+        self.socket.set_inheritable(True)
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        # Đưa mọi object đã import vào generation permanent: GC của worker không ghi vào các trang này
+        gc.collect()
+        gc.freeze()
+        logger.info("Supervisor %d forking %d workers", os.getpid(), self.worker_count)
+        for _ in range(self.worker_count):
+            self.spawn()
+
+        while not self.stopping:
+            self.read_messages(timeout=0.5)
+            self.reap()
+            self.step_recycle()
+        self.shutdown()
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def handle_reload(self, signum, frame):
+        for pid in self.workers:
+            if pid not in self.recycle_queue and pid not in self.retiring:
+                self.recycle_queue.append(pid)
+
+    def spawn(self) -> int:
+        read_fd, write_fd = os.pipe()
+        forked_at = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self.run_worker(WorkerChannel(write_fd, forked_at))
+        os.close(write_fd)
+        self.workers[pid] = Worker(pid, read_fd, forked_at)
+        return pid
+
+    def run_worker(self, worker_channel: WorkerChannel):
+        global channel
+        channel = worker_channel
+        for worker in self.workers.values():
+            os.close(worker.fd)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)
+        gc.unfreeze()
+
+        code = 0
+        try:
+            RecyclingServer(self.config, self.max_requests).run(sockets=[self.socket])
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            # Không quay lại vòng lặp của master
+            os._exit(code)
+
+    def read_messages(self, timeout: float):
+        fds = {worker.fd: worker for worker in self.workers.values()}
+        try:
+            readable, _, _ = select.select(list(fds), [], [], timeout)
+        except InterruptedError:
+            return
+        for fd in readable:
+            worker = fds[fd]
+            data = os.read(fd, 4096)
+            if not data:
+                continue
+            worker.buffer += data
+            *lines, worker.buffer = worker.buffer.split(b"\n")
+            for line in lines:
+                self.handle_message(worker, line.decode())
+
+    def handle_message(self, worker: Worker, message: str):
+        kind, _, value = message.partition(" ")
+        if kind == "ready":
+            worker.ready = True
+            logger.info("Worker %d ready in %.0f ms", worker.pid, float(value) * 1000)
+        elif kind == "recycle" and worker.pid not in self.recycle_queue:
+            self.recycle_queue.append(worker.pid)
+
+    def reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.fd)
+            if pid in self.recycle_queue:
+                self.recycle_queue.remove(pid)
+            if self.retiring.pop(pid, None) is not None:
+                logger.info("Worker %d %s", pid, "stopped" if self.stopping else "recycled")
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            if self.replacing is not None and pid == self.replacing[1]:
+                # Worker thay thế chết trước khi sẵn sàng: worker cũ quay lại đầu hàng đợi
+                self.recycle_queue.insert(0, self.replacing[0])
+                self.replacing = None
+            elif self.replacing is not None and pid == self.replacing[0]:
+                # Worker cũ tự chết trong lúc chờ: worker thay thế thế chỗ luôn
+                self.replacing = None
+            if self.stopping:
+                continue
+            logger.warning("Worker %d exited unexpectedly with code %s, respawning", pid, code)
+            if not worker.ready:
+                time.sleep(RESPAWN_DELAY)
+            active = len(self.workers) - len(self.retiring)
+            if active < self.worker_count + (self.replacing is not None):
+                self.spawn()
+
+    def step_recycle(self):
+        now = time.monotonic()
+        for pid, deadline in self.retiring.items():
+            if now > deadline:
+                logger.warning("Worker %d did not stop in %.0f s, killing", pid, self.graceful_timeout)
+                os.kill(pid, signal.SIGKILL)
+                self.retiring[pid] = float("inf")
+
+        if self.replacing is not None:
+            old, new = self.replacing
+            if self.workers[new].ready:
+                self.replacing = None
+                self.retire(old)
+            return
+
+        # Mỗi lần chỉ recycle một worker: chờ worker cũ thoát hẳn rồi mới tới worker kế tiếp
+        if self.retiring or not self.recycle_queue:
+            return
+        old = self.recycle_queue.pop(0)
+        if old in self.workers:
+            self.replacing = (old, self.spawn())
+
+    def retire(self, pid: int):
+        self.retiring[pid] = time.monotonic() + self.graceful_timeout
+        os.kill(pid, signal.SIGTERM)
+
+    def shutdown(self):
+        logger.info("Supervisor stopping %d workers", len(self.workers))
+        for pid in self.workers:
+            if pid not in self.retiring:
+                self.retire(pid)
+        while self.workers:
+            self.reap()
+            self.step_recycle()
+            time.sleep(0.1)
+        self.socket.close()
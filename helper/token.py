@@ -1,11 +1,269 @@
 import os
 import jwt
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import secrets
+from typing import Dict, Iterable, Optional
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from sqlalchemy import delete, select, update
+from param_compile import params
+from models.refresh_token import RefreshToken
+from helper.cache import CACHE_VERSION_DIR, FileVersionStore, versions
 
-SECRET_KEY = os.environ["HASH_KEY"]
+SECRET_KEY = params.hash_key
+TOKEN_CACHE_SIZE = params.token_cache_size
+TOKEN_CACHE_TTL = params.token_cache_ttl
+ACCESS_TOKEN_TTL = params.access_token_ttl
+REFRESH_TOKEN_TTL = params.refresh_token_ttl
+# Xóa refresh token hết hạn sau mỗi chừng này lần cấp mới
+REFRESH_TOKEN_PURGE_EVERY = 1000
+# Namespace version của danh sách thu hồi access token
+TOKEN_REVOCATIONS = "token_revocations"
 
 def create_jwt_token(payload: dict) -> str:
+    token = jwt.encode(payload, SECRET_KEY, algorithm="HS512")
+    return token
+
+def decode_jwt_token(token: str) -> dict:
     """
-    Tạo JWT token không có thời gian hết hạn
+    Kiểm tra chữ ký HS512 và hạn (exp bắt buộc), token sai / hết hạn sẽ raise jwt.InvalidTokenError
     """
-    token = jwt.encode(payload, SECRET_KEY, algorithm="HS512")
-    return token
\ No newline at end of file
+    return jwt.decode(token, SECRET_KEY, algorithms=["HS512"], options={"require": ["exp", "sub"]})
+
+def create_access_token(user: dict) -> str:
+    """
+    Access token ngắn hạn mang sẵn thông tin user cần cho request, verify không cần DB.
+    Không chứa password; sửa / xóa user thu hồi ngay token đã phát hành (token_revocations).
+    iat giữ phần lẻ của giây để token phát hành ngay sau lúc thu hồi vẫn hợp lệ.
+    """
+    now = time.time()
+    return create_jwt_token({
+        "sub": str(user["id"]),
+        "user_name": user["user_name"],
+        "email": user["email"],
+        "role_id": user["role_id"],
+        "typ": "access",
+        "iat": now,
+        "exp": int(now) + ACCESS_TOKEN_TTL,
+    })
+
+def decode_access_token(token: str) -> dict:
+    """
+    Trả về payload của access token hợp lệ, raise jwt.InvalidTokenError nếu không phải
+    """
+    payload = decode_jwt_token(token)
+    if payload.get("typ") != "access":
+        raise jwt.InvalidTokenError("Not an access token")
+    return payload
+
+def token_user(payload: dict) -> dict:
+    return {
+        "id": int(payload["sub"]),
+        "user_name": payload["user_name"],
+        "email": payload["email"],
+        "role_id": payload["role_id"],
+        "issued_at": payload.get("iat", 0),
+    }
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+_issued = 0
+
+async def issue_refresh_token(db, user_id: int, family: Optional[str] = None) -> str:
+    """
+    Thêm refresh token mới (family mới khi login) vào session, caller commit.
+    Chỉ hash được lưu nên lộ bảng refresh_token không dùng được token
+    """
+    global _issued
+    _issued += 1
+    now = datetime.now()
+    if _issued % REFRESH_TOKEN_PURGE_EVERY == 0:
+        await db.execute(delete(RefreshToken).where(RefreshToken.expires_at < now))
+
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        token_hash=hash_refresh_token(token),
+        family=family or uuid.uuid4().hex,
+        user_id=user_id,
+        expires_at=now + timedelta(seconds=REFRESH_TOKEN_TTL),
+    ))
+    return token
+
+async def use_refresh_token(db, token: str):
+    """
+    Thu hồi refresh token để đổi lấy token mới, trả về dòng RefreshToken hoặc None nếu không dùng được.
+    Token đã bị thu hồi mà vẫn được gửi lại (bị lộ, hoặc client dùng lại) thì thu hồi cả family.
+    UPDATE có điều kiện nên hai request đồng thời cùng token chỉ một request đổi được. Caller commit.
+    """
+    row = (await db.scalars(
+        select(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token))
+    )).first()
+
+    now = datetime.now()
+    if row is None or row.expires_at < now:
+        return None
+
+    if row.revoked_at is None:
+        result = await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.id == row.id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+        )
+        if result.rowcount == 1:
+            return row
+
+    await revoke_refresh_tokens(db, family=row.family)
+    return None
+
+async def revoke_refresh_tokens(db, user_ids: Iterable[int] = (), family: Optional[str] = None):
+    """
+    Thu hồi refresh token còn hiệu lực của các user hoặc của một family, caller commit
+    """
+    condition = RefreshToken.family == family if family is not None else RefreshToken.user_id.in_(list(user_ids))
+    await db.execute(
+        update(RefreshToken)
+        .where(condition, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now())
+    )
+
+
+class TokenRevocations:
+    """
+    user_id -> thời điểm thu hồi: access token của user phát hành trước lúc đó (iat) bị từ chối ngay,
+    không chờ hết hạn. Nhiều worker: danh sách nằm trong một file JSON ghi dưới flock, worker khác đọc lại
+    khi version namespace token_revocations đổi. Version store truyền vào nên kiểm tra mỗi lần gọi
+    (check_interval=0) để worker khác từ chối ngay ở request kế tiếp. Entry cũ hơn ACCESS_TOKEN_TTL
+    bị bỏ khi ghi vì token phát hành trước đó đã hết hạn, nên danh sách chỉ lớn theo số lần thu hồi gần đây.
+    """
+
+    def __init__(self, versions, path: Optional[str] = None, ttl: float = ACCESS_TOKEN_TTL):
+        self.versions = versions
+        self.path = path
+        self.ttl = ttl
+        self._revoked: Dict[int, float] = {}
+        self._version = versions.get(TOKEN_REVOCATIONS)
+        if path is not None:
+            self._revoked = self._read()
+
+    def _read(self) -> Dict[int, float]:
+        try:
+            with open(self.path) as file:
+                return {int(user_id): revoked_at for user_id, revoked_at in json.load(file).items()}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, revoked: Dict[int, float]):
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp, "w") as file:
+            json.dump(revoked, file)
+        os.replace(temp, self.path)
+
+    def _sync(self):
+        version = self.versions.get(TOKEN_REVOCATIONS)
+        if version != self._version:
+            self._version = version
+            if self.path is not None:
+                self._revoked = self._read()
+
+    def _merge(self, revoked: Dict[int, float], user_ids: Iterable[int]) -> Dict[int, float]:
+        now = time.time()
+        revoked.update(dict.fromkeys(user_ids, now))
+        return {user_id: revoked_at for user_id, revoked_at in revoked.items() if now - revoked_at <= self.ttl}
+
+    def revoke(self, user_ids: Iterable[int]):
+        """
+        Gọi sau khi commit thay đổi của user
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        if self.path is None:
+            self._revoked = self._merge(dict(self._revoked), user_ids)
+            self.versions.bump(TOKEN_REVOCATIONS)
+            self._version = self.versions.get(TOKEN_REVOCATIONS)
+            return
+
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            revoked = self._merge(self._read(), user_ids)
+            self._write(revoked)
+            # Bump trong lock: worker ghi sau luôn có version lớn hơn nên không bị bỏ sót
+            self.versions.bump(TOKEN_REVOCATIONS)
+            self._revoked = revoked
+            self._version = self.versions.get(TOKEN_REVOCATIONS)
+
+    def is_revoked(self, user: dict) -> bool:
+        self._sync()
+        revoked_at = self._revoked.get(user["id"])
+        return revoked_at is not None and user["issued_at"] <= revoked_at
+
+
+class TokenCache:
+    """
+    LRU có TTL cho token đã verify: token -> thông tin user.
+    Hot path chỉ là một lần tra dict, không verify chữ ký và không query DB.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get(self, token: str) -> Optional[dict]:
+        item = self._items.get(token)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, user = item
+        if expires_at < time.monotonic():
+            self._remove(token)
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def set(self, token: str, user: dict, expires_at: Optional[float] = None):
+        """
+        expires_at (epoch, exp của token): entry không sống lâu hơn token
+        """
+        self._remove(token)
+        ttl = self.ttl if expires_at is None else min(self.ttl, expires_at - time.time())
+        self._items[token] = (time.monotonic() + ttl, user)
+        while len(self._items) > self.max_size:
+            self._remove(next(iter(self._items)))
+
+    def clear(self):
+        self._items.clear()
+
+    def _remove(self, token: str):
+        self._items.pop(token, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+token_cache = TokenCache()
+
+# Nhiều worker thì chia sẻ qua file cạnh version store, một worker giữ trong process.
+# Thu hồi không chờ check_interval của store chung: mỗi request có token stat file version một lần
+token_revocations = TokenRevocations(
+    FileVersionStore(CACHE_VERSION_DIR, check_interval=0) if params.workers > 1 else versions,
+    os.path.join(CACHE_VERSION_DIR, "token_revocations.json") if params.workers > 1 else None,
+)
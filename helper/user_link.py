@@ -0,0 +1,82 @@
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import delete, insert, select, tuple_
+from models.chat import Chat
+from models.model import Model
+from models.prompt import Prompt
+from helper.bulk import existing_ids
+from models.user_model import UserModel
+from models.user_prompt import UserPrompt
+
+# (bảng liên kết, cột id) theo thứ tự (prompt_ids, models)
+LINKS = ((UserPrompt, UserPrompt.prompt_id), (UserModel, UserModel.model_id))
+
+
+async def load_user_links(db, user_ids: List[int]) -> Tuple[Dict[int, list], Dict[int, list], Dict[int, list]]:
+    """
+    prompt_ids / models / chat_ids của cả trang user, mỗi bảng một query theo index user_id
+    """
+    prompt_ids, model_ids, chat_ids = {}, {}, {}
+    if not user_ids:
+        return prompt_ids, model_ids, chat_ids
+
+    for (link, column), result in zip(LINKS, (prompt_ids, model_ids)):
+        rows = (await db.execute(
+            select(link.user_id, column)
+            .filter(link.user_id.in_(user_ids))
+            .order_by(link.user_id, column)
+        )).all()
+        for user_id, value in rows:
+            result.setdefault(user_id, []).append(value)
+
+    rows = (await db.execute(
+        select(Chat.user_id, Chat.id)
+        .filter(Chat.user_id.in_(user_ids), Chat.is_deleted == False)
+        .order_by(Chat.user_id, Chat.id)
+    )).all()
+    for user_id, chat_id in rows:
+        chat_ids.setdefault(user_id, []).append(chat_id)
+
+    return prompt_ids, model_ids, chat_ids
+
+
+async def set_user_links(db, links: Dict[int, Tuple[Iterable[int], Iterable[int]]]):
+    """
+    links: user_id -> (prompt_ids, models). Chỉ xóa / thêm phần chênh lệch so với DB,
+    cả batch user dùng chung một SELECT, một DELETE và một INSERT cho mỗi bảng.
+    """
+    user_ids = list(links)
+    for position, (link, column) in enumerate(LINKS):
+        current = set((await db.execute(
+            select(link.user_id, column).filter(link.user_id.in_(user_ids))
+        )).all())
+        wanted = {
+            (user_id, int(value))
+            for user_id, values in links.items()
+            for value in values[position]
+        }
+
+        removed = current - wanted
+        if removed:
+            await db.execute(delete(link).filter(tuple_(link.user_id, column).in_(removed)))
+
+        added = wanted - current
+        if added:
+            await db.execute(insert(link), [
+                {"user_id": user_id, column.key: value} for user_id, value in sorted(added)
+            ])
+
+
+async def missing_user_links(db, user_items) -> Dict[int, str]:
+    """
+    index -> lỗi khi prompt_ids / models trỏ tới dòng không tồn tại, mỗi bảng một query cho cả batch
+    """
+    errors = {}
+    for field, model in (("prompt_ids", Prompt), ("models", Model)):
+        found = await existing_ids(db, model, {
+            value for user_item in user_items for value in getattr(user_item, field)
+        })
+        for index, user_item in enumerate(user_items):
+            missing = set(getattr(user_item, field)) - found
+            if missing and index not in errors:
+                errors[index] = f"{model.__name__}s with IDs {missing} do not exist."
+    return errors
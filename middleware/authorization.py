@@ -0,0 +1,60 @@
+import asyncio
+from fastapi import status
+from starlette.requests import HTTPConnection
+from database.database import SesionLocal
+from schema.response import ResponseMessage
+from helper.authorizer import Authorizer
+from helper.auth import bearer_token, is_metrics_token, resolve_token
+
+PUBLIC_PATHS = ("/", "/docs", "/redoc", "/openapi.json")
+PUBLIC_PREFIXES = ("/auth/", "/docs/")
+METRICS_PATH = "/metrics"
+
+
+class AuthorizationMiddleware:
+    """
+    Kiểm tra role của user có permission route khớp với path hay không (bảng compile sẵn trong Authorizer).
+    Request không có token hợp lệ được cho qua để dependency verify_token trả 401.
+    """
+
+    def __init__(self, app, authorizer: Authorizer):
+        self.app = app
+        self.authorizer = authorizer
+        self._lock = asyncio.Lock()
+
+    async def ensure_loaded(self):
+        # Lần đầu, hoặc worker khác đã đổi role / permission (version dùng chung thay đổi)
+        if not self.authorizer.stale():
+            return
+        async with self._lock:
+            if self.authorizer.stale():
+                async with SesionLocal() as db:
+                    await self.authorizer.load(db)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] not in ("http", "websocket") or path in PUBLIC_PATHS or path.startswith(PUBLIC_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        connection = HTTPConnection(scope)
+        if path == METRICS_PATH and is_metrics_token(connection):
+            return await self.app(scope, receive, send)
+
+        token = bearer_token(connection)
+        user = await resolve_token(token) if token else None
+        if user is None:
+            return await self.app(scope, receive, send)
+
+        scope.setdefault("state", {})["user"] = user
+        await self.ensure_loaded()
+        if self.authorizer.is_allowed(user["role_id"], path):
+            return await self.app(scope, receive, send)
+
+        if scope["type"] == "websocket":
+            return await send({"type": "websocket.close", "code": status.WS_1008_POLICY_VIOLATION})
+
+        response = ResponseMessage(
+            code=status.HTTP_403_FORBIDDEN,
+            message=f"Permission denied for route {path}",
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,115 @@
+import zlib
+from typing import Iterable
+from starlette.datastructures import Headers, MutableHeaders
+
+# Status không có body hoặc body không được phép đổi encoding
+UNCOMPRESSED_STATUS = (204, 206, 304)
+
+
+def accepts_gzip(headers: Headers) -> bool:
+    """
+    Accept-Encoding có gzip (hoặc *) với q > 0
+    """
+    for item in headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class CompressionMiddleware:
+    """
+    Nén gzip response HTTP theo Accept-Encoding.
+
+    - Response một lượt: chỉ nén khi body >= min_size, Content-Length được tính lại.
+    - Response stream (StreamingResponse / NDJSON export): mỗi chunk được nén rồi Z_SYNC_FLUSH
+      ngay để client nhận dữ liệu kịp thời thay vì đợi buffer của zlib đầy.
+    - WebSocket, response đã có Content-Encoding và content type ngoài allow-list đi thẳng qua.
+    """
+
+    def __init__(self, app, level: int = 6, min_size: int = 1024, content_types: Iterable[str] = ("application/json",)):
+        self.app = app
+        self.level = level
+        self.min_size = min_size
+        self.content_types = tuple(content_type.strip().lower() for content_type in content_types if content_type.strip())
+
+    def allowed(self, content_type: str) -> bool:
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        return any(
+            media_type.startswith(allowed) if allowed.endswith("/") else media_type == allowed
+            for allowed in self.content_types
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.level <= 0 or not accepts_gzip(Headers(scope=scope)):
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    message["status"] in UNCOMPRESSED_STATUS
+                    or "content-encoding" in headers
+                    or not self.allowed(headers.get("content-type", ""))
+                )
+                if passthrough:
+                    return await send(message)
+                # Chờ chunk body đầu tiên để biết response một lượt hay stream
+                start = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                if start is not None:
+                    # Extension khác (pathsend...): gửi nguyên response không nén
+                    passthrough = True
+                    await send(start)
+                    start = None
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.min_size:
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    return await send(message)
+
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                headers["Content-Encoding"] = "gzip"
+                if more_body:
+                    # Độ dài cuối cùng chưa biết, để server gửi chunked
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.compress(body) + compressor.flush()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    start = None
+                    return await send({"type": "http.response.body", "body": body, "more_body": False})
+                await send(start)
+                start = None
+
+            if more_body:
+                data = compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH) if body else b""
+            else:
+                data = compressor.compress(body) + compressor.flush()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,37 @@
+from starlette.datastructures import Headers, MutableHeaders
+from helper.profiler import RequestProfile, current_profile, route_stats
+
+PROFILE_HEADER = "x-sql-profile"
+
+
+class SQLProfilerMiddleware:
+    """
+    Profile SQL của request có header X-SQL-Profile: 1 (chỉ được thêm khi chạy với --sql_profile=1).
+    Trả tóm tắt trong Server-Timing / X-Query-Count; câu SQL chạy sau khi header đã gửi
+    (response stream) vẫn được tính vào thống kê theo route.
+    """
+
+    def __init__(self, app, repeat_threshold: int = 5):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or Headers(scope=scope).get(PROFILE_HEADER) != "1":
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["method"], scope["path"], self.repeat_threshold)
+        token = current_profile.set(profile)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", profile.server_timing())
+                headers["X-Query-Count"] = str(profile.query_count)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            current_profile.reset(token)
+            route = getattr(scope.get("route"), "path", scope["path"])
+            route_stats.add(scope["method"], route, profile)
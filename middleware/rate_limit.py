@@ -0,0 +1,46 @@
+from fastapi import status
+from starlette.datastructures import MutableHeaders
+from schema.response import ResponseMessage
+from helper.rate_limit import RateLimiter, route_cost
+
+EXEMPT_PATHS = ("/", "/metrics")
+
+
+class RateLimitMiddleware:
+    """
+    Token bucket theo user đã xác thực hoặc IP client, mỗi request trừ số token theo route_cost.
+    Phải nằm trong AuthorizationMiddleware (add_middleware trước) để đã có scope["state"]["user"].
+    Hết token: HTTP trả 429, WebSocket bị đóng trước khi accept; response được phép kèm RateLimit-*.
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or not self.limiter.enabled or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"] if scope["type"] == "http" else "WEBSOCKET"
+        decision = await self.limiter.take(self.limiter.client_key(scope), route_cost(method, scope["path"]))
+        headers = self.limiter.headers(decision)
+
+        if not decision.allowed:
+            if scope["type"] == "websocket":
+                return await send({"type": "websocket.close", "code": status.WS_1008_POLICY_VIOLATION})
+            response = ResponseMessage(
+                code=status.HTTP_429_TOO_MANY_REQUESTS,
+                message=f"Rate limit exceeded, retry after {headers['Retry-After']} seconds",
+            )
+            response.headers.update(headers)
+            return await response(scope, receive, send)
+
+        if scope["type"] == "websocket":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
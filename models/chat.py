@@ -1,4 +1,5 @@
 from database.database import Base
+from helper.serializer import compile_serializer
 from sqlalchemy import (
     Column,
     String,
@@ -8,32 +9,52 @@ from sqlalchemy import (
     ForeignKey,
     JSON,
     func,
+    Index,
     ForeignKeyConstraint
 )
-from sqlalchemy.orm import relationship
+from models.user import User
+from sqlalchemy.orm import relationship, selectinload
 from datetime import datetime
 
+serialize_chat = compile_serializer(
+    "id",
+    "title",
+    "conversation",
+    "user_id",
+    "last_seq",
+    "is_deleted",
+    "created_at",
+    "updated_at",
+)
+
 class Chat(Base):
     __tablename__ = 'chat'
 
     id = Column(Integer, primary_key=True, index=True) 
     title = Column(String(255), nullable=False)
-    conversation = Column(JSON, nullable=False, default=[])
+    conversation = Column(JSON, nullable=False, default=[])  # Legacy, tin nhắn mới nằm ở bảng chat_message
+    last_seq = Column(Integer, nullable=False, default=0, server_default="0")
     user_id = Column(Integer, ForeignKey("user.id"), nullable=False)  
     is_deleted = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), default=datetime.now)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    user = relationship("User", backref="users", foreign_keys=[user_id])
+    __table_args__ = (
+        Index("ix_chat_is_deleted_id", "is_deleted", "id"),
+        # Timeline của từng user: WHERE user_id = ? AND is_deleted = FALSE ORDER BY updated_at DESC, id DESC
+        Index("ix_chat_user_id_is_deleted_updated_at", "user_id", "is_deleted", "updated_at"),
+    )
+
+    user = relationship("User", backref="users", foreign_keys=[user_id], lazy="raise")
+
+    @classmethod
+    def load_options(cls):
+        """
+        Nạp user của cả trang chat bằng một câu SELECT ... IN, role / prompt / model của user lấy từ cache
+        """
+        return (selectinload(cls.user),)
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "conversation": self.conversation,
-            "user_id": self.user_id,
-            "is_deleted": self.is_deleted,
-            "created_at": str(self.created_at),
-            "updated_at": str(self.updated_at),
-            "user": self.user.to_dict()
-        }
\ No newline at end of file
+        data = serialize_chat(self)
+        data["user"] = self.user.to_dict()
+        return data
\ No newline at end of file
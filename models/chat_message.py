@@ -0,0 +1,32 @@
+from database.database import Base
+from helper.serializer import compile_serializer
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    Integer,
+    ForeignKey,
+    Text,
+    func,
+)
+from datetime import datetime
+
+serialize_chat_message = compile_serializer(
+    "chat_id",
+    "seq",
+    "role",
+    "content",
+    "created_at",
+)
+
+class ChatMessage(Base):
+    __tablename__ = 'chat_message'
+
+    chat_id = Column(Integer, ForeignKey("chat.id"), primary_key=True)
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    role = Column(String(32), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), default=datetime.now)
+
+    def to_dict(self):
+        return serialize_chat_message(self)
@@ -1,4 +1,5 @@
 from database.database import Base
+from helper.serializer import compile_serializer
 from sqlalchemy import (
     Column,
     String,
@@ -6,9 +7,19 @@ from sqlalchemy import (
     DateTime,
     Integer,
     func,
+    Index,
 )
 from datetime import datetime
 
+serialize_model = compile_serializer(
+    "id",
+    "name",
+    "detail_name",
+    "is_deleted",
+    "created_at",
+    "updated_at",
+)
+
 class Model(Base):
     __tablename__ = 'model'
 
@@ -20,12 +31,7 @@ class Model(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), default=datetime.now)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (Index("ix_model_is_deleted_id", "is_deleted", "id"),)
+
     def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "detail_name": self.detail_name,
-            "is_deleted": self.is_deleted,
-            "created_at": str(self.created_at),
-            "updated_at": str(self.updated_at)
-        }
\ No newline at end of file
+        return serialize_model(self)
\ No newline at end of file
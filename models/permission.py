@@ -1,5 +1,6 @@
 from datetime import datetime
 from database.database import Base
+from helper.serializer import compile_serializer
 from sqlalchemy.orm import validates
 from sqlalchemy import (
     Column,
@@ -10,12 +11,22 @@ from sqlalchemy import (
     Text,
     Integer,
     UniqueConstraint,
+    Index,
     func,
     ForeignKey,
 )
 
 from sqlalchemy.orm import relationship 
 
+serialize_permission = compile_serializer(
+    "id",
+    "name",
+    "route",
+    "is_deleted",
+    "created_at",
+    "updated_at",
+)
+
 class Permission(Base):
     __tablename__ = 'permission'
 
@@ -42,14 +53,8 @@ class Permission(Base):
         UniqueConstraint("name", "route", name="unique_name_route"),  # Vẫn cần UniqueConstraint cho tính duy nhất trong CSDL
         UniqueConstraint("name", name="unique_name"),
         UniqueConstraint("route", name="unique_route"),
+        Index("ix_permission_is_deleted_id", "is_deleted", "id"),
     )
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "route": self.route,
-            "is_deleted": self.is_deleted,
-            "created_at": str(self.created_at),
-            "updated_at": str(self.updated_at),
-        }
\ No newline at end of file
+        return serialize_permission(self)
\ No newline at end of file
@@ -4,10 +4,20 @@ from sqlalchemy import (
     DateTime,
     Text,
     Integer,
-    func
+    func,
+    Index,
 )
 from datetime import datetime
 from database.database import Base
+from helper.serializer import compile_serializer
+
+serialize_prompt = compile_serializer(
+    "id",
+    "content",
+    "is_deleted",
+    "created_at",
+    "updated_at",
+)
 
 class Prompt(Base):
     __tablename__ = 'prompt'
@@ -18,11 +28,7 @@ class Prompt(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), default=datetime.now)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (Index("ix_prompt_is_deleted_id", "is_deleted", "id"),)
+
     def to_dict(self):
-        return {
-            "id": self.id,
-            "content": self.content,
-            "is_deleted": self.is_deleted,
-            "created_at": str(self.created_at),
-            "updated_at": str(self.updated_at)
-        }
\ No newline at end of file
+        return serialize_prompt(self)
\ No newline at end of file
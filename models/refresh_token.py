@@ -0,0 +1,32 @@
+from database.database import Base
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    Integer,
+    ForeignKey,
+    Index,
+    func,
+)
+from datetime import datetime
+
+class RefreshToken(Base):
+    """
+    Refresh token (chỉ lưu SHA-256): mỗi lần dùng bị thu hồi và thay bằng token mới cùng family;
+    dùng lại token đã thu hồi thì thu hồi cả family (token có thể đã bị lộ)
+    """
+    __tablename__ = 'refresh_token'
+
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    family = Column(String(32), nullable=False)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_refresh_token_family", "family"),
+        Index("ix_refresh_token_user_id", "user_id"),
+        Index("ix_refresh_token_expires_at", "expires_at"),
+    )
@@ -1,4 +1,5 @@
 from database.database import Base
+from helper.serializer import compile_serializer
 from datetime import datetime
 from sqlalchemy import (
     Column,
@@ -9,26 +10,31 @@ from sqlalchemy import (
     UniqueConstraint,
     JSON,
     func,
+    Index,
     Table,
     ForeignKey
 )
 from sqlalchemy.orm import relationship 
 
+serialize_role = compile_serializer(
+    "id",
+    "name",
+    "permission_ids",
+    "created_at",
+    "updated_at",
+)
+
 class Role(Base):
     __tablename__ = "role"
 
     id = Column(Integer, primary_key=True, index=True)  # Chuyển từ String sang Integer
-    name = Column(String(255), nullable=False)
+    name = Column(String(255), nullable=False, unique=True)
     permission_ids = Column(JSON, nullable=False)  # Lưu dưới dạng JSON
     is_deleted = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (Index("ix_role_is_deleted_id", "is_deleted", "id"),)
+
     def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "permission_ids": self.permission_ids,
-            "created_at": str(self.created_at),
-            "updated_at": str(self.updated_at),
-        }
+        return serialize_role(self)
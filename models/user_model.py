@@ -0,0 +1,18 @@
+from database.database import Base
+from sqlalchemy import (
+    Column,
+    Integer,
+    ForeignKey,
+    Index,
+)
+
+class UserModel(Base):
+    """
+    Model được gán cho user (thay cho JSON User.models)
+    """
+    __tablename__ = 'user_model'
+
+    user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    model_id = Column(Integer, ForeignKey("model.id"), primary_key=True)
+
+    __table_args__ = (Index("ix_user_model_model_id", "model_id"),)
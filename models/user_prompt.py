@@ -0,0 +1,18 @@
+from database.database import Base
+from sqlalchemy import (
+    Column,
+    Integer,
+    ForeignKey,
+    Index,
+)
+
+class UserPrompt(Base):
+    """
+    Prompt được gán cho user (thay cho JSON User.prompt_ids)
+    """
+    __tablename__ = 'user_prompt'
+
+    user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    prompt_id = Column(Integer, ForeignKey("prompt.id"), primary_key=True)
+
+    __table_args__ = (Index("ix_user_prompt_prompt_id", "prompt_id"),)
@@ -1,90 +1,348 @@
+"""
+Cấu hình của backend, gộp một lần theo thứ tự ưu tiên tăng dần:
+
+    mặc định < file cấu hình (--config / CONFIG_FILE, .toml hoặc .json) < .env (ENV_FILE) < biến môi trường < dòng lệnh
+
+`params` nạp lười ở lần đọc đầu tiên và không đọc sys.argv: import module (worker, test runner, script)
+không bao giờ parse tham số của process khác. Chỉ entrypoint gọi `params.load(sys.argv[1:])`; giá trị
+lấy từ dòng lệnh được ghi lại vào biến môi trường để worker uvicorn spawn / reload nhận cùng cấu hình.
+"""
+import os
+import sys
+import json
 import argparse
+import tempfile
+import tomllib
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from dotenv import dotenv_values
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+TRUE_VALUES = {"1", "true", "yes", "on"}
+FALSE_VALUES = {"0", "false", "no", "off", ""}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def parse_bool(value: Any) -> bool:
+    """
+    argparse type=bool coi mọi chuỗi khác rỗng là True ("0", "False"...), nên parse tay
+    """
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"expected one of {sorted((TRUE_VALUES | FALSE_VALUES) - {''})}")
+
+
+def parse_list(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+class Setting:
+    def __init__(
+        self,
+        name: str,
+        parse: Callable[[Any], Any],
+        default: Any,
+        help: str,
+        env: Optional[str] = None,
+        choices: Optional[Sequence] = None,
+        minimum: Optional[float] = None,
+        maximum: Optional[float] = None,
+        required: bool = False,
+    ):
+        self.name = name
+        self.parse = parse
+        self.default = default
+        self.help = help
+        # Tham số server cũ chỉ có trên dòng lệnh: thêm tiền tố để không đụng biến môi trường chung (HOST, PORT...)
+        self.env = env or f"BACKEND_{name.upper()}"
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+        self.required = required
+
+    def convert(self, value: Any, source: str) -> Any:
+        try:
+            value = self.parse(value)
+        except (TypeError, ValueError) as exc:
+            raise ConfigError(f"Invalid value {value!r} for {self.name} (from {source}): {exc}") from None
+        if self.choices is not None and value not in self.choices:
+            raise ConfigError(f"Invalid value {value!r} for {self.name} (from {source}): expected one of {list(self.choices)}")
+        if self.minimum is not None and value < self.minimum:
+            raise ConfigError(f"Invalid value {value!r} for {self.name} (from {source}): must be >= {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise ConfigError(f"Invalid value {value!r} for {self.name} (from {source}): must be <= {self.maximum}")
+        return value
+
+
+SETTINGS = [
+    # Server
+    Setting("host", str, "127.0.0.1", "Host of backend default is 127.0.0.1, deploy mode is 0.0.0.0"),
+    Setting("port", int, 9999, "Port of api backend, default is 9999", minimum=0, maximum=65535),
+    Setting("reload", parse_bool, True, "Reload on code change, default is true (1), false in deploy (set 0)"),
+    Setting("workers", int, 1, "Multi process core running, use in production", minimum=1),
+    Setting(
+        "log_level", str, "info", "Default log level running",
+        choices=("critical", "error", "warning", "info", "debug", "trace"),
+    ),
+    Setting("use_colors", parse_bool, True, "Enable or disable color log in console"),
+    Setting(
+        "limit_concurrency", int, 10_000,
+        "Maximum number of concurrent connections or tasks to allow, before issuing HTTP 503 responses.", minimum=1,
+    ),
+    Setting(
+        "limit_max_requests", int, 1_000,
+        "Maximum number of requests to service before terminating (or, with --preload, recycling) the process.", minimum=0,
+    ),
+    Setting("backlog", int, 5000, "Maximum number of connections to hold in backlog", minimum=1),
+    Setting("ssl_keyfile", str, "", "SSL key file, use when deploy in production"),
+    Setting("ssl_certfile", str, "", "SSL certificate file, use when deploy in production"),
+    Setting(
+        "forwarded_allow_ips", str, "127.0.0.1",
+        "Comma separated proxy IPs / networks whose X-Forwarded-For is trusted as the client IP (e.g. nginx)",
+    ),
+    Setting(
+        "preload", parse_bool, False,
+        "With --workers > 1: import the app once in a supervisor and fork workers from it, recycling one worker at a time after --limit_max_requests",
+    ),
+    Setting(
+        "graceful_timeout", float, 30,
+        "Seconds a recycled / stopped worker gets to finish in-flight requests before it is killed", minimum=0,
+    ),
+    Setting("prod", parse_bool, False, "Production mode"),
+    Setting("hash_key", str, None, "Secret used to sign tokens and hash passwords", env="HASH_KEY", required=True),
+    # Database
+    Setting("url_database", str, None, "Primary database URL", env="URL_DATABASE", required=True),
+    Setting(
+        "url_database_replicas", parse_list, [], "Comma separated read-only replica URLs",
+        env="URL_DATABASE_REPLICAS",
+    ),
+    Setting(
+        "replica_strategy", str, "round_robin", "How a replica is picked for a read",
+        env="REPLICA_STRATEGY", choices=("round_robin", "least_connections"),
+    ),
+    Setting(
+        "replica_retry_seconds", float, 30, "Seconds an unreachable replica is skipped",
+        env="REPLICA_RETRY_SECONDS", minimum=0,
+    ),
+    Setting(
+        "replica_sticky_seconds", float, 5, "Seconds a user's reads stay on the primary after one of their writes",
+        env="REPLICA_STICKY_SECONDS", minimum=0,
+    ),
+    Setting("db_pool_size", int, 5, "Connections kept open per engine and worker", env="DB_POOL_SIZE", minimum=1),
+    Setting(
+        "db_max_overflow", int, 10, "Extra connections opened above db_pool_size under load",
+        env="DB_MAX_OVERFLOW", minimum=0,
+    ),
+    Setting(
+        "db_pool_timeout", float, 30, "Seconds to wait for a pooled connection before failing",
+        env="DB_POOL_TIMEOUT", minimum=0,
+    ),
+    Setting(
+        "db_pool_recycle", int, -1, "Reconnect connections older than this many seconds (-1: never)",
+        env="DB_POOL_RECYCLE", minimum=-1,
+    ),
+    # Cache
+    Setting(
+        "reference_cache_ttl", float, 60, "Seconds a cached model / prompt / role / permission row is kept",
+        env="REFERENCE_CACHE_TTL", minimum=0,
+    ),
+    Setting(
+        "reference_cache_warm_limit", int, 1000, "Rows per reference table loaded when a worker starts",
+        env="REFERENCE_CACHE_WARM_LIMIT", minimum=0,
+    ),
+    Setting(
+        "cache_version_dir", str, os.path.join(tempfile.gettempdir(), "ta-backend-cache"),
+        "Folder sharing cache invalidation between workers", env="CACHE_VERSION_DIR",
+    ),
+    # Token
+    Setting("access_token_ttl", int, 900, "Seconds an access token is valid", env="ACCESS_TOKEN_TTL", minimum=1),
+    Setting(
+        "refresh_token_ttl", int, 30 * 86_400, "Seconds a refresh token is valid (rotated on every use)",
+        env="REFRESH_TOKEN_TTL", minimum=1,
+    ),
+    Setting("token_cache_size", int, 10_000, "Resolved bearer tokens kept per worker", env="TOKEN_CACHE_SIZE", minimum=0),
+    Setting("token_cache_ttl", float, 300, "Seconds a resolved bearer token is kept", env="TOKEN_CACHE_TTL", minimum=0),
+    Setting("cache_control", str, "private, no-cache", "Cache-Control of GET responses with validators", env="CACHE_CONTROL"),
+    # Streaming / export
+    Setting("web_socket_time", float, 0.1, "Web socket chat reload time", minimum=0),
+    Setting("model_temp", float, 0.05, "Model temparature", minimum=0),
+    Setting("chat_backend", str, "fake", "Chat generator: built-in name or module:Class", env="CHAT_BACKEND"),
+    Setting("export_batch_size", int, 1000, "Rows fetched per batch by NDJSON exports", env="EXPORT_BATCH_SIZE", minimum=1),
+    Setting("export_gzip_level", int, 6, "Gzip level of ?gzip=true exports", env="EXPORT_GZIP_LEVEL", minimum=1, maximum=9),
+    Setting("gzip_level", int, 6, "Gzip level of HTTP responses (1-9), 0 disables compression", minimum=0, maximum=9),
+    Setting("gzip_min_size", int, 1024, "Do not compress responses smaller than this many bytes", minimum=0),
+    Setting(
+        "gzip_types", str, "application/json,application/x-ndjson,text/",
+        "Comma separated content types (or prefixes ending with /) allowed to be compressed",
+    ),
+    # Bulk / search / password
+    Setting("bulk_max_items", int, 5000, "Maximum items of one bulk request", env="BULK_MAX_ITEMS", minimum=1),
+    Setting("search_index_path", str, "search_index.sqlite3", "SQLite FTS5 file of the chat search index", env="SEARCH_INDEX_PATH"),
+    Setting(
+        "search_candidates", int, 1000, "Best matching rows considered before grouping by chat",
+        env="SEARCH_CANDIDATES", minimum=1,
+    ),
+    Setting(
+        "password_workers", int, min(4, os.cpu_count() or 1), "Threads hashing passwords",
+        env="PASSWORD_WORKERS", minimum=1,
+    ),
+    # Rate limit
+    Setting(
+        "rate_limit_rate", float, 20, "Tokens refilled per second in each user / IP bucket, 0 disables rate limiting",
+        minimum=0,
+    ),
+    Setting(
+        "rate_limit_burst", float, 100,
+        "Bucket size: tokens a user / IP can spend at once (a GET costs 1, a chat answer 10)", minimum=0,
+    ),
+    Setting(
+        "rate_limit_backend", str, "", "memory or sqlite, empty: sqlite when --workers > 1",
+        env="RATE_LIMIT_BACKEND", choices=("", "memory", "sqlite"),
+    ),
+    Setting(
+        "rate_limit_db", str, os.path.join(tempfile.gettempdir(), "ta-backend-ratelimit.sqlite3"),
+        "SQLite file of the shared rate limit buckets", env="RATE_LIMIT_DB",
+    ),
+    Setting(
+        "rate_limit_max_keys", int, 100_000, "Buckets kept by the in-process backend",
+        env="RATE_LIMIT_MAX_KEYS", minimum=1,
+    ),
+    # Observability
+    Setting(
+        "metrics_dir", str, os.path.join(tempfile.gettempdir(), "ta-backend-metrics"),
+        "Folder where workers share their metrics", env="METRICS_DIR",
+    ),
+    Setting(
+        "metrics_token", str, "",
+        "Bearer token Prometheus sends to scrape /metrics; empty: only users allowed the /metrics route",
+        env="METRICS_TOKEN",
+    ),
+    Setting(
+        "metrics_flush_interval", float, 1, "Seconds between metrics flushes of a worker",
+        env="METRICS_FLUSH_INTERVAL", minimum=0.01,
+    ),
+    Setting(
+        "sql_profile", parse_bool, False,
+        "Enable the SQL profiler (1) for requests sending the X-SQL-Profile: 1 header, debug only",
+    ),
+    Setting(
+        "sql_repeat_threshold", int, 5,
+        "Warn when the same SQL statement shape runs more than this many times in one profiled request", minimum=1,
+    ),
+]
+SETTINGS_BY_NAME = {setting.name: setting for setting in SETTINGS}
+
+
+def read_config_file(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "rb") as file:
+            data = tomllib.load(file) if path.endswith(".toml") else json.load(file)
+    except (OSError, ValueError) as exc:
+        raise ConfigError(f"Cannot read config file {path}: {exc}") from None
+    if not isinstance(data, dict):
+        raise ConfigError(f"Config file {path} must contain a table / object of settings")
+    return data
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Backend compile flags", argument_default=argparse.SUPPRESS)
+    parser.add_argument("--config", type=str, help="TOML / JSON file with settings (same names as the flags)")
+    for setting in SETTINGS:
+        # Giữ chuỗi gốc, convert ở bước gộp để mọi lớp được kiểm tra như nhau
+        parser.add_argument(f"--{setting.name}", type=str, help=f"{setting.help} (env {setting.env})")
+    return parser
+
+
+class Params:
+    """
+    Đọc thuộc tính (params.workers...) trả về giá trị đã gộp và kiểm tra kiểu
+    """
+
+    def __init__(self):
+        self._values: Optional[Dict[str, Any]] = None
+        self._sources: Dict[str, str] = {}
+
+    def load(self, argv: Optional[Sequence[str]] = None) -> "Params":
+        cli = vars(build_parser().parse_args(argv)) if argv is not None else {}
+        config_file = cli.pop("config", None) or os.environ.get("CONFIG_FILE")
+        env_file = os.environ.get("ENV_FILE", os.path.join(PROJECT_ROOT, ".env"))
+        dotenv = dotenv_values(env_file) if os.path.exists(env_file) else {}
+
+        layers = []
+        if config_file:
+            data = read_config_file(config_file)
+            unknown = sorted(set(data) - set(SETTINGS_BY_NAME))
+            if unknown:
+                raise ConfigError(f"Unknown settings in {config_file}: {unknown}")
+            layers.append((f"config file {config_file}", data))
+        layers.append((env_file, {
+            setting.name: dotenv[setting.env] for setting in SETTINGS if dotenv.get(setting.env) is not None
+        }))
+        layers.append(("environment", {
+            setting.name: os.environ[setting.env] for setting in SETTINGS if setting.env in os.environ
+        }))
+        layers.append(("command line", cli))
+
+        values, sources = {}, {}
+        for setting in SETTINGS:
+            values[setting.name], sources[setting.name] = setting.default, "default"
+            for source, layer in layers:
+                if setting.name in layer:
+                    label = f"{source} {setting.env}" if source == "environment" else source
+                    values[setting.name] = setting.convert(layer[setting.name], label)
+                    sources[setting.name] = source
+
+        # Worker uvicorn (spawn / reload) import lại module trong process mới: truyền qua biến môi trường
+        for name, value in cli.items():
+            os.environ[SETTINGS_BY_NAME[name].env] = value
+        if config_file:
+            os.environ["CONFIG_FILE"] = config_file
+
+        self._values, self._sources = values, sources
+        return self
+
+    @property
+    def loaded(self) -> bool:
+        return self._values is not None
+
+    def source(self, name: str) -> str:
+        if self._values is None:
+            self.load()
+        return self._sources[name]
+
+    def as_dict(self) -> Dict[str, Any]:
+        if self._values is None:
+            self.load()
+        return dict(self._values)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._values is None:
+            self.load()
+        try:
+            value = self._values[name]
+        except KeyError:
+            raise AttributeError(f"Unknown setting {name}") from None
+        if value is None and SETTINGS_BY_NAME[name].required:
+            raise ConfigError(f"Setting {name} is required (env {SETTINGS_BY_NAME[name].env})")
+        return value
+
+
+params = Params()
 
 
-def param_compile():
-    parser = argparse.ArgumentParser(description="Backend compile flags")
-    parser.add_argument(
-        "--host",
-        type=str,
-        default="127.0.0.1",
-        help="Host of backend default is 127.0.0.1, deploy mode is 0.0.0.0",
-    )
-    parser.add_argument(
-        "--port", type=int, default=9999, help="Port of api backend, default is 9999"
-    )
-    parser.add_argument(
-        "--reload",
-        type=int,
-        default=1,
-        help="Reload item default is true (1), false in deploy (set 0)",
-    )
-    parser.add_argument(
-        "--workers",
-        type=int,
-        default=1,
-        help="Multi process core running, use in production",
-    )
-    parser.add_argument(
-        "--log_level",
-        type=str,
-        default="info",
-        help="Default log level running, critical, error, warning, info, debug, trace",
-    )
-    parser.add_argument(
-        "--use_colors",
-        type=bool,
-        default=True,
-        help="Enable or disable color log in console",
-    )
-    parser.add_argument(
-        "--limit_concurrency",
-        type=int,
-        default=10_000,
-        help="Maximum number of concurrent connections or tasks to allow, before issuing HTTP 503 responses.",
-    )
-    parser.add_argument(
-        "--limit_max_requests",
-        type=int,
-        default=1_000,
-        help="Maximum number of requests to service before terminating the process.",
-    )
-    parser.add_argument(
-        "--backlog",
-        type=int,
-        default=5000,
-        help="Maximum number of connections to hold in backlog",
-    )
-    parser.add_argument(
-        "--ssl_keyfile",
-        type=str,
-        default="",
-        help="SSL key file, use when deploy in production",
-    )
-    parser.add_argument(
-        "--ssl_certfile",
-        type=str,
-        default="",
-        help="SSL certificate file, use when deploy in production",
-    )
-    parser.add_argument(
-        "--web_socket_time",
-        type=float,
-        default=0.1,
-        help="Web socket chat reload time"
-    )
-    parser.add_argument(
-        "--model_temp",
-        type=float,
-        default=0.05,
-        help="Model temparature"
-    )
-    parser.add_argument(
-        "--prod",
-        type=bool,
-        default=False,
-        help="Model temparature"
-    )
-    return parser.parse_args()
-
-
-params = param_compile()
\ No newline at end of file
+def param_compile(argv: Optional[Sequence[str]] = None) -> Params:
+    """
+    Giữ tên cũ: parse dòng lệnh (mặc định sys.argv) và gộp với các lớp còn lại
+    """
+    return params.load(sys.argv[1:] if argv is None else argv)
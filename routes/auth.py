@@ -1,11 +1,19 @@
-import json
 from typing import List
 from models.user import User
-from datetime import datetime
-from schema.user import LoginEntity
-from helper.token import create_jwt_token
-from database.database import db_dependency
-from helper.password import create_password
+from models.refresh_token import RefreshToken
+from schema.user import LoginEntity, RefreshEntity
+from helper.token import (
+    ACCESS_TOKEN_TTL,
+    create_access_token,
+    hash_refresh_token,
+    issue_refresh_token,
+    revoke_refresh_tokens,
+    use_refresh_token,
+)
+from sqlalchemy import select, or_
+from database.database import db_dependency, reload
+from helper.password import hash_password, verify_password
+from helper.cache import user_dict
 from schema.response import ResponseMessage
 from fastapi.exceptions import RequestValidationError
 from fastapi import APIRouter, status, Depends, HTTPException
@@ -15,12 +23,18 @@ auth_router = APIRouter(prefix="/auth", tags=["auth"])
 @auth_router.post("/login", status_code=status.HTTP_200_OK, name="Add new user")
 async def login(auth_info: LoginEntity, db: db_dependency):
     try:
-        password = create_password(auth_info.password)
-        user: User = db.query(User).filter(
-            User.user_name == auth_info.user_name,
-            User.password == password,
+        # Tra theo index user_name / email rồi mới verify hash (scrypt chạy ngoài event loop)
+        candidates: List[User] = (await db.scalars(select(User).filter(
+            or_(User.user_name == auth_info.user_name, User.email == auth_info.user_name),
             User.is_deleted == False,
-        ).first()
+        ))).all()
+
+        user, needs_rehash = None, False
+        for candidate in candidates:
+            is_valid, needs_rehash = await verify_password(auth_info.password, candidate.password)
+            if is_valid:
+                user = candidate
+                break
 
         if not user:
             return ResponseMessage(
@@ -28,51 +42,113 @@ async def login(auth_info: LoginEntity, db: db_dependency):
                 message=f"User with name {auth_info.user_name} not exist."
             )
 
-        user.token = create_jwt_token({
-            "user_name": user.user_name,
-            "email": user.email,
-            "password": user.password,
-            "date": str(datetime.now())
-        })
+        if needs_rehash:
+            user.password = await hash_password(auth_info.password)
 
-        db.commit()
+        # Ghi duy nhất của login: một dòng refresh_token (user chỉ được ghi khi cần rehash)
+        refresh_token = await issue_refresh_token(db, user.id)
+        await db.commit()
+        if needs_rehash:
+            user = await reload(db, user)
 
+        data = await user_dict(db, user)
+        data.update(token_fields(
+            {"id": user.id, "user_name": user.user_name, "email": user.email, "role_id": user.role_id},
+            refresh_token,
+        ))
         return ResponseMessage(
             code=status.HTTP_200_OK,
             message=f"Login success",
-            data=user
+            data=data,
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}"
         )
 
-@auth_router.post("/refresh-token", status_code=status.HTTP_200_OK, name="Add new user")
-async def refresh_token(auth_info: LoginEntity, db: db_dependency):
+@auth_router.post("/refresh-token", status_code=status.HTTP_200_OK, name="Refresh access token")
+async def refresh_token(refresh_info: RefreshEntity, db: db_dependency):
+    """
+    Đổi refresh token lấy access token + refresh token mới, không kiểm tra lại password
+    """
     try:
-        login_response = await login(auth_info, db)
+        used = await use_refresh_token(db, refresh_info.refresh_token)
+        if used is None:
+            # Có thể vừa thu hồi cả family do token bị dùng lại
+            await db.commit()
+            return ResponseMessage(
+                code=status.HTTP_401_UNAUTHORIZED,
+                message="Invalid or expired refresh token",
+            )
+
+        row = (await db.execute(
+            select(User.id, User.user_name, User.email, User.role_id)
+            .filter(User.id == used.user_id, User.is_deleted == False)
+        )).first()
+
+        if row is None:
+            await revoke_refresh_tokens(db, family=used.family)
+            await db.commit()
+            return ResponseMessage(
+                code=status.HTTP_401_UNAUTHORIZED,
+                message="Invalid or expired refresh token",
+            )
 
-        if login_response.status_code != status.HTTP_200_OK:
-            return login_response
-        response = json.loads(login_response.body.decode("utf-8"))
-        user_data = response['data']
+        new_refresh_token = await issue_refresh_token(db, row.id, family=used.family)
+        await db.commit()
 
+        user = {"id": row.id, "user_name": row.user_name, "email": row.email, "role_id": row.role_id}
         return ResponseMessage(
             code=status.HTTP_200_OK,
             message="Token refreshed successfully.",
             data={
-                "user_id": user_data["id"],
-                "username": user_data["user_name"],
-                "token": user_data["token"] 
+                "user_id": row.id,
+                "username": row.user_name,
+                **token_fields(user, new_refresh_token),
             }
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@auth_router.post("/logout", status_code=status.HTTP_200_OK, name="Revoke refresh token")
+async def logout(refresh_info: RefreshEntity, db: db_dependency):
+    """
+    Thu hồi cả family của refresh token; access token đã cấp hết hạn sau ACCESS_TOKEN_TTL
+    """
+    try:
+        row = (await db.scalars(
+            select(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(refresh_info.refresh_token))
+        )).first()
+
+        if row is not None:
+            await revoke_refresh_tokens(db, family=row.family)
+            await db.commit()
+
+        return ResponseMessage(
+            code=status.HTTP_200_OK,
+            message="Logout success",
+        )
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}"
+        )
+
+
+def token_fields(user: dict, refresh_token: str) -> dict:
+    return {
+        "token": create_access_token(user),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+        "refresh_token": refresh_token,
+    }
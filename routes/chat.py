@@ -1,46 +1,222 @@
-from typing import List
+from typing import List, Optional
 from models.chat import Chat 
 from datetime import datetime
-from schema.chat import ChatEntity 
-from database.database import db_dependency
-from schema.response import ResponseMessage
+from models.chat_message import ChatMessage
+from schema.chat import ChatEntity, MessageEntity
+from sqlalchemy import select
+from database.database import SesionLocal, db_dependency, reload, replica_router
+from schema.response import ResponseMessage, dumps
+from helper.cache import chat_dict, chat_dicts, chat_version, user_versions
+from helper.export import stream_rows, ndjson_response
+from helper.search import search_index
+from helper.rate_limit import GENERATION_COST, rate_limiter
+from helper.pagination import cursor_query, paginate, next_cursor
+from helper.conditional import Validator, is_conditional
+from param_compile import params
+from chatbot import batch_tokens, get_chat_backend
 from fastapi.exceptions import RequestValidationError
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 
 chat_router = APIRouter(prefix="/chats", tags=["chats"])
 
+chat_cursor = cursor_query(Chat.id)
+
+chat_backend = get_chat_backend()
+
+# Số tin nhắn gần nhất gửi cho model làm ngữ cảnh
+CONTEXT_MESSAGES = 50
+
+
+async def chat_versions(db, query) -> list:
+    """
+    Version của các chat trong query (chat + user nhúng kèm) mà không load / serialize chat
+    """
+    rows = (await db.execute(query.with_only_columns(Chat.id, Chat.updated_at, Chat.user_id))).all()
+    users = await user_versions(db, [row.user_id for row in rows])
+    return [(row.id, row.updated_at, users.get(row.user_id)) for row in rows]
+
+
+def append_messages(db, chat: Chat, messages: List[MessageEntity]) -> List[ChatMessage]:
+    """
+    Thêm tin nhắn vào cuối hội thoại (seq tăng dần), không ghi lại toàn bộ lịch sử
+    """
+    rows = [
+        ChatMessage(
+            chat_id=chat.id,
+            seq=chat.last_seq + index,
+            role=message.role,
+            content=message.content,
+        )
+        for index, message in enumerate(messages, start=1)
+    ]
+    db.add_all(rows)
+    chat.last_seq += len(rows)
+    return rows
+
+
+async def export_chats(include_deleted: bool):
+    """
+    Một dòng NDJSON cho mỗi chat kèm toàn bộ tin nhắn. Chat JOIN chat_message sắp theo (chat.id, seq)
+    nên chỉ cần giữ tin nhắn của chat đang ghép dở, bộ nhớ không phụ thuộc số lượng chat.
+    """
+    query = (
+        select(
+            Chat.id,
+            Chat.title,
+            Chat.conversation,
+            Chat.user_id,
+            Chat.last_seq,
+            Chat.is_deleted,
+            Chat.created_at,
+            Chat.updated_at,
+            ChatMessage.seq,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.created_at.label("message_created_at"),
+        )
+        .outerjoin(ChatMessage, ChatMessage.chat_id == Chat.id)
+        .order_by(Chat.id, ChatMessage.seq)
+    )
+    if not include_deleted:
+        query = query.filter(Chat.is_deleted == False)
+
+    current = None
+    async for rows in stream_rows(query):
+        lines = []
+        for row in rows:
+            if current is None or current["id"] != row.id:
+                if current is not None:
+                    lines.append(dumps(current) + b"\n")
+                current = {
+                    "id": row.id,
+                    "title": row.title,
+                    "conversation": row.conversation,
+                    "user_id": row.user_id,
+                    "last_seq": row.last_seq,
+                    "is_deleted": row.is_deleted,
+                    "created_at": row.created_at,
+                    "updated_at": row.updated_at,
+                    "messages": [],
+                }
+            if row.seq is not None:
+                current["messages"].append({
+                    "seq": row.seq,
+                    "role": row.role,
+                    "content": row.content,
+                    "created_at": row.message_created_at,
+                })
+        if lines:
+            yield b"".join(lines)
+
+    if current is not None:
+        yield dumps(current) + b"\n"
+
+
 @chat_router.get("", status_code=status.HTTP_200_OK, name="Get all chat")
-async def fetch_all(db: db_dependency, skip: int = 0, limit: int = 100):
+async def fetch_all(request: Request, db: db_dependency, cursor: chat_cursor, skip: int = 0, limit: int = 100):
     try:
-        query = (
-            db.query(Chat)
-            .filter(Chat.is_deleted == False)
-            .offset(skip)
-            .limit(limit)
+        query = paginate(
+            select(Chat)
+            .filter(Chat.is_deleted == False),
+            Chat.id,
+            cursor=cursor,
+            skip=skip,
+            limit=limit,
         )
-        chat: List[Chat] = query.all()
+        if is_conditional(request):
+            validator = Validator(await chat_versions(db, query))
+            if validator.matches(request):
+                return validator.not_modified()
 
-        return ResponseMessage(
+        chat: List[Chat] = (await db.scalars(query.options(*Chat.load_options()))).all()
+        data = await chat_dicts(db, chat)
+
+        validator = Validator(chat_version(item) for item in data)
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message="Fetch all chat success",
-            data=chat
+            data=data,
+            next_cursor=next_cursor(chat, limit, Chat.id),
+        ))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@chat_router.get("/export", status_code=status.HTTP_200_OK, name="Export chats as NDJSON")
+async def export(include_deleted: bool = False, gzip: bool = False):
+    return ndjson_response(export_chats(include_deleted), "chats.ndjson", gzip)
+
+@chat_router.get("/search", status_code=status.HTTP_200_OK, name="Search chats")
+async def search(
+    db: db_dependency,
+    q: str,
+    user_id: Optional[int] = None,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    """
+    Tìm theo title và nội dung tin nhắn trên inverted index (helper/search.py), xếp theo BM25.
+    Chỉ trả về bản tóm tắt chat kèm score / số đoạn khớp / snippet.
+    Chat đã xóa được lọc trước khi phân trang: index bỏ chat đã đánh dấu xóa, chat bị xóa ngoài API
+    (chưa đánh dấu) bị bỏ qua, đánh dấu lại và lấy thêm kết quả để trang vẫn đủ.
+    Chat không đọc được (replica chưa có) chỉ bị bỏ khỏi response này, không bị đánh dấu xóa.
+    """
+    try:
+        # Mỗi vòng lấy lại top `size` từ đầu (không dùng offset của index: đánh dấu xóa đồng thời làm lệch offset),
+        # gấp đôi size tới khi đủ skip + limit chat còn tồn tại hoặc hết kết quả
+        wanted = skip + limit
+        size = wanted
+        while True:
+            hits = await search_index.search(q, user_id=user_id, limit=size)
+            rows = (await db.execute(
+                select(Chat.id, Chat.title, Chat.user_id, Chat.last_seq, Chat.created_at, Chat.updated_at, Chat.is_deleted)
+                .filter(Chat.id.in_([hit["chat_id"] for hit in hits]))
+            )).all() if hits else []
+            chats = {
+                row.id: {key: value for key, value in row._asdict().items() if key != "is_deleted"}
+                for row in rows
+                if not row.is_deleted
+            }
+            # Chỉ bỏ khỏi index chat đã chắc chắn xóa; chat chưa có trên replica (replication lag) chỉ bị bỏ qua lần này
+            search_index.remove_chats(row.id for row in rows if row.is_deleted)
+            found = [
+                {**chats[hit["chat_id"]], "score": hit["score"], "matches": hit["matches"], "snippet": hit["snippet"]}
+                for hit in hits
+                if hit["chat_id"] in chats
+            ]
+            if len(found) >= wanted or len(hits) < size:
+                break
+            size *= 2
+
+        return ResponseMessage(
+            code=status.HTTP_200_OK,
+            message="Search chats success",
+            data=found[skip:wanted],
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
         )
 
 @chat_router.get("/{chat_id}", status_code=status.HTTP_200_OK, name="Get chat by id")
-async def fetch_detail(chat_id: int, db: db_dependency):
+async def fetch_detail(chat_id: int, request: Request, db: db_dependency):
     try:
-        chat: Chat = (
-            db.query(Chat)
-            .filter(Chat.id == chat_id, Chat.is_deleted == False)
-            .first()
-        )
+        query = select(Chat).filter(Chat.id == chat_id, Chat.is_deleted == False)
+        if is_conditional(request):
+            versions = await chat_versions(db, query)
+            if versions:
+                validator = Validator(versions)
+                if validator.matches(request):
+                    return validator.not_modified()
+
+        chat: Chat = (await db.scalars(query.options(*Chat.load_options()))).first()
 
         if not chat:
             return ResponseMessage(
@@ -48,14 +224,17 @@ async def fetch_detail(chat_id: int, db: db_dependency):
                 message=f"Chat with ID {chat_id} not found.",
             )
 
-        return ResponseMessage(
+        data = await chat_dict(db, chat)
+
+        validator = Validator([chat_version(data)])
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message=f"Fetch chat with id {chat_id} success",
-            data=chat
-        )
+            data=data,
+        ))
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -73,25 +252,206 @@ async def create(chat_item: ChatEntity, db: db_dependency):
                 data={"error": "Title cannot be empty"},
             )
 
-        new_chat = Chat(**chat_item.dict())
+        new_chat = Chat(**chat_item.dict(exclude={"conversation"}), last_seq=0)
 
         db.add(new_chat)
-        db.commit()
-        db.refresh(new_chat)
+        await db.flush()
+        messages = append_messages(db, new_chat, chat_item.conversation)
+        await db.commit()
+        search_index.index_chat(
+            new_chat.id, new_chat.user_id, new_chat.title, [(item.seq, item.content) for item in messages]
+        )
+        new_chat = await reload(db, new_chat, *Chat.load_options())
 
         return ResponseMessage(
             code=status.HTTP_201_CREATED,
             message="Chat created successfully",
-            data=new_chat,
+            data=await chat_dict(db, new_chat),
+        )
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@chat_router.get("/{chat_id}/messages", status_code=status.HTTP_200_OK, name="Get chat messages")
+async def fetch_messages(chat_id: int, request: Request, db: db_dependency, after_seq: int = 0, limit: int = 100):
+    try:
+        chat = (await db.execute(
+            select(Chat.id, Chat.last_seq, Chat.updated_at)
+            .filter(Chat.id == chat_id, Chat.is_deleted == False)
+        )).first()
+
+        if not chat:
+            return ResponseMessage(
+                code=status.HTTP_404_NOT_FOUND,
+                message=f"Chat with ID {chat_id} not found.",
+            )
+
+        # Tin nhắn không bị sửa, trang (after_seq, limit) chỉ đổi khi last_seq tăng
+        validator = Validator([tuple(chat)])
+        if validator.matches(request):
+            return validator.not_modified()
+
+        messages: List[ChatMessage] = (await db.scalars(
+            select(ChatMessage)
+            .filter(ChatMessage.chat_id == chat_id, ChatMessage.seq > after_seq)
+            .order_by(ChatMessage.seq)
+            .limit(limit)
+        )).all()
+
+        return validator.apply(ResponseMessage(
+            code=status.HTTP_200_OK,
+            message=f"Fetch messages of chat {chat_id} success",
+            data=messages,
+        ))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@chat_router.post("/{chat_id}/messages", status_code=status.HTTP_201_CREATED, name="Append chat messages")
+async def create_messages(chat_id: int, message_items: List[MessageEntity], db: db_dependency):
+    try:
+        if not message_items:
+            return ResponseMessage(
+                code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                message="Entity error",
+                data={"error": "Messages cannot be empty"},
+            )
+
+        # Khóa dòng chat để hai request append đồng thời không cấp trùng seq
+        chat: Chat = (await db.scalars(
+            select(Chat)
+            .filter(Chat.id == chat_id, Chat.is_deleted == False)
+            .with_for_update()
+        )).first()
+
+        if not chat:
+            return ResponseMessage(
+                code=status.HTTP_404_NOT_FOUND,
+                message=f"Chat with ID {chat_id} not found.",
+            )
+
+        messages = append_messages(db, chat, message_items)
+        chat.updated_at = datetime.now()
+        await db.commit()
+        search_index.index_messages(chat.id, chat.user_id, [(item.seq, item.content) for item in messages])
+
+        return ResponseMessage(
+            code=status.HTTP_201_CREATED,
+            message="Messages appended successfully",
+            data=messages,
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
         )
 
+async def lock_chat(db, chat_id: int) -> Chat:
+    """
+    Khóa dòng chat và đọc lại last_seq mới nhất (populate_existing): request REST có thể đã append tin nhắn
+    """
+    return (await db.scalars(
+        select(Chat)
+        .filter(Chat.id == chat_id, Chat.is_deleted == False)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )).first()
+
+async def append_turn(chat_id: int, message_item: MessageEntity, context_size: int = 0):
+    """
+    Append một tin nhắn trong session / transaction ngắn của riêng lượt chat.
+    Trả về (chat, tin nhắn đã lưu, ngữ cảnh context_size tin gần nhất) hoặc None nếu chat không tồn tại.
+    """
+    async with SesionLocal() as db:
+        try:
+            chat = await lock_chat(db, chat_id)
+            if not chat:
+                return None
+            messages = append_messages(db, chat, [message_item])
+            chat.updated_at = datetime.now()
+            await db.commit()
+
+            history: List[ChatMessage] = []
+            if context_size:
+                history = (await db.scalars(
+                    select(ChatMessage)
+                    .filter(ChatMessage.chat_id == chat_id)
+                    .order_by(ChatMessage.seq.desc())
+                    .limit(context_size)
+                )).all()
+                # Đóng transaction đọc trước khi stream, không giữ snapshot / connection trong lúc chờ model
+                await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+    search_index.index_messages(chat.id, chat.user_id, [(item.seq, item.content) for item in messages])
+    return chat, messages[0], [{"role": item.role, "content": item.content} for item in reversed(history)]
+
+@chat_router.websocket("/{chat_id}/ws")
+async def stream(websocket: WebSocket, chat_id: int):
+    # Mỗi lượt dùng session riêng: kết nối WebSocket có thể mở rất lâu, không giữ connection / identity map cũ
+    await websocket.accept()
+    user = websocket.scope.get("state", {}).get("user")
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            if not isinstance(payload, dict) or not payload.get("content"):
+                await websocket.send_json({"type": "error", "message": "'content' cannot be empty"})
+                continue
+
+            if rate_limiter.enabled:
+                decision = await rate_limiter.take(rate_limiter.client_key(websocket.scope), GENERATION_COST)
+                if not decision.allowed:
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "Rate limit exceeded",
+                        "retry_after": rate_limiter.headers(decision)["Retry-After"],
+                    })
+                    continue
+
+            message_item = MessageEntity(role="user", content=str(payload["content"]))
+            turn = await append_turn(chat_id, message_item, CONTEXT_MESSAGES)
+            if turn is None:
+                await websocket.send_json({"type": "error", "message": f"Chat with ID {chat_id} not found."})
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            if user:
+                replica_router.note_write(user["id"])
+
+            # Không giữ transaction trong lúc stream, chỉ ghi một lần khi đã có câu trả lời đầy đủ
+            tokens = chat_backend.generate(turn[2], params.model_temp)
+            answer = []
+            async for frame in batch_tokens(tokens, params.web_socket_time):
+                answer.append(frame)
+                await websocket.send_json({"type": "delta", "content": frame})
+
+            turn = await append_turn(chat_id, MessageEntity(role="assistant", content="".join(answer)))
+            if turn is None:
+                await websocket.send_json({"type": "error", "message": f"Chat with ID {chat_id} not found."})
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            if user:
+                replica_router.note_write(user["id"])
+
+            await websocket.send_text(dumps({"type": "done", "data": turn[1]}).decode("utf-8"))
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        await websocket.send_json({"type": "error", "message": f"Database error: {str(e)}"})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
 # @prompt_router.put("/{prompt_id}", status_code=status.HTTP_200_OK, name="Update prompt")
 # async def update(prompt_id: int, prompt_item: PromptEntity, db: db_dependency):
 #     try:
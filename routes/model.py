@@ -1,61 +1,187 @@
 from typing import List
 from datetime import datetime
 from models.model import Model 
-from schema.model import ModelEntity 
-from database.database import db_dependency
+from schema.model import ModelEntity, ModelBulkUpdateEntity
+from schema.bulk import BulkDeleteEntity
+from sqlalchemy import select
+from database.database import db_dependency, reload_many
 from schema.response import ResponseMessage
+from helper.cache import model_cache
+from helper.bulk import BulkResult, check_size, check_ids, check_duplicates, check_taken, taken_values, insert_rows, update_rows, soft_delete_rows
+from helper.pagination import cursor_query, paginate, next_cursor
+from helper.conditional import Validator, is_conditional
 from fastapi.exceptions import RequestValidationError
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Request
 
 model_router = APIRouter(prefix="/models", tags=["models"])
 
+model_cursor = cursor_query(Model.id)
+
 @model_router.get("", status_code=status.HTTP_200_OK, name="Get all model")
-async def fetch_all(db: db_dependency, skip: int = 0, limit: int = 100):
+async def fetch_all(request: Request, db: db_dependency, cursor: model_cursor, skip: int = 0, limit: int = 100):
     try:
-        query = (
-            db.query(Model)
-            .filter(Model.is_deleted == False)
-            .offset(skip)
-            .limit(limit)
+        query = paginate(
+            select(Model)
+            .filter(Model.is_deleted == False),
+            Model.id,
+            cursor=cursor,
+            skip=skip,
+            limit=limit,
         )
-        model: List[Model] = query.all()
+        if is_conditional(request):
+            validator = Validator((await db.execute(query.with_only_columns(Model.id, Model.updated_at))).all())
+            if validator.matches(request):
+                return validator.not_modified()
 
-        return ResponseMessage(
+        model: List[Model] = (await db.scalars(query)).all()
+
+        validator = Validator((item.id, item.updated_at) for item in model)
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message="Fetch all model success",
-            data=model
+            data=model,
+            next_cursor=next_cursor(model, limit, Model.id),
+        ))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+async def validate_models(db, result: BulkResult, model_items: List[ModelEntity], model_ids: List[int] = None):
+    """
+    Kiểm tra cả batch: field rỗng, name / detail_name trùng trong batch hoặc đã có trong DB
+    """
+    for index, model_item in enumerate(model_items):
+        if model_item.name == "" or model_item.detail_name == "":
+            result.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Model 'name' or 'detail name' cannot be empty")
+
+    for field in ("name", "detail_name"):
+        values = [getattr(model_item, field) for model_item in model_items]
+        check_duplicates(result, values, field)
+        taken = await taken_values(db, Model, getattr(Model, field), values)
+        check_taken(result, values, taken, field, model_ids)
+
+@model_router.post("/bulk", status_code=status.HTTP_201_CREATED, name="Add many models")
+async def create_bulk(model_items: List[ModelEntity], db: db_dependency):
+    try:
+        error = check_size(model_items)
+        if error:
+            return error
+
+        result = BulkResult(len(model_items))
+        await validate_models(db, result, model_items)
+
+        if not result.ok:
+            return result.error_response()
+
+        model_ids = await insert_rows(db, Model, [
+            model_item.dict(exclude={"created_at", "updated_at"}) for model_item in model_items
+        ], key=Model.name)
+        await db.commit()
+        model_cache.invalidate()
+        new_models = await reload_many(db, Model, model_ids)
+
+        return BulkResult.response(status.HTTP_201_CREATED, f"{len(new_models)} models created successfully", new_models)
+
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
         )
 
-@model_router.get("/{model_id}", status_code=status.HTTP_200_OK, name="Get model by id")
-async def fetch_detail(model_id: int, db: db_dependency):
+@model_router.put("/bulk", status_code=status.HTTP_200_OK, name="Update many models")
+async def update_bulk(model_items: List[ModelBulkUpdateEntity], db: db_dependency):
     try:
-        model: Model = (
-            db.query(Model)
-            .filter(Model.id == model_id, Model.is_deleted == False)
-            .first()
+        error = check_size(model_items)
+        if error:
+            return error
+
+        result = BulkResult(len(model_items))
+        model_ids = [model_item.id for model_item in model_items]
+        await check_ids(db, result, Model, model_ids, "Model")
+        await validate_models(db, result, model_items, model_ids)
+
+        if not result.ok:
+            return result.error_response()
+
+        now = datetime.now()
+        await update_rows(db, Model, [
+            {
+                "id": model_item.id,
+                "name": model_item.name,
+                "detail_name": model_item.detail_name,
+                "type": model_item.type,
+                "updated_at": now,
+            }
+            for model_item in model_items
+        ])
+        await db.commit()
+        model_cache.invalidate()
+        models = await reload_many(db, Model, model_ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(models)} models updated successfully", models)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@model_router.delete("/bulk", status_code=status.HTTP_200_OK, name="Delete many models")
+async def delete_bulk(bulk_item: BulkDeleteEntity, db: db_dependency):
+    try:
+        error = check_size(bulk_item.ids)
+        if error:
+            return error
+
+        result = BulkResult(len(bulk_item.ids))
+        await check_ids(db, result, Model, bulk_item.ids, "Model")
+
+        if not result.ok:
+            return result.error_response()
+
+        await soft_delete_rows(db, Model, bulk_item.ids)
+        await db.commit()
+        model_cache.invalidate()
+        models = await reload_many(db, Model, bulk_item.ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(models)} models deleted successfully", models)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+@model_router.get("/{model_id}", status_code=status.HTTP_200_OK, name="Get model by id")
+async def fetch_detail(model_id: int, request: Request, db: db_dependency):
+    try:
+        model = await model_cache.get(db, model_id)
+
         if not model:
             return ResponseMessage(
                 code=status.HTTP_404_NOT_FOUND,
                 message=f"Prompt with ID {model_id} not found.",
             )
 
-        return ResponseMessage(
+        validator = Validator([(model["id"], model["updated_at"])])
+        if validator.matches(request):
+            return validator.not_modified()
+
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message=f"Fetch prompt with id {model_id} success",
             data=model,
-        )
+        ))
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -76,8 +202,9 @@ async def create(model_item: ModelEntity, db: db_dependency):
         new_model = Model(**model_item.dict())
 
         db.add(new_model)
-        db.commit()
-        db.refresh(new_model)
+        await db.commit()
+        model_cache.invalidate()
+        await db.refresh(new_model)
 
         return ResponseMessage(
             code=status.HTTP_201_CREATED,
@@ -86,7 +213,7 @@ async def create(model_item: ModelEntity, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -95,11 +222,10 @@ async def create(model_item: ModelEntity, db: db_dependency):
 @model_router.put("/{model_id}", status_code=status.HTTP_200_OK, name="Update model")
 async def update(model_id: int, model_item: ModelEntity, db: db_dependency):
     try:
-        model: Model = (
-            db.query(Model)
+        model: Model = (await db.scalars(
+            select(Model)
             .filter(Model.id == model_id, Model.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not model:
             return ResponseMessage(
@@ -112,8 +238,9 @@ async def update(model_id: int, model_item: ModelEntity, db: db_dependency):
         model.type = model_item.type
         model.updated_at = datetime.now()
 
-        db.commit()
-        db.refresh(model)
+        await db.commit()
+        model_cache.invalidate()
+        await db.refresh(model)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
@@ -122,7 +249,7 @@ async def update(model_id: int, model_item: ModelEntity, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -131,11 +258,10 @@ async def update(model_id: int, model_item: ModelEntity, db: db_dependency):
 @model_router.delete("/{model_id}", status_code=status.HTTP_200_OK, name="Delete prompt")
 async def delete(model_id: int, db: db_dependency):
     try:
-        model: Model = (
-            db.query(Model)
+        model: Model = (await db.scalars(
+            select(Model)
             .filter(Model.id == model_id, Model.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not model:
             return ResponseMessage(
@@ -144,7 +270,9 @@ async def delete(model_id: int, db: db_dependency):
             )
         
         model.is_deleted = True
-        db.commit()
+        await db.commit()
+        model_cache.invalidate()
+        await db.refresh(model)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
@@ -153,7 +281,7 @@ async def delete(model_id: int, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
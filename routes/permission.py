@@ -2,61 +2,187 @@ from typing import List
 from datetime import datetime
 from typing import List, Optional
 from models.permission import Permission
-from database.database import db_dependency
+from sqlalchemy import select
+from database.database import db_dependency, reload_many
 from schema.response import ResponseMessage
-from schema.permission import PermissionEntity
-from fastapi import APIRouter, status, Depends, HTTPException
+from helper.cache import permission_cache
+from helper.bulk import BulkResult, check_size, check_ids, check_duplicates, check_taken, taken_values, insert_rows, update_rows, soft_delete_rows
+from helper.authorizer import authorizer
+from helper.pagination import cursor_query, paginate, next_cursor
+from helper.conditional import Validator, is_conditional
+from schema.permission import PermissionEntity, PermissionBulkUpdateEntity
+from schema.bulk import BulkDeleteEntity
+from fastapi import APIRouter, status, Depends, HTTPException, Request
 
 permission_router = APIRouter(prefix="/permissions", tags=["permissions"])
 
+permission_cursor = cursor_query(Permission.id)
+
 @permission_router.get("", status_code=status.HTTP_200_OK, name="Get all permission")
-async def fetch_all(db: db_dependency, skip: int = 0, limit: int = 100):
+async def fetch_all(request: Request, db: db_dependency, cursor: permission_cursor, skip: int = 0, limit: int = 100):
     try:
-        query = (
-            db.query(Permission)
-            .filter(Permission.is_deleted == False)
-            .offset(skip)
-            .limit(limit)
+        query = paginate(
+            select(Permission)
+            .filter(Permission.is_deleted == False),
+            Permission.id,
+            cursor=cursor,
+            skip=skip,
+            limit=limit,
         )
 
-        permissions: List[Permission] = query.all()
+        if is_conditional(request):
+            validator = Validator((await db.execute(query.with_only_columns(Permission.id, Permission.updated_at))).all())
+            if validator.matches(request):
+                return validator.not_modified()
 
-        return ResponseMessage(
+        permissions: List[Permission] = (await db.scalars(query)).all()
+
+        validator = Validator((item.id, item.updated_at) for item in permissions)
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message="Fetch all permission success",
             data=permissions,
+            next_cursor=next_cursor(permissions, limit, Permission.id),
+        ))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+@permission_router.post("/bulk", status_code=status.HTTP_201_CREATED, name="Add many permissions")
+async def create_bulk(permission_items: List[PermissionEntity], db: db_dependency):
+    try:
+        error = check_size(permission_items)
+        if error:
+            return error
+
+        result = BulkResult(len(permission_items))
+        for index, permission_item in enumerate(permission_items):
+            if not permission_item.name or not permission_item.route:
+                result.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Permission 'name' or 'route' cannot be empty")
+
+        # name và route đều unique
+        for field in ("name", "route"):
+            values = [getattr(permission_item, field) for permission_item in permission_items]
+            check_duplicates(result, values, field)
+            check_taken(result, values, await taken_values(db, Permission, getattr(Permission, field), values), field)
+
+        if not result.ok:
+            return result.error_response()
+
+        permission_ids = await insert_rows(db, Permission, [
+            permission_item.dict(exclude={"created_at", "updated_at"}) for permission_item in permission_items
+        ], key=Permission.route)
+        await db.commit()
+        permission_cache.invalidate()
+        new_permissions = await reload_many(db, Permission, permission_ids)
+        for permission in new_permissions:
+            authorizer.set_permission(permission.id, permission.route)
+
+        return BulkResult.response(status.HTTP_201_CREATED, f"{len(new_permissions)} permissions created successfully", new_permissions)
+
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
         )
 
-@permission_router.get("/{permission_id}", status_code=status.HTTP_200_OK, name="Get permission by id")
-async def fetch_detail(permission_id: int, db: db_dependency):
+@permission_router.put("/bulk", status_code=status.HTTP_200_OK, name="Update many permissions")
+async def update_bulk(permission_items: List[PermissionBulkUpdateEntity], db: db_dependency):
     try:
-        permission: Permission = (
-            db.query(Permission)
-            .filter(Permission.id == permission_id, Permission.is_deleted == False)
-            .first()
+        error = check_size(permission_items)
+        if error:
+            return error
+
+        result = BulkResult(len(permission_items))
+        permission_ids = [permission_item.id for permission_item in permission_items]
+        await check_ids(db, result, Permission, permission_ids, "Permission")
+        for index, permission_item in enumerate(permission_items):
+            if not permission_item.name:
+                result.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Permission 'name' cannot be empty")
+
+        # Giống update đơn lẻ: chỉ đổi name, route giữ nguyên
+        names = [permission_item.name for permission_item in permission_items]
+        check_duplicates(result, names, "name")
+        check_taken(result, names, await taken_values(db, Permission, Permission.name, names), "name", permission_ids)
+
+        if not result.ok:
+            return result.error_response()
+
+        now = datetime.now()
+        await update_rows(db, Permission, [
+            {"id": permission_item.id, "name": permission_item.name, "updated_at": now}
+            for permission_item in permission_items
+        ])
+        await db.commit()
+        permission_cache.invalidate()
+        permissions = await reload_many(db, Permission, permission_ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(permissions)} permissions updated successfully", permissions)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@permission_router.delete("/bulk", status_code=status.HTTP_200_OK, name="Delete many permissions")
+async def delete_bulk(bulk_item: BulkDeleteEntity, db: db_dependency):
+    try:
+        error = check_size(bulk_item.ids)
+        if error:
+            return error
+
+        result = BulkResult(len(bulk_item.ids))
+        await check_ids(db, result, Permission, bulk_item.ids, "Permission")
+
+        if not result.ok:
+            return result.error_response()
+
+        await soft_delete_rows(db, Permission, bulk_item.ids)
+        await db.commit()
+        permission_cache.invalidate()
+        permissions = await reload_many(db, Permission, bulk_item.ids)
+        for permission in permissions:
+            authorizer.set_permission(permission.id, None)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(permissions)} permissions deleted successfully", permissions)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+@permission_router.get("/{permission_id}", status_code=status.HTTP_200_OK, name="Get permission by id")
+async def fetch_detail(permission_id: int, request: Request, db: db_dependency):
+    try:
+        permission = await permission_cache.get(db, permission_id)
+
         if not permission:
             return ResponseMessage(
                 code=status.HTTP_404_NOT_FOUND,
                 message=f"Permission with ID {permission_id} not found.",
             )
 
-        return ResponseMessage(
+        validator = Validator([(permission["id"], permission["updated_at"])])
+        if validator.matches(request):
+            return validator.not_modified()
+
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message=f"Fetch permission with id {permission_id} success",
             data=permission,
-        )
+        ))
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -65,14 +191,13 @@ async def fetch_detail(permission_id: int, db: db_dependency):
 @permission_router.post("", status_code=status.HTTP_201_CREATED, name="Add new permission")
 async def create(permission_item: PermissionEntity, db: db_dependency):
     try:
-        existing_permission = (
-            db.query(Permission)
+        existing_permission = (await db.scalars(
+            select(Permission)
             .filter(
                 Permission.name == permission_item.name,
                 Permission.route == permission_item.route,
             )
-            .first()
-        )
+        )).first()
 
         if existing_permission:
             return ResponseMessage(
@@ -83,8 +208,10 @@ async def create(permission_item: PermissionEntity, db: db_dependency):
         new_permission = Permission(**permission_item.dict())
 
         db.add(new_permission)
-        db.commit()
-        db.refresh(new_permission)
+        await db.commit()
+        permission_cache.invalidate()
+        await db.refresh(new_permission)
+        authorizer.set_permission(new_permission.id, new_permission.route)
 
         return ResponseMessage(
             code=status.HTTP_201_CREATED,
@@ -93,7 +220,7 @@ async def create(permission_item: PermissionEntity, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -104,11 +231,10 @@ async def update(
     permission_id: int, permission_item: PermissionEntity, db: db_dependency
 ):
     try:
-        permission: Permission = (
-            db.query(Permission)
+        permission: Permission = (await db.scalars(
+            select(Permission)
             .filter(Permission.id == permission_id, Permission.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not permission:
             return ResponseMessage(
@@ -119,8 +245,10 @@ async def update(
         permission.name = permission_item.name
         permission.updated_at = datetime.now()
 
-        db.commit()
-        db.refresh(permission)
+        await db.commit()
+        permission_cache.invalidate()
+        await db.refresh(permission)
+        authorizer.set_permission(permission.id, permission.route)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
@@ -129,7 +257,7 @@ async def update(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -138,11 +266,10 @@ async def update(
 @permission_router.delete("/{permission_id}", status_code=status.HTTP_200_OK, name="Delete permission")
 async def delete(permission_id: int, db: db_dependency):
     try:
-        permission: Permission = (
-            db.query(Permission)
+        permission: Permission = (await db.scalars(
+            select(Permission)
             .filter(Permission.id == permission_id, Permission.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not permission:
             return ResponseMessage(
@@ -151,7 +278,10 @@ async def delete(permission_id: int, db: db_dependency):
             )
         
         permission.is_deleted = True
-        db.commit()
+        await db.commit()
+        permission_cache.invalidate()
+        await db.refresh(permission)
+        authorizer.set_permission(permission.id, None)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
@@ -160,7 +290,7 @@ async def delete(permission_id: int, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
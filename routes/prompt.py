@@ -1,61 +1,171 @@
 from typing import List
 from models.prompt import Prompt 
 from datetime import datetime
-from schema.prompt import PromptEntity 
-from database.database import db_dependency
+from schema.prompt import PromptEntity, PromptBulkUpdateEntity
+from schema.bulk import BulkDeleteEntity
+from sqlalchemy import select
+from database.database import db_dependency, reload_many
 from schema.response import ResponseMessage
+from helper.cache import prompt_cache
+from helper.bulk import BulkResult, check_size, check_ids, insert_rows, update_rows, soft_delete_rows
+from helper.pagination import cursor_query, paginate, next_cursor
+from helper.conditional import Validator, is_conditional
 from fastapi.exceptions import RequestValidationError
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Request
 
 prompt_router = APIRouter(prefix="/prompts", tags=["prompts"])
 
+prompt_cursor = cursor_query(Prompt.id)
+
 @prompt_router.get("", status_code=status.HTTP_200_OK, name="Get all prompt")
-async def fetch_all(db: db_dependency, skip: int = 0, limit: int = 100):
+async def fetch_all(request: Request, db: db_dependency, cursor: prompt_cursor, skip: int = 0, limit: int = 100):
     try:
-        query = (
-            db.query(Prompt)
-            .filter(Prompt.is_deleted == False)
-            .offset(skip)
-            .limit(limit)
+        query = paginate(
+            select(Prompt)
+            .filter(Prompt.is_deleted == False),
+            Prompt.id,
+            cursor=cursor,
+            skip=skip,
+            limit=limit,
         )
-        prompts: List[Prompt] = query.all()
+        if is_conditional(request):
+            validator = Validator((await db.execute(query.with_only_columns(Prompt.id, Prompt.updated_at))).all())
+            if validator.matches(request):
+                return validator.not_modified()
 
-        return ResponseMessage(
+        prompts: List[Prompt] = (await db.scalars(query)).all()
+
+        validator = Validator((item.id, item.updated_at) for item in prompts)
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message="Fetch all role success",
-            data=prompts
+            data=prompts,
+            next_cursor=next_cursor(prompts, limit, Prompt.id),
+        ))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+@prompt_router.post("/bulk", status_code=status.HTTP_201_CREATED, name="Add many prompts")
+async def create_bulk(prompt_items: List[PromptEntity], db: db_dependency):
+    try:
+        error = check_size(prompt_items)
+        if error:
+            return error
+
+        result = BulkResult(len(prompt_items))
+        for index, prompt_item in enumerate(prompt_items):
+            if prompt_item.content == "":
+                result.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Content cannot be empty")
+
+        if not result.ok:
+            return result.error_response()
+
+        prompt_ids = await insert_rows(db, Prompt, [
+            prompt_item.dict(exclude={"created_at", "updated_at"}) for prompt_item in prompt_items
+        ])
+        await db.commit()
+        prompt_cache.invalidate()
+        new_prompts = await reload_many(db, Prompt, prompt_ids)
+
+        return BulkResult.response(status.HTTP_201_CREATED, f"{len(new_prompts)} prompts created successfully", new_prompts)
+
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
         )
 
-@prompt_router.get("/{prompt_id}", status_code=status.HTTP_200_OK, name="Get prompt by id")
-async def fetch_detail(prompt_id: int, db: db_dependency):
+@prompt_router.put("/bulk", status_code=status.HTTP_200_OK, name="Update many prompts")
+async def update_bulk(prompt_items: List[PromptBulkUpdateEntity], db: db_dependency):
     try:
-        prompt: Prompt = (
-            db.query(Prompt)
-            .filter(Prompt.id == prompt_id, Prompt.is_deleted == False)
-            .first()
+        error = check_size(prompt_items)
+        if error:
+            return error
+
+        result = BulkResult(len(prompt_items))
+        prompt_ids = [prompt_item.id for prompt_item in prompt_items]
+        await check_ids(db, result, Prompt, prompt_ids, "Prompt")
+        for index, prompt_item in enumerate(prompt_items):
+            if prompt_item.content == "":
+                result.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Content cannot be empty")
+
+        if not result.ok:
+            return result.error_response()
+
+        now = datetime.now()
+        await update_rows(db, Prompt, [
+            {"id": prompt_item.id, "content": prompt_item.content, "updated_at": now}
+            for prompt_item in prompt_items
+        ])
+        await db.commit()
+        prompt_cache.invalidate()
+        prompts = await reload_many(db, Prompt, prompt_ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(prompts)} prompts updated successfully", prompts)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@prompt_router.delete("/bulk", status_code=status.HTTP_200_OK, name="Delete many prompts")
+async def delete_bulk(bulk_item: BulkDeleteEntity, db: db_dependency):
+    try:
+        error = check_size(bulk_item.ids)
+        if error:
+            return error
+
+        result = BulkResult(len(bulk_item.ids))
+        await check_ids(db, result, Prompt, bulk_item.ids, "Prompt")
+
+        if not result.ok:
+            return result.error_response()
+
+        await soft_delete_rows(db, Prompt, bulk_item.ids)
+        await db.commit()
+        prompt_cache.invalidate()
+        prompts = await reload_many(db, Prompt, bulk_item.ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(prompts)} prompts deleted successfully", prompts)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+@prompt_router.get("/{prompt_id}", status_code=status.HTTP_200_OK, name="Get prompt by id")
+async def fetch_detail(prompt_id: int, request: Request, db: db_dependency):
+    try:
+        prompt = await prompt_cache.get(db, prompt_id)
+
         if not prompt:
             return ResponseMessage(
                 code=status.HTTP_404_NOT_FOUND,
                 message=f"Prompt with ID {prompt_id} not found.",
             )
 
-        return ResponseMessage(
+        validator = Validator([(prompt["id"], prompt["updated_at"])])
+        if validator.matches(request):
+            return validator.not_modified()
+
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message=f"Fetch prompt with id {prompt_id} success",
             data=prompt,
-        )
+        ))
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -74,8 +184,9 @@ async def create(prompt_item: PromptEntity, db: db_dependency):
         new_prompt = Prompt(**prompt_item.dict())
 
         db.add(new_prompt)
-        db.commit()
-        db.refresh(new_prompt)
+        await db.commit()
+        prompt_cache.invalidate()
+        await db.refresh(new_prompt)
 
         return ResponseMessage(
             code=status.HTTP_201_CREATED,
@@ -84,7 +195,7 @@ async def create(prompt_item: PromptEntity, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -93,11 +204,10 @@ async def create(prompt_item: PromptEntity, db: db_dependency):
 @prompt_router.put("/{prompt_id}", status_code=status.HTTP_200_OK, name="Update prompt")
 async def update(prompt_id: int, prompt_item: PromptEntity, db: db_dependency):
     try:
-        prompt: Prompt = (
-            db.query(Prompt)
+        prompt: Prompt = (await db.scalars(
+            select(Prompt)
             .filter(Prompt.id == prompt_id, Prompt.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not prompt:
             return ResponseMessage(
@@ -108,8 +218,9 @@ async def update(prompt_id: int, prompt_item: PromptEntity, db: db_dependency):
         prompt.content = prompt_item.content
         prompt.updated_at = datetime.now()
 
-        db.commit()
-        db.refresh(prompt)
+        await db.commit()
+        prompt_cache.invalidate()
+        await db.refresh(prompt)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
@@ -118,7 +229,7 @@ async def update(prompt_id: int, prompt_item: PromptEntity, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -127,11 +238,10 @@ async def update(prompt_id: int, prompt_item: PromptEntity, db: db_dependency):
 @prompt_router.delete("/{prompt_id}", status_code=status.HTTP_200_OK, name="Delete prompt")
 async def delete(prompt_id: int, db: db_dependency):
     try:
-        prompt: Prompt = (
-            db.query(Prompt)
+        prompt: Prompt = (await db.scalars(
+            select(Prompt)
             .filter(Prompt.id == prompt_id, Prompt.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not prompt:
             return ResponseMessage(
@@ -140,7 +250,9 @@ async def delete(prompt_id: int, db: db_dependency):
             )
         
         prompt.is_deleted = True
-        db.commit()
+        await db.commit()
+        prompt_cache.invalidate()
+        await db.refresh(prompt)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
@@ -149,7 +261,7 @@ async def delete(prompt_id: int, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
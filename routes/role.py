@@ -1,71 +1,200 @@
 from typing import List
 from models.role import Role
 from datetime import datetime
-from schema.role import RoleEntity
+from schema.role import RoleEntity, RoleBulkUpdateEntity
+from schema.bulk import BulkDeleteEntity
 from models.permission import Permission
-from database.database import db_dependency
+from sqlalchemy import select
+from database.database import db_dependency, reload_many
 from schema.response import ResponseMessage
+from helper.cache import role_cache, permission_cache
+from helper.bulk import BulkResult, check_size, check_ids, check_duplicates, check_taken, taken_values, existing_ids, insert_rows, update_rows, soft_delete_rows
+from helper.authorizer import authorizer
+from helper.pagination import cursor_query, paginate, next_cursor
+from helper.conditional import Validator, is_conditional
 from fastapi.exceptions import RequestValidationError
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Request
 
 role_router = APIRouter(prefix="/roles", tags=["roles"])
 
+role_cursor = cursor_query(Role.id)
+
 @role_router.get("", status_code=status.HTTP_200_OK, name="Get all role")
-async def fetch_all(db: db_dependency, skip: int = 0, limit: int = 100):
+async def fetch_all(request: Request, db: db_dependency, cursor: role_cursor, skip: int = 0, limit: int = 100):
     try:
-        query = (
-            db.query(Role)
-            .filter(Role.is_deleted == False)
-            .offset(skip)
-            .limit(limit)
+        query = paginate(
+            select(Role)
+            .filter(Role.is_deleted == False),
+            Role.id,
+            cursor=cursor,
+            skip=skip,
+            limit=limit,
         )
-        roles: List[Role] = query.all()
+        if is_conditional(request):
+            validator = Validator((await db.execute(query.with_only_columns(Role.id, Role.updated_at))).all())
+            if validator.matches(request):
+                return validator.not_modified()
 
-        return ResponseMessage(
+        roles: List[Role] = (await db.scalars(query)).all()
+
+        validator = Validator((item.id, item.updated_at) for item in roles)
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message="Fetch all role success",
-            data=roles
+            data=roles,
+            next_cursor=next_cursor(roles, limit, Role.id),
+        ))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+async def validate_roles(db, result: BulkResult, role_items: List[RoleEntity], role_ids: List[int] = None):
+    """
+    Kiểm tra cả batch: name trùng, permission không tồn tại (một query cho toàn bộ permission_ids)
+    """
+    names = [role_item.name for role_item in role_items]
+    check_duplicates(result, names, "name")
+    check_taken(result, names, await taken_values(db, Role, Role.name, names), "Role", role_ids)
+
+    found = await existing_ids(db, Permission, {
+        permission_id for role_item in role_items for permission_id in role_item.permission_ids
+    })
+    for index, role_item in enumerate(role_items):
+        missing_permission_ids = set(role_item.permission_ids) - found
+        if missing_permission_ids:
+            result.fail(index, status.HTTP_400_BAD_REQUEST, f"Permissions with IDs {missing_permission_ids} do not exist.")
+
+@role_router.post("/bulk", status_code=status.HTTP_201_CREATED, name="Add many roles")
+async def create_bulk(role_items: List[RoleEntity], db: db_dependency):
+    try:
+        error = check_size(role_items)
+        if error:
+            return error
+
+        result = BulkResult(len(role_items))
+        await validate_roles(db, result, role_items)
+
+        if not result.ok:
+            return result.error_response()
+
+        role_ids = await insert_rows(db, Role, [
+            role_item.dict(exclude={"created_at", "updated_at"}) for role_item in role_items
+        ], key=Role.name)
+        await db.commit()
+        role_cache.invalidate()
+        new_roles = await reload_many(db, Role, role_ids)
+        for role in new_roles:
+            authorizer.set_role(role.id, role.permission_ids)
+
+        return BulkResult.response(status.HTTP_201_CREATED, f"{len(new_roles)} roles created successfully", new_roles)
+
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
         )
 
-@role_router.get("/{role_id}", status_code=status.HTTP_200_OK, name="Get role by id")
-async def fetch_detail(role_id: int, db: db_dependency):
+@role_router.put("/bulk", status_code=status.HTTP_200_OK, name="Update many roles")
+async def update_bulk(role_items: List[RoleBulkUpdateEntity], db: db_dependency):
     try:
-        role: Role = (
-            db.query(Role)
-            .filter(Role.id == role_id, Role.is_deleted == False)
-            .first()
+        error = check_size(role_items)
+        if error:
+            return error
+
+        result = BulkResult(len(role_items))
+        role_ids = [role_item.id for role_item in role_items]
+        await check_ids(db, result, Role, role_ids, "Role")
+        await validate_roles(db, result, role_items, role_ids)
+
+        if not result.ok:
+            return result.error_response()
+
+        now = datetime.now()
+        await update_rows(db, Role, [
+            {"id": role_item.id, "name": role_item.name, "permission_ids": role_item.permission_ids, "updated_at": now}
+            for role_item in role_items
+        ])
+        await db.commit()
+        role_cache.invalidate()
+        roles = await reload_many(db, Role, role_ids)
+        for role in roles:
+            authorizer.set_role(role.id, role.permission_ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(roles)} roles updated successfully", roles)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+@role_router.delete("/bulk", status_code=status.HTTP_200_OK, name="Delete many roles")
+async def delete_bulk(bulk_item: BulkDeleteEntity, db: db_dependency):
+    try:
+        error = check_size(bulk_item.ids)
+        if error:
+            return error
+
+        result = BulkResult(len(bulk_item.ids))
+        await check_ids(db, result, Role, bulk_item.ids, "Role")
+
+        if not result.ok:
+            return result.error_response()
+
+        await soft_delete_rows(db, Role, bulk_item.ids)
+        await db.commit()
+        role_cache.invalidate()
+        roles = await reload_many(db, Role, bulk_item.ids)
+        for role in roles:
+            authorizer.set_role(role.id, None)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(roles)} roles deleted successfully", roles)
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@role_router.get("/{role_id}", status_code=status.HTTP_200_OK, name="Get role by id")
+async def fetch_detail(role_id: int, request: Request, db: db_dependency):
+    try:
+        role = await role_cache.get(db, role_id)
+
         if not role:
             return ResponseMessage(
                 code=status.HTTP_404_NOT_FOUND,
                 message=f"Role with ID {role_id} not found.",
             )
 
-        permissions = (
-            db.query(Permission)
-            .filter(Permission.id.in_(role.permission_ids))
-            .all()
-        )
+        permission_ids = [int(permission_id) for permission_id in role["permission_ids"] or []]
+        permissions = await permission_cache.get_many(db, permission_ids)
 
-        role_data = role.to_dict()
-        role_data['permissions'] = [permission.to_dict() for permission in permissions]
+        role_data = dict(role)
+        role_data['permissions'] = [permissions[permission_id] for permission_id in permission_ids if permission_id in permissions]
 
-        return ResponseMessage(
+        validator = Validator(
+            [(role["id"], role["updated_at"])]
+            + [(permission["id"], permission["updated_at"]) for permission in role_data['permissions']]
+        )
+        if validator.matches(request):
+            return validator.not_modified()
+
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message=f"Fetch role with id {role_id} success",
             data=role_data,
-        )
+        ))
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -74,7 +203,7 @@ async def fetch_detail(role_id: int, db: db_dependency):
 @role_router.post("", status_code=status.HTTP_201_CREATED, name="Add new role")
 async def create(role_item: RoleEntity, db: db_dependency):
     try:
-        existing_role = db.query(Role).filter(Role.name == role_item.name).first()
+        existing_role = (await db.scalars(select(Role).filter(Role.name == role_item.name))).first()
         if existing_role:
             return ResponseMessage(
                 code=status.HTTP_400_BAD_REQUEST,
@@ -82,7 +211,7 @@ async def create(role_item: RoleEntity, db: db_dependency):
             )
 
         permission_ids = role_item.permission_ids if role_item.permission_ids else [] 
-        existing_permissions = db.query(Permission).filter(Permission.id.in_(permission_ids)).all()
+        existing_permissions = (await db.scalars(select(Permission).filter(Permission.id.in_(permission_ids)))).all()
         existing_permission_ids = [permission.id for permission in existing_permissions]
 
         missing_permission_ids = set(permission_ids) - set(existing_permission_ids)
@@ -96,8 +225,10 @@ async def create(role_item: RoleEntity, db: db_dependency):
         new_role = Role(**role_item.dict())
 
         db.add(new_role)
-        db.commit()
-        db.refresh(new_role)
+        await db.commit()
+        role_cache.invalidate()
+        await db.refresh(new_role)
+        authorizer.set_role(new_role.id, new_role.permission_ids)
         return ResponseMessage(
             code=status.HTTP_201_CREATED,
             message="Role created successfully",
@@ -105,7 +236,7 @@ async def create(role_item: RoleEntity, db: db_dependency):
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -113,14 +244,14 @@ async def create(role_item: RoleEntity, db: db_dependency):
 
 @role_router.put("/{role_id}", status_code=status.HTTP_200_OK, name="Update role")
 async def update_role(role_id: int, role_item: RoleEntity, db: db_dependency):
-    role: Role = db.query(Role).filter(Role.id == role_id, Role.is_deleted == False).first()
+    role: Role = (await db.scalars(select(Role).filter(Role.id == role_id, Role.is_deleted == False))).first()
     if not role:
         return ResponseMessage(
             code=status.HTTP_404_NOT_FOUND,
             message=f"Role with ID {role_id} not found.",
         )
 
-    existing_role = db.query(Role).filter(Role.name == role_item.name).first()
+    existing_role = (await db.scalars(select(Role).filter(Role.name == role_item.name))).first()
     if existing_role and existing_role.id != role_id:
         return ResponseMessage(
             code=status.HTTP_400_BAD_REQUEST,
@@ -128,7 +259,7 @@ async def update_role(role_id: int, role_item: RoleEntity, db: db_dependency):
         )
 
     permission_ids = role_item.permission_ids if role_item.permission_ids else []  # Đảm bảo sử dụng permission_ids
-    existing_permissions = db.query(Permission).filter(Permission.id.in_(permission_ids)).all()
+    existing_permissions = (await db.scalars(select(Permission).filter(Permission.id.in_(permission_ids)))).all()
     existing_permission_ids = [permission.id for permission in existing_permissions]
 
     missing_permission_ids = set(permission_ids) - set(existing_permission_ids)
@@ -142,8 +273,10 @@ async def update_role(role_id: int, role_item: RoleEntity, db: db_dependency):
     role.permission_ids = permission_ids  
     role.updated_at = datetime.now()
 
-    db.commit()
-    db.refresh(role)
+    await db.commit()
+    role_cache.invalidate()
+    await db.refresh(role)
+    authorizer.set_role(role.id, role.permission_ids)
 
     return ResponseMessage(
         code=status.HTTP_200_OK,
@@ -154,7 +287,7 @@ async def update_role(role_id: int, role_item: RoleEntity, db: db_dependency):
 @role_router.delete("/{role_id}", status_code=status.HTTP_200_OK, name="Delete role")
 async def delete(role_id: int, db: db_dependency):
     try:
-        role: Role = db.query(Role).filter(Role.id == role_id, Role.is_deleted == False).first()
+        role: Role = (await db.scalars(select(Role).filter(Role.id == role_id, Role.is_deleted == False))).first()
         if not role:
             return ResponseMessage(
                 code=status.HTTP_404_NOT_FOUND,
@@ -162,8 +295,10 @@ async def delete(role_id: int, db: db_dependency):
             )
 
         role.is_deleted = True
-        db.commit()
-        db.refresh(role)
+        await db.commit()
+        role_cache.invalidate()
+        await db.refresh(role)
+        authorizer.set_role(role.id, None)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
@@ -171,7 +306,7 @@ async def delete(role_id: int, db: db_dependency):
             data=role
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -1,42 +1,306 @@
+import asyncio
 from typing import List
 from models.user import User
 from datetime import datetime
-from schema.user import UserEntity
-from helper.token import create_jwt_token
-from database.database import db_dependency
-from helper.password import create_password
-from schema.response import ResponseMessage
+from schema.user import UserEntity, UserBulkUpdateEntity
+from schema.bulk import BulkDeleteEntity
+from models.role import Role
+from models.model import Model
+from models.prompt import Prompt
+from models.chat import Chat
+from helper.token import revoke_refresh_tokens, token_revocations
+from sqlalchemy import select
+from database.database import db_dependency, reload, reload_many
+from helper.password import hash_password
+from helper.cache import user_dict, user_dicts, user_version, user_versions
+from helper.user_link import set_user_links, missing_user_links, load_user_links
+from helper.export import stream_rows, ndjson_response
+from database.database import read_session
+from helper.bulk import BulkResult, check_size, check_ids, check_duplicates, check_taken, taken_values, existing_ids, insert_rows, update_rows, soft_delete_rows
+from schema.response import ResponseMessage, dumps
+from helper.pagination import cursor_query, paginate, next_cursor
+from helper.conditional import Validator, is_conditional
 from fastapi.exceptions import RequestValidationError
-from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi import APIRouter, status, Depends, HTTPException, Request
 
 user_router = APIRouter(prefix="/users", tags=["users"])
 
+user_cursor = cursor_query(User.id)
+timeline_cursor = cursor_query(Chat.updated_at, Chat.id)
+
+# Quan hệ nằm ở bảng user_prompt / user_model / chat.user_id, không phải cột của user
+LINK_FIELDS = {"chat_ids", "prompt_ids", "models"}
+
 @user_router.get("", status_code=status.HTTP_200_OK, name="Get all user")
-async def fetch_all(db: db_dependency, skip: int = 0, limit: int = 100):
+async def fetch_all(request: Request, db: db_dependency, cursor: user_cursor, skip: int = 0, limit: int = 100):
     try:
-        query = (
-            db.query(User).filter(User.is_deleted == False).offset(skip).limit(limit)
+        query = paginate(
+            select(User)
+            .filter(User.is_deleted == False),
+            User.id,
+            cursor=cursor,
+            skip=skip,
+            limit=limit,
         )
-        users: List[User] = query.all()
+        if is_conditional(request):
+            user_ids = (await db.scalars(query.with_only_columns(User.id))).all()
+            versions = await user_versions(db, user_ids)
+            validator = Validator(versions[user_id] for user_id in user_ids)
+            if validator.matches(request):
+                return validator.not_modified()
+
+        users: List[User] = (await db.scalars(query)).all()
+        data = await user_dicts(db, users)
+
+        validator = Validator(user_version(user) for user in data)
+        return validator.apply(ResponseMessage(
+            code=status.HTTP_200_OK,
+            message="Fetch all user success",
+            data=data,
+            next_cursor=next_cursor(users, limit, User.id),
+        ))
 
+    except Exception as e:
+        await db.rollback()
         return ResponseMessage(
-            code=status.HTTP_200_OK, message="Fetch all user success", data=users
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
         )
 
+
+async def validate_users(db, result: BulkResult, user_items: List[UserEntity], user_ids: List[int] = None):
+    """
+    Kiểm tra cả batch: field rỗng, email trùng, role / prompt / model không tồn tại (mỗi bảng một query)
+    """
+    for index, user_item in enumerate(user_items):
+        if not user_item.user_name or not user_item.email or not user_item.password:
+            result.fail(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "'user_name' | 'email' | 'password' cannot be empty")
+
+    emails = [user_item.email for user_item in user_items]
+    check_duplicates(result, emails, "email")
+    check_taken(result, emails, await taken_values(db, User, User.email, emails), "email", user_ids)
+
+    for field, model in (("role_id", Role), ("default_prompt", Prompt), ("default_model", Model)):
+        values = [getattr(user_item, field) for user_item in user_items]
+        found = await existing_ids(db, model, values)
+        for index, value in enumerate(values):
+            if value not in found:
+                result.fail(index, status.HTTP_400_BAD_REQUEST, f"{model.__name__} with ID {value} does not exist.")
+
+    for index, error in (await missing_user_links(db, user_items)).items():
+        result.fail(index, status.HTTP_400_BAD_REQUEST, error)
+
+@user_router.post("/bulk", status_code=status.HTTP_201_CREATED, name="Add many users")
+async def create_bulk(user_items: List[UserEntity], db: db_dependency):
+    try:
+        error = check_size(user_items)
+        if error:
+            return error
+
+        result = BulkResult(len(user_items))
+        await validate_users(db, result, user_items)
+
+        if not result.ok:
+            return result.error_response()
+
+        # Hash song song, số thread bị giới hạn bởi password_executor
+        passwords = await asyncio.gather(*(hash_password(user_item.password) for user_item in user_items))
+        rows = []
+        for user_item, password in zip(user_items, passwords):
+            row = user_item.dict(exclude={"created_at", "updated_at"} | LINK_FIELDS)
+            row["password"] = password
+            rows.append(row)
+
+        user_ids = await insert_rows(db, User, rows, key=User.email)
+        await set_user_links(db, {
+            user_id: (user_item.prompt_ids, user_item.models)
+            for user_id, user_item in zip(user_ids, user_items)
+        })
+        await db.commit()
+        new_users = await reload_many(db, User, user_ids)
+
+        return BulkResult.response(status.HTTP_201_CREATED, f"{len(new_users)} users created successfully", await user_dicts(db, new_users))
+
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
         )
 
+@user_router.put("/bulk", status_code=status.HTTP_200_OK, name="Update many users")
+async def update_bulk(user_items: List[UserBulkUpdateEntity], db: db_dependency):
+    try:
+        error = check_size(user_items)
+        if error:
+            return error
 
-@user_router.get("/{user_id}", status_code=status.HTTP_200_OK, name="Get user by id")
-async def fetch_detail(user_id: int, db: db_dependency):
+        result = BulkResult(len(user_items))
+        user_ids = [user_item.id for user_item in user_items]
+        await check_ids(db, result, User, user_ids, "User")
+        await validate_users(db, result, user_items, user_ids)
+
+        if not result.ok:
+            return result.error_response()
+
+        passwords = await asyncio.gather(*(hash_password(user_item.password) for user_item in user_items))
+        now = datetime.now()
+        await update_rows(db, User, [
+            {
+                "id": user_item.id,
+                "user_name": user_item.user_name,
+                "email": user_item.email,
+                "password": password,
+                "updated_at": now,
+                "default_prompt": user_item.default_prompt,
+                "default_model": user_item.default_model,
+                "role_id": user_item.role_id,
+            }
+            for user_item, password in zip(user_items, passwords)
+        ])
+        await set_user_links(db, {user_item.id: (user_item.prompt_ids, user_item.models) for user_item in user_items})
+        # Đăng xuất các phiên: refresh token bị thu hồi, access token đã phát hành bị từ chối ngay sau commit
+        await revoke_refresh_tokens(db, user_ids)
+        await db.commit()
+        token_revocations.revoke(user_ids)
+        users = await reload_many(db, User, user_ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(users)} users updated successfully", await user_dicts(db, users))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@user_router.delete("/bulk", status_code=status.HTTP_200_OK, name="Delete many users")
+async def delete_bulk(bulk_item: BulkDeleteEntity, db: db_dependency):
     try:
-        user: User = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
+        error = check_size(bulk_item.ids)
+        if error:
+            return error
+
+        result = BulkResult(len(bulk_item.ids))
+        await check_ids(db, result, User, bulk_item.ids, "User")
+
+        if not result.ok:
+            return result.error_response()
+
+        await soft_delete_rows(db, User, bulk_item.ids)
+        await revoke_refresh_tokens(db, bulk_item.ids)
+        await db.commit()
+        token_revocations.revoke(bulk_item.ids)
+        users = await reload_many(db, User, bulk_item.ids)
+
+        return BulkResult.response(status.HTTP_200_OK, f"{len(users)} users deleted successfully", await user_dicts(db, users))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+async def export_users(include_deleted: bool):
+    """
+    Một dòng NDJSON cho mỗi user (không có password / token), role / prompt / model dạng id.
+    Liên kết của từng partition được đọc bằng session thứ hai vì session stream đang giữ server-side cursor.
+    """
+    query = select(
+        User.id,
+        User.user_name,
+        User.email,
+        User.image,
+        User.is_deleted,
+        User.role_id,
+        User.default_prompt,
+        User.default_model,
+        User.created_at,
+        User.updated_at,
+    ).order_by(User.id)
+    if not include_deleted:
+        query = query.filter(User.is_deleted == False)
+
+    async with await read_session() as lookup:
+        async for rows in stream_rows(query):
+            prompt_ids, model_ids, chat_ids = await load_user_links(lookup, [row.id for row in rows])
+            lines = []
+            for row in rows:
+                data = row._asdict()
+                data["chat_ids"] = chat_ids.get(row.id, [])
+                data["prompt_ids"] = prompt_ids.get(row.id, [])
+                data["models"] = model_ids.get(row.id, [])
+                lines.append(dumps(data) + b"\n")
+            yield b"".join(lines)
+
+@user_router.get("/export", status_code=status.HTTP_200_OK, name="Export users as NDJSON")
+async def export(include_deleted: bool = False, gzip: bool = False):
+    return ndjson_response(export_users(include_deleted), "users.ndjson", gzip)
+
+@user_router.get("/{user_id}/chats", status_code=status.HTTP_200_OK, name="Get chats of user")
+async def fetch_chats(user_id: int, request: Request, db: db_dependency, cursor: timeline_cursor, limit: int = 20):
+    """
+    Timeline chat của user, mới nhất trước. Chỉ trả về bản tóm tắt (không có nội dung hội thoại),
+    keyset theo (updated_at, id) trên index ix_chat_user_id_is_deleted_updated_at.
+    """
+    try:
+        query = paginate(
+            select(Chat.id, Chat.title, Chat.last_seq, Chat.created_at, Chat.updated_at)
+            .filter(Chat.user_id == user_id, Chat.is_deleted == False),
+            Chat.updated_at,
+            Chat.id,
+            cursor=cursor,
+            skip=0,
+            limit=limit,
+            descending=True,
         )
+        chats = (await db.execute(query)).all()
+
+        # Chỉ kiểm tra user tồn tại khi trang đầu rỗng
+        if not chats and cursor is None:
+            user_exists = (await db.scalars(
+                select(User.id).filter(User.id == user_id, User.is_deleted == False)
+            )).first()
+            if not user_exists:
+                return ResponseMessage(
+                    code=status.HTTP_404_NOT_FOUND,
+                    message=f"User with ID {user_id} not found.",
+                )
+
+        # Bản tóm tắt đã nhỏ nên không cần query riêng, chỉ tiết kiệm phần serialize / gửi body
+        validator = Validator((chat.id, chat.updated_at, chat.last_seq) for chat in chats)
+        if validator.matches(request):
+            return validator.not_modified()
+
+        return validator.apply(ResponseMessage(
+            code=status.HTTP_200_OK,
+            message=f"Fetch chats of user {user_id} success",
+            data=[chat._asdict() for chat in chats],
+            next_cursor=next_cursor(chats, limit, Chat.updated_at, Chat.id),
+        ))
+
+    except Exception as e:
+        await db.rollback()
+        return ResponseMessage(
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Database error: {str(e)}",
+        )
+
+@user_router.get("/{user_id}", status_code=status.HTTP_200_OK, name="Get user by id")
+async def fetch_detail(user_id: int, request: Request, db: db_dependency):
+    try:
+        if is_conditional(request):
+            version = (await user_versions(db, [user_id])).get(user_id)
+            if version is not None:
+                validator = Validator([version])
+                if validator.matches(request):
+                    return validator.not_modified()
+
+        user: User = (await db.scalars(
+            select(User)
+            .filter(User.id == user_id, User.is_deleted == False)
+        )).first()
 
         if not user:
             return ResponseMessage(
@@ -44,14 +308,17 @@ async def fetch_detail(user_id: int, db: db_dependency):
                 message=f"User with ID {user_id} not found.",
             )
 
-        return ResponseMessage(
+        data = await user_dict(db, user)
+
+        validator = Validator([user_version(data)])
+        return validator.apply(ResponseMessage(
             code=status.HTTP_200_OK,
             message=f"Fetch user with id {user_id} success",
-            data=user,
-        )
+            data=data,
+        ))
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -83,28 +350,31 @@ async def create(user_item: UserEntity, db: db_dependency):
                 data={"error": "'user_name' | 'email' | 'password' | 'default_model' | 'default_prompt' cannot be empty"},
             )
 
-        new_user = User(**user_item.dict())
+        missing = await missing_user_links(db, [user_item])
+        if missing:
+            return ResponseMessage(
+                code=status.HTTP_400_BAD_REQUEST,
+                message=missing[0],
+            )
 
-        new_user.password = create_password(new_user.password)
-        new_user.token = create_jwt_token({
-            "user_name": new_user.user_name,
-            "email": new_user.email,
-            "password": new_user.password,
-            "date": str(datetime.now())
-        })
+        new_user = User(**user_item.dict(exclude=LINK_FIELDS))
+
+        new_user.password = await hash_password(new_user.password)
 
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.flush()
+        await set_user_links(db, {new_user.id: (user_item.prompt_ids, user_item.models)})
+        await db.commit()
+        new_user = await reload(db, new_user)
 
         return ResponseMessage(
             code=status.HTTP_201_CREATED,
             message="User created successfully",
-            data=new_user
+            data=await user_dict(db, new_user),
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -113,11 +383,10 @@ async def create(user_item: UserEntity, db: db_dependency):
 @user_router.put("/{user_id}", status_code=status.HTTP_200_OK, name="Update user")
 async def update(user_id: int, user_item: UserEntity, db: db_dependency):
     try:
-        user: User = (
-            db.query(User)
+        user: User = (await db.scalars(
+            select(User)
             .filter(User.id == user_id, User.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not user:
             return ResponseMessage(
@@ -125,28 +394,35 @@ async def update(user_id: int, user_item: UserEntity, db: db_dependency):
                 message=f"User with ID {user_id} not found.",
             )
 
+        missing = await missing_user_links(db, [user_item])
+        if missing:
+            return ResponseMessage(
+                code=status.HTTP_400_BAD_REQUEST,
+                message=missing[0],
+            )
+
         user.user_name = user_item.user_name
         user.email = user_item.email
-        user.password = create_password(user_item.password)
+        user.password = await hash_password(user_item.password)
         user.updated_at = datetime.now()
         user.default_prompt = user_item.default_prompt
         user.default_model = user_item.default_model
         user.role_id = user_item.role_id
-        user.chat_ids = user_item.chat_ids
-        user.prompt_ids = user_item.prompt_ids
-        user.models = user_item.models
+        await set_user_links(db, {user.id: (user_item.prompt_ids, user_item.models)})
 
-        db.commit()
-        db.refresh(user)
+        await revoke_refresh_tokens(db, [user.id])
+        await db.commit()
+        token_revocations.revoke([user.id])
+        user = await reload(db, user)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
             message="User updated successfully",
-            data=user,
+            data=await user_dict(db, user),
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -155,11 +431,10 @@ async def update(user_id: int, user_item: UserEntity, db: db_dependency):
 @user_router.delete("/{user_id}", status_code=status.HTTP_200_OK, name="Delete user")
 async def delete(user_id: int, db: db_dependency):
     try:
-        user: User = (
-            db.query(User)
+        user: User = (await db.scalars(
+            select(User)
             .filter(User.id == user_id, User.is_deleted == False)
-            .first()
-        )
+        )).first()
 
         if not user:
             return ResponseMessage(
@@ -168,16 +443,19 @@ async def delete(user_id: int, db: db_dependency):
             )
 
         user.is_deleted = True
-        db.commit()
+        await revoke_refresh_tokens(db, [user.id])
+        await db.commit()
+        token_revocations.revoke([user.id])
+        user = await reload(db, user)
 
         return ResponseMessage(
             code=status.HTTP_200_OK,
             message="User deleted successfully",
-            data=user
+            data=await user_dict(db, user),
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return ResponseMessage(
             code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             message=f"Database error: {str(e)}",
@@ -0,0 +1,5 @@
+from typing import List
+from pydantic import BaseModel
+
+class BulkDeleteEntity(BaseModel):
+    ids: List[int]
@@ -1,10 +1,14 @@
 from datetime import datetime
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List
+
+class MessageEntity(BaseModel):
+    role: str
+    content: str
 
 class ChatEntity(BaseModel):
     title: str
-    conversation: List[Dict]
+    conversation: List[MessageEntity] = []
     user_id: int
     created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
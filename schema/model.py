@@ -12,4 +12,7 @@ class ModelEntity(BaseModel):
     detail_name: str
     type: ModelTypeEnum 
     created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
+
+class ModelBulkUpdateEntity(ModelEntity):
+    id: int
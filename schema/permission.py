@@ -6,4 +6,7 @@ class PermissionEntity(BaseModel):
     name: str
     route: str
     created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
+
+class PermissionBulkUpdateEntity(PermissionEntity):
+    id: int
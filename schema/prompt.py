@@ -5,4 +5,7 @@ from pydantic import BaseModel
 class PromptEntity(BaseModel):
     content: str
     created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
+
+class PromptBulkUpdateEntity(PromptEntity):
+    id: int
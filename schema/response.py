@@ -1,30 +1,46 @@
+import orjson
 from typing import Any
-from pydantic import BaseModel
 from fastapi.responses import JSONResponse
 
-class ResponseMessage(BaseModel):
-    code: int
-    message: str
-    data: Any = None
-    error: bool = False
-
-    def process_data(self, data):
-        if isinstance(data, list):
-            return [item.to_dict() if hasattr(item, "to_dict") else item for item in data]
-        elif hasattr(data, "to_dict"):
-            return data.to_dict()
-        return data
-
-    def to_response(self) -> JSONResponse:
-        processed_data = self.process_data(self.data)
-        response_data = {
-            "code": self.code,
-            "message": self.message,
-            "data": processed_data,
-        }
-        return JSONResponse(status_code=self.code, content=response_data)
+_UNSET = object()
+
+
+def default(value: Any):
+    """
+    Encoder cho các kiểu orjson không tự xử lý: entity ORM đi qua to_dict()
+    """
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+
 
-    def __new__(cls, *args, **kwargs):
-        instance = super().__new__(cls)
-        instance.__init__(*args, **kwargs)
-        return instance.to_response()
\ No newline at end of file
+class FastJSONResponse(JSONResponse):
+    """
+    Encode thẳng ra bytes bằng orjson, datetime được serialize native (ISO 8601)
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ResponseMessage:
+    """
+    Envelope {code, message, data} chung cho mọi route, trả về trực tiếp FastJSONResponse.
+    Entity (hoặc list entity) trong data được encode trong cùng một lượt encode JSON.
+    """
+
+    def __new__(cls, code: int, message: str, data: Any = None, error: bool = False, next_cursor: Any = _UNSET):
+        content = {
+            "code": code,
+            "message": message,
+            "data": data,
+        }
+        if next_cursor is not _UNSET:
+            content["next_cursor"] = next_cursor
+        return FastJSONResponse(status_code=code, content=content)
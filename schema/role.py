@@ -6,4 +6,7 @@ class RoleEntity(BaseModel):
     name: str
     permission_ids: List[int]
     created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
+
+class RoleBulkUpdateEntity(RoleEntity):
+    id: int
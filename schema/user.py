@@ -7,16 +7,21 @@ class UserEntity(BaseModel):
     email: str
     password: str
     image: Optional[str] = None
-    token: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
-    chat_ids: List[str]
-    prompt_ids: List[str]
+    chat_ids: List[int] = []  # Chỉ đọc, suy ra từ chat.user_id
+    prompt_ids: List[int] = []
     default_prompt: int
     default_model: int
     role_id: int
-    models: List[str]
+    models: List[int] = []
+
+class UserBulkUpdateEntity(UserEntity):
+    id: int
 
 class LoginEntity(BaseModel):
     user_name: str
-    password: str
\ No newline at end of file
+    password: str
+
+class RefreshEntity(BaseModel):
+    refresh_token: str